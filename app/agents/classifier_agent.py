@@ -1,8 +1,20 @@
 """Document classification agent."""
-from typing import List, Optional
-from app.schemas import DocumentType, ClassifiedDocument
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+from app.schemas import (
+    DocumentType,
+    ClassifiedDocument,
+    BillData,
+    DischargeSummaryData,
+    IDCardData,
+)
 from app.services.llm_service import get_llm_service
+from app.services.local_classifier import get_local_classifier
+from app.services.prompt_budget import fit_sections
+from app.services.structured_output import response_schema_for
 from app.utils.logging import get_logger
+from app.utils.section_index import SectionIndex
 
 logger = get_logger(__name__)
 
@@ -36,6 +48,64 @@ Key Indicators:
 
 Consider the ENTIRE document content provided, not just the first page."""
     
+    # Enforced via JSON mode; filename is filled in from the upload, not by the LLM
+    RESPONSE_SCHEMA = response_schema_for(ClassifiedDocument, exclude=("filename",))
+    
+    # One result per numbered document in a batched prompt
+    BATCH_RESPONSE_SCHEMA = {
+        "type": "object",
+        "properties": {
+            "results": {
+                "type": "array",
+                "items": {
+                    **RESPONSE_SCHEMA,
+                    "properties": {
+                        "index": {"type": "integer", "description": "Document number from the prompt"},
+                        **RESPONSE_SCHEMA["properties"],
+                    },
+                    "required": ["index", *RESPONSE_SCHEMA["required"]],
+                },
+            }
+        },
+        "required": ["results"],
+    }
+    
+    # Output tokens allowed per document in a batched call
+    BATCH_TOKENS_PER_DOCUMENT = 300
+    
+    # Classification plus the fields of the detected type, keyed by type
+    FUSED_RESPONSE_SCHEMA = {
+        **RESPONSE_SCHEMA,
+        "properties": {
+            **RESPONSE_SCHEMA["properties"],
+            DocumentType.BILL.value: {**response_schema_for(BillData), "nullable": True},
+            DocumentType.DISCHARGE_SUMMARY.value: {**response_schema_for(DischargeSummaryData), "nullable": True},
+            DocumentType.ID_CARD.value: {**response_schema_for(IDCardData), "nullable": True},
+        },
+    }
+    
+    # One fused result per numbered document in a batched prompt
+    FUSED_BATCH_RESPONSE_SCHEMA = {
+        "type": "object",
+        "properties": {
+            "results": {
+                "type": "array",
+                "items": {
+                    **FUSED_RESPONSE_SCHEMA,
+                    "properties": {
+                        "index": {"type": "integer", "description": "Document number from the prompt"},
+                        **FUSED_RESPONSE_SCHEMA["properties"],
+                    },
+                    "required": ["index", *RESPONSE_SCHEMA["required"]],
+                },
+            }
+        },
+        "required": ["results"],
+    }
+    
+    # Output tokens allowed per document in a fused batch (room for line items)
+    FUSED_TOKENS_PER_DOCUMENT = 2000
+    
     CLASSIFICATION_EXAMPLES = """
 Examples:
 
@@ -62,35 +132,44 @@ Reason: Insufficient information to classify"""
     def __init__(self):
         """Initialize classifier agent."""
         self.llm = get_llm_service()
+        self.local_classifier = get_local_classifier()
         logger.info("classifier_agent_initialized")
     
+    @staticmethod
+    def _index_for(content: str, section_index: Optional[SectionIndex]) -> SectionIndex:
+        return section_index if section_index is not None else SectionIndex(content)
+    
+    @staticmethod
+    def _overview_spans(index: SectionIndex) -> List[Tuple[int, int]]:
+        """Both ends, the start of each section found, then the top of every page."""
+        section_starts = [index.first(group) for group in index.sections]
+        return [
+            index.head(2000),
+            index.tail(2000),
+            *[(start, start + 700) for start in sorted(section_starts) if start != -1],
+            *index.page_heads(300),
+        ]
+    
+    def _sample_content(self, content_preview: str, section_index: Optional[SectionIndex] = None) -> str:
+        """
+        Sample a long document around its section starts to catch multi-section documents.
+        
+        Documents within `prompt_tokens_classification` are sent whole. When
+        `section_index` is given, its (normalized) text is what gets sampled.
+        """
+        index = self._index_for(content_preview, section_index)
+        return fit_sections(
+            index, self._overview_spans(index), settings.prompt_tokens_classification, purpose="classification"
+        )
+    
     def _build_classification_prompt(
         self,
         filename: str,
         content_preview: str,
+        section_index: Optional[SectionIndex] = None,
     ) -> str:
         """Build the classification prompt with strategic sampling."""
-        # Sample from beginning, middle, and end to catch multi-section documents
-        content_len = len(content_preview)
-        
-        if content_len > 6000:
-            # For long documents, sample strategically but use less content
-            start = content_preview[:2000]  # Reduced from 3000
-            middle_pos = content_len // 2
-            middle = content_preview[middle_pos:middle_pos + 1500]  # Reduced from 2000
-            end = content_preview[-2000:]  # Reduced from 3000
-            
-            sampled = f"""=== BEGINNING ===
-{start}
-
-=== MIDDLE ===
-{middle}
-
-=== END ===
-{end}"""
-        else:
-            # For shorter documents, use full content
-            sampled = content_preview
+        sampled = self._sample_content(content_preview, section_index)
         
         prompt = f"""Classify this document:
 
@@ -107,10 +186,152 @@ Respond ONLY with valid JSON (no markdown):
 }}"""
         return prompt
     
+    def _build_batch_prompt(
+        self,
+        documents: List[tuple[str, str]],
+        section_indexes: Optional[Dict[str, SectionIndex]] = None,
+    ) -> str:
+        """Build one prompt classifying several numbered documents."""
+        section_indexes = section_indexes or {}
+        sections = [
+            f"""### Document {index}
+Filename: {filename}
+
+Content:
+{self._sample_content(content, section_indexes.get(filename))}"""
+            for index, (filename, content) in enumerate(documents, start=1)
+        ]
+        joined = "\n\n".join(sections)
+        
+        return f"""Classify each of these {len(documents)} documents independently:
+
+{joined}
+
+Respond ONLY with valid JSON (no markdown), one result per document:
+{{
+    "results": [
+        {{
+            "index": 1,
+            "document_type": "bill|discharge_summary|id_card|unknown",
+            "confidence": 0.0-1.0,
+            "reasoning": "brief explanation"
+        }}
+    ]
+}}"""
+    
+    def _sample_fused_content(self, content: str, section_index: Optional[SectionIndex] = None) -> str:
+        """
+        Sample a document for the fused prompt.
+        
+        Extraction needs more text than classification: enough to classify
+        first, then the sections most fields come from.
+        """
+        index = self._index_for(content, section_index)
+        return fit_sections(index, [
+            *self._overview_spans(index),
+            *index.around("totals", before=200, after=400, last_first=True),
+            *index.around("header", before=100, after=300),
+            *index.around("discharge", before=50, after=600),
+            *index.tables,
+        ], settings.prompt_tokens_fused, purpose="fused")
+    
+    def _build_fused_prompt(
+        self,
+        documents: List[tuple[str, str]],
+        section_indexes: Optional[Dict[str, SectionIndex]] = None,
+    ) -> str:
+        """Build one prompt asking for the type and that type's fields of several numbered documents."""
+        section_indexes = section_indexes or {}
+        sections = [
+            f"""### Document {index}
+Filename: {filename}
+
+Content:
+{self._sample_fused_content(content, section_indexes.get(filename))}"""
+            for index, (filename, content) in enumerate(documents, start=1)
+        ]
+        joined = "\n\n".join(sections)
+        
+        return f"""Classify each of these {len(documents)} documents independently, then extract its data.
+
+{joined}
+
+Steps, for each document:
+1. Determine document_type, confidence (0.0-1.0) and a brief reasoning.
+2. Under the key matching document_type ("bill", "discharge_summary" or "id_card"),
+   extract that document's fields. Leave the other keys null.
+3. Add the result to "results" with the document's number as "index".
+
+Extraction rules:
+- Dates in YYYY-MM-DD format
+- Amounts as plain numbers without currency symbols or commas
+- Use null for fields not present in the document; never guess
+- Bills: take the final payable total; list itemized charges as line_items
+- Discharge summaries: primary diagnosis, admission/discharge dates, procedures, medications
+- ID cards: policy/member numbers exactly as printed
+
+Respond ONLY with valid JSON (no markdown)."""
+    
+    def _parse_classification(self, filename: str, response: Dict[str, Any]) -> ClassifiedDocument:
+        """Turn one LLM classification result into a ClassifiedDocument."""
+        doc_type_str = str(response.get("document_type", "unknown")).lower()
+        
+        # Map to enum
+        try:
+            doc_type = DocumentType(doc_type_str)
+        except ValueError:
+            logger.warning(
+                "invalid_document_type",
+                filename=filename,
+                type=doc_type_str
+            )
+            doc_type = DocumentType.UNKNOWN
+        
+        confidence = float(response.get("confidence", 0.5))
+        reasoning = response.get("reasoning", "")
+        
+        result = ClassifiedDocument(
+            filename=filename,
+            document_type=doc_type,
+            confidence=confidence,
+            reasoning=reasoning,
+        )
+        
+        logger.info(
+            "document_classified",
+            filename=filename,
+            type=doc_type.value,
+            confidence=confidence
+        )
+        
+        return result
+    
+    def _classify_locally(self, filename: str, content: str) -> Optional[ClassifiedDocument]:
+        """
+        Keyword fast path: the local result if it clears the confidence threshold.
+        
+        Returns None when the LLM should decide.
+        """
+        if not settings.classification_local_enabled:
+            return None
+        
+        result = self.local_classifier.classify(filename, content)
+        if result.confidence < settings.classification_local_threshold:
+            return None
+        
+        logger.info(
+            "document_classified_locally",
+            filename=filename,
+            type=result.document_type,
+            confidence=result.confidence
+        )
+        return result
+    
     async def classify_document(
         self,
         filename: str,
         content: str,
+        section_index: Optional[SectionIndex] = None,
     ) -> ClassifiedDocument:
         """
         Classify a single document.
@@ -118,10 +339,15 @@ Respond ONLY with valid JSON (no markdown):
         Args:
             filename: Original filename
             content: Extracted text content
+            section_index: SectionIndex of the document, used to sample long content
         
         Returns:
             ClassifiedDocument with type and confidence
         """
+        local = self._classify_locally(filename, content)
+        if local is not None:
+            return local
+        
         try:
             logger.info(
                 "classifying_document",
@@ -130,47 +356,17 @@ Respond ONLY with valid JSON (no markdown):
             )
             
             # Build prompt
-            prompt = self._build_classification_prompt(filename, content)
+            prompt = self._build_classification_prompt(filename, content, section_index)
             
             # Get classification from LLM
             response = await self.llm.generate_structured(
                 prompt=prompt,
                 system_prompt=self.CLASSIFICATION_SYSTEM_PROMPT + "\n\n" + self.CLASSIFICATION_EXAMPLES,
                 max_tokens=500,  # Enough for classification JSON response
+                response_schema=self.RESPONSE_SCHEMA,
             )
             
-            # Parse response
-            doc_type_str = response.get("document_type", "unknown").lower()
-            
-            # Map to enum
-            try:
-                doc_type = DocumentType(doc_type_str)
-            except ValueError:
-                logger.warning(
-                    "invalid_document_type",
-                    filename=filename,
-                    type=doc_type_str
-                )
-                doc_type = DocumentType.UNKNOWN
-            
-            confidence = float(response.get("confidence", 0.5))
-            reasoning = response.get("reasoning", "")
-            
-            result = ClassifiedDocument(
-                filename=filename,
-                document_type=doc_type,
-                confidence=confidence,
-                reasoning=reasoning,
-            )
-            
-            logger.info(
-                "document_classified",
-                filename=filename,
-                type=doc_type.value,
-                confidence=confidence
-            )
-            
-            return result
+            return self._parse_classification(filename, response)
             
         except Exception as e:
             logger.error(
@@ -236,33 +432,236 @@ Respond ONLY with valid JSON (no markdown):
             reasoning=reasoning
         )
     
+    def _fused_fields(self, classified: ClassifiedDocument, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The fields of a fused result, or None when the agent should extract them itself."""
+        fields = item.get(classified.document_type)
+        if not isinstance(fields, dict) or classified.confidence < settings.classification_fused_min_confidence:
+            logger.info(
+                "fused_extraction_discarded",
+                filename=classified.filename,
+                type=classified.document_type,
+                confidence=classified.confidence
+            )
+            return None
+        return fields
+    
+    async def _classify_and_extract_group(
+        self,
+        documents: List[tuple[str, str]],
+        section_indexes: Optional[Dict[str, SectionIndex]] = None,
+    ) -> List[Optional[Tuple[ClassifiedDocument, Optional[Dict[str, Any]]]]]:
+        """
+        Classify and extract a group of documents in a single LLM call.
+        
+        Returns one (classification, fields) entry per document, None where
+        the response had no usable result for it. Raises if the call itself fails.
+        """
+        response = await self.llm.generate_structured(
+            prompt=self._build_fused_prompt(documents, section_indexes),
+            system_prompt=self.CLASSIFICATION_SYSTEM_PROMPT,
+            max_tokens=self.FUSED_TOKENS_PER_DOCUMENT * len(documents),
+            response_schema=self.FUSED_BATCH_RESPONSE_SCHEMA,
+        )
+        
+        results: List[Optional[Tuple[ClassifiedDocument, Optional[Dict[str, Any]]]]] = [None] * len(documents)
+        for item in response.get("results") or []:
+            try:
+                index = int(item["index"]) - 1
+                if 0 <= index < len(documents) and results[index] is None:
+                    classified = self._parse_classification(documents[index][0], item)
+                    results[index] = (classified, self._fused_fields(classified, item))
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                logger.warning("fused_classification_item_invalid", item=str(item)[:200], error=str(e))
+        
+        return results
+    
+    async def classify_and_extract_batch(
+        self,
+        documents: List[tuple[str, str]],
+        section_indexes: Optional[Dict[str, SectionIndex]] = None,
+    ) -> Tuple[List[ClassifiedDocument], Dict[str, Dict[str, Any]]]:
+        """
+        Classify multiple documents and extract their fields in as few LLM calls as possible.
+        
+        Documents the local keyword classifier is confident about skip the
+        LLM. The rest are sent together, one fused call per
+        `classification_fused_batch_max_docs` group, each returning every
+        document's type and the fields for that type. Documents the fused
+        response leaves out, or whose group call fails, are classified by
+        `classify_batch` and extracted later by their agent.
+        
+        Args:
+            documents: List of (filename, content) tuples
+            section_indexes: filename -> SectionIndex, used to sample long content
+        
+        Returns:
+            The classifications (in input order) and filename -> extracted
+            fields for the documents whose fused extraction can be used
+        """
+        logger.info("fused_classification_started", count=len(documents))
+        section_indexes = section_indexes or {}
+        
+        classified: List[Optional[ClassifiedDocument]] = [
+            self._classify_locally(filename, content) for filename, content in documents
+        ]
+        pending = [i for i, result in enumerate(classified) if result is None]
+        prefetched: Dict[str, Dict[str, Any]] = {}
+        
+        group_size = max(1, settings.classification_fused_batch_max_docs)
+        index_groups = [pending[i:i + group_size] for i in range(0, len(pending), group_size)]
+        groups = await asyncio.gather(
+            *(
+                self._classify_and_extract_group([documents[i] for i in indices], section_indexes)
+                for indices in index_groups
+            ),
+            return_exceptions=True
+        )
+        for indices, group in zip(index_groups, groups):
+            if isinstance(group, Exception):
+                logger.warning(
+                    "fused_classification_failed",
+                    count=len(indices),
+                    error=str(group),
+                    error_type=type(group).__name__
+                )
+                continue
+            for i, result in zip(indices, group):
+                if result is None:
+                    continue
+                classified[i], fields = result
+                if fields is not None:
+                    prefetched[documents[i][0]] = fields
+        
+        missing = [i for i, result in enumerate(classified) if result is None]
+        if missing:
+            logger.info("fused_classification_fallback", count=len(missing))
+            fallback = await self.classify_batch([documents[i] for i in missing], section_indexes)
+            for i, result in zip(missing, fallback):
+                classified[i] = result
+        
+        logger.info(
+            "fused_classification_completed",
+            count=len(classified),
+            local=len(documents) - len(pending),
+            prefetched=len(prefetched)
+        )
+        
+        return classified, prefetched
+    
+    async def classify_and_extract(
+        self,
+        filename: str,
+        content: str,
+        section_index: Optional[SectionIndex] = None,
+    ) -> Tuple[ClassifiedDocument, Optional[Dict[str, Any]]]:
+        """
+        Classify one document and extract its fields (see classify_and_extract_batch).
+        
+        Fields are None when no LLM call was needed (local fast path), when
+        the fused call failed or when its confidence is below
+        `classification_fused_min_confidence`; the type-specific agent then
+        extracts the document itself.
+        """
+        section_indexes = {filename: section_index} if section_index is not None else None
+        classified, prefetched = await self.classify_and_extract_batch([(filename, content)], section_indexes)
+        return classified[0], prefetched.get(filename)
+    
+    async def _classify_group(
+        self,
+        documents: List[tuple[str, str]],
+        section_indexes: Optional[Dict[str, SectionIndex]] = None,
+    ) -> List[Optional[ClassifiedDocument]]:
+        """
+        Classify a group of documents in a single LLM call.
+        
+        Returns one entry per document, None where the response had no
+        usable result for it. Raises if the call itself fails.
+        """
+        prompt = self._build_batch_prompt(documents, section_indexes)
+        response = await self.llm.generate_structured(
+            prompt=prompt,
+            system_prompt=self.CLASSIFICATION_SYSTEM_PROMPT + "\n\n" + self.CLASSIFICATION_EXAMPLES,
+            max_tokens=self.BATCH_TOKENS_PER_DOCUMENT * len(documents),
+            response_schema=self.BATCH_RESPONSE_SCHEMA,
+        )
+        
+        results: List[Optional[ClassifiedDocument]] = [None] * len(documents)
+        for item in response.get("results") or []:
+            try:
+                index = int(item["index"]) - 1
+                if 0 <= index < len(documents) and results[index] is None:
+                    results[index] = self._parse_classification(documents[index][0], item)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning("batch_classification_item_invalid", item=str(item)[:200], error=str(e))
+        
+        return results
+    
     async def classify_batch(
         self,
         documents: List[tuple[str, str]],
+        section_indexes: Optional[Dict[str, SectionIndex]] = None,
     ) -> List[ClassifiedDocument]:
         """
-        Classify multiple documents in parallel.
+        Classify multiple documents.
+        
+        Documents the local keyword classifier is confident about skip the
+        LLM entirely. With batching enabled, the remaining documents are classified together in one LLM
+        call per `classification_batch_max_docs` group, so the system prompt
+        and examples are sent once instead of once per file. Documents the
+        batched response leaves out (or a group whose call fails) are
+        classified individually, in parallel.
         
         Args:
             documents: List of (filename, content) tuples
+            section_indexes: filename -> SectionIndex, used to sample long content
         
         Returns:
             List of ClassifiedDocument results
         """
-        import asyncio
-        
         logger.info("batch_classification_started", count=len(documents))
+        section_indexes = section_indexes or {}
+        
+        classified: List[Optional[ClassifiedDocument]] = [
+            self._classify_locally(filename, content) for filename, content in documents
+        ]
+        pending = [i for i, result in enumerate(classified) if result is None]
+        
+        batched = settings.classification_batch_enabled and len(pending) > 1
+        if batched:
+            group_size = max(1, settings.classification_batch_max_docs)
+            index_groups = [pending[i:i + group_size] for i in range(0, len(pending), group_size)]
+            groups = await asyncio.gather(
+                *(
+                    self._classify_group([documents[i] for i in indices], section_indexes)
+                    for indices in index_groups
+                ),
+                return_exceptions=True
+            )
+            for indices, group in zip(index_groups, groups):
+                if isinstance(group, Exception):
+                    logger.warning(
+                        "batch_classification_call_failed",
+                        count=len(indices),
+                        error=str(group),
+                        error_type=type(group).__name__
+                    )
+                    continue
+                for i, result in zip(indices, group):
+                    classified[i] = result
+        
+        missing = [i for i, result in enumerate(classified) if result is None]
+        if batched and missing:
+            logger.info("batch_classification_fallback", count=len(missing))
         
         tasks = [
-            self.classify_document(filename, content)
-            for filename, content in documents
+            self.classify_document(*documents[i], section_indexes.get(documents[i][0]))
+            for i in missing
         ]
         
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
         # Filter out exceptions and log them
-        classified = []
-        for i, result in enumerate(results):
+        for i, result in zip(missing, results):
             if isinstance(result, Exception):
                 logger.error(
                     "batch_classification_item_failed",
@@ -271,11 +670,15 @@ Respond ONLY with valid JSON (no markdown):
                     error=str(result)
                 )
                 # Add fallback
-                classified.append(self._fallback_classification(documents[i][0]))
+                classified[i] = self._fallback_classification(documents[i][0])
             else:
-                classified.append(result)
+                classified[i] = result
         
-        logger.info("batch_classification_completed", count=len(classified))
+        logger.info(
+            "batch_classification_completed",
+            count=len(classified),
+            local=len(documents) - len(pending)
+        )
         
         return classified
 
@@ -153,6 +153,7 @@ Response format: "This claim is [status]. [Reasoning based on factors]"
                 system_prompt=self.SYSTEM_PROMPT,
                 temperature=0.2,
                 max_tokens=500,  # Increased for proper explanation
+                priority="background",  # Narrative only; rule-based fallback exists
             )
             
             # Ensure reasoning starts with decision status
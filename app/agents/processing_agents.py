@@ -1,9 +1,19 @@
 """Specialized agents for processing different document types."""
-from typing import Dict, Any, Optional
-from decimal import Decimal
+import asyncio
+import re
+from typing import Dict, Any, List, Optional
+from decimal import Decimal, InvalidOperation
 from datetime import date
+from pydantic import ValidationError
+from app.config import settings
 from app.schemas import BillData, DischargeSummaryData, IDCardData
 from app.services.llm_service import get_llm_service
+from app.services.prompt_budget import fit_sections
+from app.services.structured_output import response_schema_for
+from app.services.token_counter import get_token_counter
+from app.utils.anchored_patterns import AnchorIndex, AnchoredPattern, anchor_keywords
+from app.utils.section_index import SECTION_KEYWORDS, SectionIndex
+from app.utils.text_normalizer import normalize_ocr_text
 from app.utils.logging import get_logger
 
 logger = get_logger(__name__)
@@ -54,55 +64,127 @@ Extract structured information from hospital bills and invoices, even from poorl
         "line_items": "array of objects or empty array"
     }
     
+    RESPONSE_SCHEMA = response_schema_for(BillData)
+    
+    # Map-reduce mode: each chunk returns its line items and every total it
+    # prints; the grand total is picked and checked in _reduce_chunks
+    CHUNK_RESPONSE_SCHEMA = {
+        **response_schema_for(BillData, exclude=("total_amount",)),
+        "properties": {
+            **response_schema_for(BillData, exclude=("total_amount",))["properties"],
+            "stated_totals": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "label": {"type": "string"},
+                        "amount": {"type": "number"},
+                    },
+                    "required": ["label", "amount"],
+                },
+            },
+        },
+    }
+    
+    # Stated-total labels in priority order (as AMOUNT_PATTERNS); totals with
+    # other labels are treated as subtotals
+    TOTAL_LABELS = SECTION_KEYWORDS["totals"]
+    
+    # A stated total reconciles with the line-item sum within 1% (or ₹1)
+    RECONCILE_TOLERANCE = Decimal("0.01")
+    
     def __init__(self):
         """Initialize bill agent."""
         self.llm = get_llm_service()
         logger.info("bill_agent_initialized")
     
-    def _fix_ocr_text(self, text: str) -> str:
-        """
-        Fix common OCR spacing and character issues.
-        
-        Examples:
-        - "M r s . N ANDI RAWAT" → "Mrs. NANDI RAWAT"
-        - "3 2 5 6 24" → "325624"
-        - "V S L I . 0 000633928" → "VSLI.0000633928"
-        """
-        import re
-        
-        # Strategy: Remove spaces between single characters when they form words/numbers
-        # 1. Fix spaced digits (bill numbers, amounts, IDs)
-        fixed_text = re.sub(r'(\d)\s+(?=\d)', r'\1', text)  # "3 2 5 6" → "3256"
-        
-        # 2. Fix spaced uppercase letters followed by lowercase (names, titles)
-        fixed_text = re.sub(r'([A-Z])\s+([a-z])\s+([a-z])', r'\1\2\3', fixed_text)  # "M r s" → "Mrs"
-        
-        # 3. Fix spaced uppercase letters (abbreviations, codes)
-        fixed_text = re.sub(r'([A-Z])\s+([A-Z])\s+([A-Z])', r'\1\2\3', fixed_text)  # "V S L" → "VSL"
-        
-        # 4. Fix spaced letters with dots (titles, IDs)
-        fixed_text = re.sub(r'([A-Za-z])\s+([A-Za-z])\s+([A-Za-z])\s*\.', r'\1\2\3.', fixed_text)  # "M r s ." → "Mrs."
-        
-        # 5. Fix spaced names (NANDI RAWAT → keep space, but "N ANDI" → "NANDI")
-        # Only remove space if followed by lowercase immediately after (camelCase indicator)
-        fixed_text = re.sub(r'([A-Z])\s+([A-Z][a-z])', r'\1\2', fixed_text)  # "N ANDI" → "NANDI"
-        
-        # 6. Fix OCR character substitutions and artifacts
-        ocr_fixes = {
-            r'Mate\)': 'Male',  # "Mate)" → "Male"
-            r'Femate\)': 'Female',  # "Femate)" → "Female"
-            r'(\w+)!_\s+': r'\1 ',  # "KOSG!_ " → "KOSGI "
-            r'!_': '',  # Remove !_ artifacts
-            r'\s+\)': ')',  # " )" → ")"
-            r'\(\s+': '(',  # "( " → "("
-            r'\s+:': ':',  # " :" → ":"
-            r':\s{2,}': ': ',  # ":  " → ": " (normalize spacing)
-        }
-        
-        for pattern, replacement in ocr_fixes.items():
-            fixed_text = re.sub(pattern, replacement, fixed_text)
-        
-        return fixed_text
+    # ------------------------------------------------------------------
+    # Regex fast path. Patterns are compiled once and anchored on their
+    # leading keyword: one AnchorIndex per document locates every keyword,
+    # and each pattern is only tried at those positions (in priority order)
+    # instead of rescanning the full text per pattern.
+    # ------------------------------------------------------------------
+    HOSPITAL_MAPPINGS = {
+        'apollo': 'Apollo Hospitals',
+        'appolo': 'Apollo Hospitals',
+        'max': 'Max Healthcare',
+        'fortis': 'Fortis Healthcare',
+        'ganga ram': 'Sir Ganga Ram Hospital',
+        'gangaram': 'Sir Ganga Ram Hospital',
+        'aiims': 'AIIMS',
+        'medanta': 'Medanta',
+        'manipal': 'Manipal Hospitals',
+    }
+    
+    HOSPITAL_PATTERNS = [
+        AnchoredPattern(r'(Apollo\s+Hospitals?(?:\s+[\w\s]+)?)', anchors=("apollo",)),
+        AnchoredPattern(r'(Max\s+(?:Healthcare|Hospital|Super\s+Speciality\s+Hospital)(?:\s+[\w\s]+)?)', anchors=("max",)),
+        AnchoredPattern(r'(Fortis\s+(?:Healthcare|Hospital)(?:\s+[\w\s]+)?)', anchors=("fortis",)),
+        AnchoredPattern(r'(Sir\s+Ganga\s+Ram\s+Hospital)', anchors=("sir",)),
+        AnchoredPattern(r'(AIIMS(?:\s+[\w\s]+)?)', anchors=("aiims",)),
+        AnchoredPattern(r'(Medanta(?:\s+[\w\s]+)?)', anchors=("medanta",)),
+        AnchoredPattern(r'(Manipal\s+Hospitals?(?:\s+[\w\s]+)?)', anchors=("manipal",)),
+    ]
+    
+    AMOUNT_PATTERNS = [
+        # Insurance bill patterns (Fortis, Apollo style) - PRIORITY
+        AnchoredPattern(r'payor\s*amount\s*[:\-]?\s*(?:rs\.?|inr|₹)?\s*([0-9,]+\.?[0-9]*)', anchors=("payor",)),
+        AnchoredPattern(r'net\s*(?:bill\s*)?amount\s*[:\-]?\s*(?:rs\.?|inr|₹)?\s*([0-9,]+\.?[0-9]*)', anchors=("net",)),
+        AnchoredPattern(r'net\s*payable\s*amount?\s*[:\-]?\s*(?:rs\.?|inr|₹)?\s*\(?\s*([0-9,]+\.?[0-9]*)\s*\)?', anchors=("net",)),
+        AnchoredPattern(r'bill\s*amount\s*[:\-]?\s*(?:rs\.?|inr|₹)?\s*([0-9,]+\.?[0-9]*)', anchors=("bill",)),
+        # Common patterns
+        AnchoredPattern(r'(?:total|final)\s*amount\s*[:\-]?\s*(?:rs\.?|inr|₹)?\s*([0-9,]+\.?[0-9]*)', anchors=("total", "final")),
+        AnchoredPattern(r'grand\s*total\s*[:\-]?\s*(?:rs\.?|inr|₹)?\s*([0-9,]+\.?[0-9]*)', anchors=("grand",)),
+        AnchoredPattern(r'amount\s*(?:payable|due)\s*[:\-]?\s*(?:rs\.?|inr|₹)?\s*([0-9,]+\.?[0-9]*)', anchors=("amount",)),
+    ]
+    
+    NAME_PATTERNS = [
+        # Pattern 1: "Patient Name : Mrs. Mary Philo" (most common)
+        # Capture title + 1-3 capitalized words, stop at numbers or special patterns
+        AnchoredPattern(r'patient\s*name\s*[:\-]?\s*((?:Mr|Mrs|Ms|Dr)\.?\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,2})(?:\s+(?:Bill|UHID|Age|Gender|\d))', anchors=("patient",)),
+        # Pattern 2: Simpler - title + name without lookahead (may capture extra, we'll strip)
+        AnchoredPattern(r'patient\s*name\s*[:\-]?\s*((?:Mr|Mrs|Ms|Dr)\.?\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,3})', anchors=("patient",)),
+        # Pattern 3: "Patient Name : Mary Philo" (no title)
+        AnchoredPattern(r'patient\s*name\s*[:\-]?\s*([A-Z][a-z]+\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)', anchors=("patient",)),
+    ]
+    
+    NAME_SUFFIX = re.compile(r'\s+(Bill|UHID|Age|Gender|Episode|Admission).*$', re.IGNORECASE)
+    
+    MONTHS = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+    
+    DATE_PATTERNS = [
+        # Date with month name: "07-Feb-2025" or "7-Feb-25" (common in Indian hospitals);
+        # anchored on the month, starting one or two digits before its separator
+        AnchoredPattern(r'(\d{1,2}[-/](?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[-/]\d{2,4})', anchors=MONTHS, offsets=(-3, -2)),
+        # Common numeric formats with clear labels
+        AnchoredPattern(r'(?:bill|invoice)\s*date\s*[:\-]?\s*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})', anchors=("bill", "invoice")),
+        AnchoredPattern(r'date\s*of\s*(?:service|admission|bill)\s*[:\-]?\s*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})', anchors=("date",)),
+        AnchoredPattern(r'(?:service|admission)\s*date\s*[:\-]?\s*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})', anchors=("service", "admission")),
+        # Date after "Admitted" keyword (common in bills)
+        AnchoredPattern(r'admitted\s*(?:on)?\s*[:\-]?\s*(\d{1,2}[-/](?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[-/]\d{2,4})', anchors=("admitted",)),
+        AnchoredPattern(r'admitted\s*(?:on)?\s*[:\-]?\s*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})', anchors=("admitted",)),
+        AnchoredPattern(r'discharge\s*(?:date|on)?\s*[:\-]?\s*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})', anchors=("discharge",)),
+        # Very loose: any date in header - but EXCLUDE episode numbers (no anchor: full scan, last resort)
+        AnchoredPattern(r'(?<!Episode)(?<!episode)(?<!No)(?<!/)\s(\d{1,2}[-/]\d{1,2}[-/]\d{4})(?![/\d])'),  # Must have 4-digit year, not part of longer sequence
+    ]
+    
+    BILL_NUMBER_PATTERNS = [
+        AnchoredPattern(r'(?:bill|invoice|receipt)\s*(?:no|number|#)\s*[:\-]?\s*([A-Z0-9\-/]+)', anchors=("bill", "invoice", "receipt")),
+        AnchoredPattern(r'IPID\s*[:\-]?\s*([A-Z0-9\-/]+)', anchors=("ipid",)),
+    ]
+    
+    REGEX_ANCHORS = anchor_keywords(HOSPITAL_PATTERNS, AMOUNT_PATTERNS, NAME_PATTERNS, DATE_PATTERNS, BILL_NUMBER_PATTERNS)
+    
+    def _sample_text(self, index: SectionIndex) -> str:
+        """Header, totals, footer and line-item tables of a long bill, in that priority."""
+        return fit_sections(index, [
+            index.head(3000),  # Hospital, patient and bill number
+            *index.around("totals", before=200, after=400, last_first=True),  # Final totals come last
+            index.tail(2000),  # Footer
+            *index.around("header", before=100, after=300),
+            *index.tables,  # Line items
+            *index.page_heads(500),
+        ], settings.prompt_tokens_bill, purpose="bill")
     
     def _extract_with_regex(self, text: str, filename: str = "") -> BillData:
         """
@@ -115,7 +197,6 @@ Extract structured information from hospital bills and invoices, even from poorl
         Returns:
             BillData with extracted fields (fields may be null if not found)
         """
-        import re
         bill_data = BillData()
         
         # DEBUG: Log sample of text to verify OCR output
@@ -124,22 +205,13 @@ Extract structured information from hospital bills and invoices, even from poorl
                     sample=text[:800],  # First 800 chars to see header/patient info
                     total_length=len(text))
         
+        # One keyword scan shared by every pattern below
+        index = AnchorIndex(text, self.REGEX_ANCHORS)
+        
         # 1. Extract hospital name from filename first (most reliable)
         if filename:
             filename_lower = filename.lower()
-            hospital_mappings = {
-                'apollo': 'Apollo Hospitals',
-                'appolo': 'Apollo Hospitals',
-                'max': 'Max Healthcare',
-                'fortis': 'Fortis Healthcare',
-                'ganga ram': 'Sir Ganga Ram Hospital',
-                'gangaram': 'Sir Ganga Ram Hospital',
-                'aiims': 'AIIMS',
-                'medanta': 'Medanta',
-                'manipal': 'Manipal Hospitals',
-            }
-            
-            for key, hospital_name in hospital_mappings.items():
+            for key, hospital_name in self.HOSPITAL_MAPPINGS.items():
                 if key in filename_lower:
                     bill_data.hospital_name = hospital_name
                     logger.info("bill_hospital_fallback", hospital=hospital_name)
@@ -147,37 +219,15 @@ Extract structured information from hospital bills and invoices, even from poorl
         
         # 2. If not in filename, try regex extraction from document text
         if not bill_data.hospital_name:
-            hospital_patterns = [
-                r'(Apollo\s+Hospitals?(?:\s+[\w\s]+)?)',
-                r'(Max\s+(?:Healthcare|Hospital|Super\s+Speciality\s+Hospital)(?:\s+[\w\s]+)?)',
-                r'(Fortis\s+(?:Healthcare|Hospital)(?:\s+[\w\s]+)?)',
-                r'(Sir\s+Ganga\s+Ram\s+Hospital)',
-                r'(AIIMS(?:\s+[\w\s]+)?)',
-                r'(Medanta(?:\s+[\w\s]+)?)',
-                r'(Manipal\s+Hospitals?(?:\s+[\w\s]+)?)',
-            ]
-            
-            for pattern in hospital_patterns:
-                match = re.search(pattern, text, re.IGNORECASE)
+            for pattern in self.HOSPITAL_PATTERNS:
+                match = pattern.search(index)
                 if match:
                     bill_data.hospital_name = ' '.join(match.group(1).split())
                     break
         
         # 3. Extract total amount (CRITICAL FIELD - try multiple patterns)
-        amount_patterns = [
-            # Insurance bill patterns (Fortis, Apollo style) - PRIORITY
-            r'payor\s*amount\s*[:\-]?\s*(?:rs\.?|inr|₹)?\s*([0-9,]+\.?[0-9]*)',
-            r'net\s*(?:bill\s*)?amount\s*[:\-]?\s*(?:rs\.?|inr|₹)?\s*([0-9,]+\.?[0-9]*)',
-            r'net\s*payable\s*amount?\s*[:\-]?\s*(?:rs\.?|inr|₹)?\s*\(?\s*([0-9,]+\.?[0-9]*)\s*\)?',
-            r'bill\s*amount\s*[:\-]?\s*(?:rs\.?|inr|₹)?\s*([0-9,]+\.?[0-9]*)',
-            # Common patterns
-            r'(?:total|final)\s*amount\s*[:\-]?\s*(?:rs\.?|inr|₹)?\s*([0-9,]+\.?[0-9]*)',
-            r'grand\s*total\s*[:\-]?\s*(?:rs\.?|inr|₹)?\s*([0-9,]+\.?[0-9]*)',
-            r'amount\s*(?:payable|due)\s*[:\-]?\s*(?:rs\.?|inr|₹)?\s*([0-9,]+\.?[0-9]*)',
-        ]
-        
-        for pattern in amount_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE | re.MULTILINE)
+        for pattern in self.AMOUNT_PATTERNS:
+            matches = pattern.findall(index)
             if matches:
                 amounts = []
                 for match in matches:
@@ -189,48 +239,24 @@ Extract structured information from hospital bills and invoices, even from poorl
                     except:
                         pass
                 if amounts:
-                    from decimal import Decimal
                     bill_data.total_amount = Decimal(str(max(amounts)))  # Convert to Decimal
-                    logger.info("bill_amount_regex", amount=float(bill_data.total_amount), pattern=pattern[:50])
+                    logger.info("bill_amount_regex", amount=float(bill_data.total_amount), pattern=pattern.pattern[:50])
                     break
         
         # 4. Extract patient name (handle titles like Mrs., Mr., Dr.)
-        name_patterns = [
-            # Pattern 1: "Patient Name : Mrs. Mary Philo" (most common)
-            # Capture title + 1-3 capitalized words, stop at numbers or special patterns
-            r'patient\s*name\s*[:\-]?\s*((?:Mr|Mrs|Ms|Dr)\.?\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,2})(?:\s+(?:Bill|UHID|Age|Gender|\d))',
-            # Pattern 2: Simpler - title + name without lookahead (may capture extra, we'll strip)
-            r'patient\s*name\s*[:\-]?\s*((?:Mr|Mrs|Ms|Dr)\.?\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,3})',
-            # Pattern 3: "Patient Name : Mary Philo" (no title)
-            r'patient\s*name\s*[:\-]?\s*([A-Z][a-z]+\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)',
-        ]
-        for pattern in name_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in self.NAME_PATTERNS:
+            match = pattern.search(index)
             if match:
                 name = match.group(1).strip()
                 # Clean up: Remove common suffixes that shouldn't be in name
-                name = re.sub(r'\s+(Bill|UHID|Age|Gender|Episode|Admission).*$', '', name, flags=re.IGNORECASE)
+                name = self.NAME_SUFFIX.sub('', name)
                 bill_data.patient_name = name
-                logger.debug("patient_name_regex_match", pattern=pattern[:50], name=name)
+                logger.debug("patient_name_regex_match", pattern=pattern.pattern[:50], name=name)
                 break
         
         # 5. Extract date of service (multiple formats)
-        date_patterns = [
-            # Date with month name: "07-Feb-2025" or "7-Feb-25" (common in Indian hospitals)
-            r'(\d{1,2}[-/](?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[-/]\d{2,4})',
-            # Common numeric formats with clear labels
-            r'(?:bill|invoice)\s*date\s*[:\-]?\s*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
-            r'date\s*of\s*(?:service|admission|bill)\s*[:\-]?\s*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
-            r'(?:service|admission)\s*date\s*[:\-]?\s*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
-            # Date after "Admitted" keyword (common in bills)
-            r'admitted\s*(?:on)?\s*[:\-]?\s*(\d{1,2}[-/](?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[-/]\d{2,4})',
-            r'admitted\s*(?:on)?\s*[:\-]?\s*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
-            r'discharge\s*(?:date|on)?\s*[:\-]?\s*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
-            # Very loose: any date in header - but EXCLUDE episode numbers
-            r'(?<!Episode)(?<!episode)(?<!No)(?<!/)\s(\d{1,2}[-/]\d{1,2}[-/]\d{4})(?![/\d])',  # Must have 4-digit year, not part of longer sequence
-        ]
-        for pattern in date_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)  # Search FULL text (not just [:1500])
+        for pattern in self.DATE_PATTERNS:
+            match = pattern.search(index)  # Search FULL text (not just [:1500])
             if match:
                 extracted_date = match.group(1)
                 # Validate it looks like a real date (day <= 31, month <= 12)
@@ -241,38 +267,48 @@ Extract structured information from hospital bills and invoices, even from poorl
                         if parts[1].isalpha():
                             # Month name - valid, no need to validate numbers
                             bill_data.date_of_service = extracted_date
-                            logger.debug("date_regex_match", pattern=pattern[:50], date=extracted_date, format="dd-MMM-yyyy")
+                            logger.debug("date_regex_match", pattern=pattern.pattern[:50], date=extracted_date, format="dd-MMM-yyyy")
                             break
                         else:
                             # Numeric month - validate day/month range
                             day, month, year = int(parts[0]), int(parts[1]), int(parts[2])
                             if 1 <= day <= 31 and 1 <= month <= 12 and (year >= 2000 or year >= 24):
                                 bill_data.date_of_service = extracted_date
-                                logger.debug("date_regex_match", pattern=pattern[:50], date=extracted_date, format="dd/mm/yyyy")
+                                logger.debug("date_regex_match", pattern=pattern.pattern[:50], date=extracted_date, format="dd/mm/yyyy")
                                 break
                 except:
                     pass  # Invalid date format, try next pattern
         
         # 6. Extract bill number
-        bill_number_patterns = [
-            r'(?:bill|invoice|receipt)\s*(?:no|number|#)\s*[:\-]?\s*([A-Z0-9\-/]+)',
-            r'IPID\s*[:\-]?\s*([A-Z0-9\-/]+)',
-        ]
-        for pattern in bill_number_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in self.BILL_NUMBER_PATTERNS:
+            match = pattern.search(index)
             if match:
                 bill_data.bill_number = match.group(1).strip()
                 break
         
         return bill_data
     
-    async def extract(self, text: str, filename: str = "") -> BillData:
+    async def extract(
+        self,
+        text: str,
+        filename: str = "",
+        prefetched: Optional[Dict[str, Any]] = None,
+        normalized_text: Optional[str] = None,
+        section_index: Optional[SectionIndex] = None,
+    ) -> BillData:
         """
         Extract structured data from bill text.
         
         Args:
             text: Extracted text from bill PDF (full document)
             filename: Original filename
+            prefetched: Fields already extracted by the fused classification
+                call; used instead of a second LLM call when the fused prompt
+                held the whole bill or their total agrees with the regex total
+            normalized_text: `text` after normalize_ocr_text, when the caller
+                already has it
+            section_index: SectionIndex over `normalized_text`, when the
+                caller already has it
         
         Returns:
             BillData with extracted fields
@@ -286,7 +322,7 @@ Extract structured information from hospital bills and invoices, even from poorl
                 return BillData()  # Return empty data, no hallucination
             
             # Fix OCR spacing issues (common in scanned PDFs)
-            fixed_text = self._fix_ocr_text(text)
+            fixed_text = normalized_text if normalized_text is not None else normalize_ocr_text(text)
             
             # ======================================================
             # HYBRID APPROACH: Try REGEX FIRST, then LLM if needed
@@ -294,6 +330,12 @@ Extract structured information from hospital bills and invoices, even from poorl
             # ======================================================
             bill_data = self._extract_with_regex(fixed_text, filename)
             
+            # The fused classification call already paid for an LLM extraction
+            if prefetched is not None:
+                prefetched_data = self._check_prefetched(prefetched, fixed_text, bill_data, filename)
+                if prefetched_data is not None:
+                    return prefetched_data
+            
             # Check if we have critical fields from regex
             has_critical_fields = (
                 bill_data.total_amount is not None and 
@@ -314,29 +356,24 @@ Extract structured information from hospital bills and invoices, even from poorl
             # If regex extraction incomplete, use LLM as fallback
             logger.info("bill_extraction_using_llm_fallback", filename=filename)
             
-            # For long documents, use smart chunking to stay within token limits
-            # Gemini 1.5 Flash 8B: ~1M input tokens but 8K output tokens
-            # Aim for 15K chars max (~3750 tokens at 4 chars/token) to leave room for response
+            # Documents over the token budget are reduced to the sections that carry bill fields
             text_len = len(fixed_text)
-            if text_len > 15000:
-                # Strategy: Beginning (header) + Tables + End (footer) where totals often appear
-                # Look for table sections specifically
-                table_start = fixed_text.find('[TABLE]')
-                table_end = fixed_text.rfind('[/TABLE]')
+            index = section_index if section_index is not None else SectionIndex(fixed_text)
+            sampled_text = self._sample_text(index)
+            if len(sampled_text) < text_len:
+                # Sampling would drop line items: extract every chunk concurrently instead
+                if settings.bill_map_reduce_enabled:
+                    mapped = await self._extract_map_reduce(index, filename, bill_data)
+                    if mapped is not None:
+                        return mapped
                 
-                if table_start != -1 and table_end != -1:
-                    # We found table markers - prioritize table content
-                    header = fixed_text[:min(3000, table_start)]
-                    table_content = fixed_text[table_start:table_end + 8]  # Include [/TABLE]
-                    footer = fixed_text[max(table_end + 8, text_len - 2000):]
-                    sampled_text = f"{header}\n\n{table_content}\n\n{footer}"
-                else:
-                    # No tables - sample strategically (header, middle, footer)
-                    sampled_text = f"{fixed_text[:8000]}\n\n... [middle section omitted] ...\n\n{fixed_text[-7000:]}"
-                
-                logger.info("bill_text_chunked", original_len=text_len, sampled_len=len(sampled_text))
-            else:
-                sampled_text = fixed_text
+                logger.info(
+                    "bill_text_chunked",
+                    original_len=text_len,
+                    sampled_len=len(sampled_text),
+                    tables=len(index.tables),
+                    totals_found=len(index.sections["totals"])
+                )
             
             prompt = f"""<DOCUMENT_ANALYSIS_TASK>
 
@@ -415,6 +452,7 @@ Return ONLY valid JSON matching the schema above. No explanations, no markdown,
                 prompt=prompt,
                 system_prompt=self.SYSTEM_PROMPT,
                 max_tokens=8000,  # Increased for complex bills with many line items
+                response_schema=self.RESPONSE_SCHEMA,
             )
             
             # Parse into BillData model (with validation)
@@ -440,7 +478,7 @@ Return ONLY valid JSON matching the schema above. No explanations, no markdown,
             # CRITICAL FALLBACK: If LLM fails, use regex extraction
             # This ensures we always return SOMETHING even if API fails
             try:
-                fixed_text = self._fix_ocr_text(text)
+                fixed_text = normalized_text if normalized_text is not None else normalize_ocr_text(text)
                 bill_data = self._extract_with_regex(fixed_text, filename)
                 logger.info("bill_fallback_regex_used", filename=filename, hospital=bill_data.hospital_name)
                 return bill_data
@@ -448,6 +486,216 @@ Return ONLY valid JSON matching the schema above. No explanations, no markdown,
                 # If even regex fails, return empty data (don't hallucinate)
                 return BillData()
 
+    
+    def _amounts_agree(self, first: Decimal, second: Decimal) -> bool:
+        """Whether two totals match within RECONCILE_TOLERANCE (or ₹1)."""
+        return abs(first - second) <= max(Decimal(1), max(first, second) * self.RECONCILE_TOLERANCE)
+    
+    def _check_prefetched(
+        self,
+        prefetched: Dict[str, Any],
+        fixed_text: str,
+        regex_data: BillData,
+        filename: str = "",
+    ) -> Optional[BillData]:
+        """
+        Prefetched fields from the fused call, if they can be trusted.
+        
+        The fused prompt holds at most `prompt_tokens_fused` of the bill. A
+        longer bill's fields are only used when their total agrees with the
+        regex total; otherwise the bill goes through the normal path
+        (regex, then map-reduce with total reconciliation).
+        """
+        try:
+            bill_data = BillData(**prefetched)
+        except ValueError as e:
+            logger.warning("bill_prefetched_fields_invalid", filename=filename, error=str(e))
+            return None
+        
+        complete = get_token_counter().count(fixed_text) <= settings.prompt_tokens_fused
+        agrees = (
+            bill_data.total_amount is not None
+            and regex_data.total_amount is not None
+            and self._amounts_agree(bill_data.total_amount, regex_data.total_amount)
+        )
+        if not complete and not agrees:
+            logger.info(
+                "bill_prefetched_fields_unverified",
+                filename=filename,
+                amount=str(bill_data.total_amount) if bill_data.total_amount is not None else None,
+                regex_amount=str(regex_data.total_amount) if regex_data.total_amount is not None else None
+            )
+            return None
+        
+        logger.info(
+            "bill_extraction_prefetched",
+            filename=filename,
+            hospital=bill_data.hospital_name,
+            amount=str(bill_data.total_amount) if bill_data.total_amount else None,
+            verified_by="full_text" if complete else "regex_total"
+        )
+        return bill_data
+    
+    # ------------------------------------------------------------------
+    # Map-reduce mode for bills over their token budget: page-aligned
+    # chunks are extracted concurrently (latency tracks the slowest chunk,
+    # not the document), then merged by deterministic code.
+    # ------------------------------------------------------------------
+    async def _extract_map_reduce(self, index: SectionIndex, filename: str, regex_data: BillData) -> Optional[BillData]:
+        """
+        Extract a long bill chunk by chunk.
+        
+        Returns:
+            Merged BillData, or None if every chunk call failed
+        """
+        counter = get_token_counter()
+        chunk_tokens = max(settings.bill_chunk_tokens, -(-counter.count(index.text) // settings.bill_max_chunks))
+        spans = index.chunks(chunk_tokens, counter.count)
+        logger.info("bill_map_reduce_started", filename=filename, chunks=len(spans), chunk_tokens=chunk_tokens)
+        
+        results = await asyncio.gather(
+            *(
+                self._extract_chunk(index.text[start:end], part, len(spans), filename)
+                for part, (start, end) in enumerate(spans, 1)
+            ),
+            return_exceptions=True,
+        )
+        
+        chunks = []
+        for part, result in enumerate(results, 1):
+            if isinstance(result, BaseException):
+                logger.warning(
+                    "bill_map_chunk_failed",
+                    filename=filename,
+                    part=part,
+                    error=str(result),
+                    error_type=type(result).__name__
+                )
+            elif isinstance(result, dict):
+                chunks.append(result)
+        
+        if not chunks:
+            return None
+        return self._reduce_chunks(chunks, regex_data, filename)
+    
+    async def _extract_chunk(self, chunk: str, part: int, parts: int, filename: str) -> Dict[str, Any]:
+        """Line items, stated totals and any header fields in one chunk of a bill."""
+        prompt = f"""Extract billing data from part {part} of {parts} of a hospital bill.
+
+Filename: {filename}
+
+---BEGIN PART---
+{chunk}
+---END PART---
+
+Rules:
+- line_items: every charge row in this part as {{description, quantity, rate, amount}}; skip subtotal and total rows
+- stated_totals: every total printed in this part (subtotals, "Total Amount", "Grand Total", "Net Payable", ...) with its label as printed
+- hospital_name, patient_name, bill_number, date_of_service (YYYY-MM-DD): only if shown in this part, else null
+- Numbers: digits only, no currency symbols or commas
+- Never guess: use null or empty arrays for anything not in this part
+
+Return ONLY valid JSON."""
+        
+        return await self.llm.generate_structured(
+            prompt=prompt,
+            system_prompt=self.SYSTEM_PROMPT,
+            max_tokens=8000,
+            response_schema=self.CHUNK_RESPONSE_SCHEMA,
+        )
+    
+    @staticmethod
+    def _to_amount(value: Any) -> Optional[Decimal]:
+        """Decimal from an LLM number (or numeric string), or None."""
+        if value is None or isinstance(value, bool):
+            return None
+        try:
+            amount = Decimal(str(value).replace(',', '').replace('₹', '').strip())
+        except InvalidOperation:
+            return None
+        return amount if amount.is_finite() else None
+    
+    def _total_rank(self, label: Any) -> Optional[int]:
+        """Priority of a stated-total label (lower wins), or None for a subtotal."""
+        label = " ".join(str(label or "").lower().split())
+        return next((rank for rank, keyword in enumerate(self.TOTAL_LABELS) if keyword in label), None)
+    
+    @staticmethod
+    def _valid_header(name: str, value: Any) -> Any:
+        """`value` validated as BillData field `name`, or None if it does not validate."""
+        try:
+            return getattr(BillData.model_validate({name: value}), name)
+        except ValidationError:
+            return None
+    
+    def _reduce_chunks(self, chunks: List[Dict[str, Any]], regex_data: BillData, filename: str = "") -> BillData:
+        """
+        Merge per-chunk extractions (in document order) into one BillData.
+        
+        Header fields take the first value that validates, then the regex
+        result, so one chunk's malformed field cannot fail the whole merge.
+        Line items are concatenated and summed. The total is the stated total
+        with the highest-priority label (the last one printed among equals),
+        reconciled against the line-item sum; the sum is used only when no
+        grand total is stated.
+        """
+        fields = {}
+        for name in ("hospital_name", "patient_name", "bill_number", "date_of_service"):
+            values = (self._valid_header(name, chunk[name]) for chunk in chunks if chunk.get(name))
+            fields[name] = next((value for value in values if value is not None), None)
+        
+        line_items = [
+            item
+            for chunk in chunks
+            for item in chunk.get("line_items") or []
+            if isinstance(item, dict)
+        ]
+        amounts = [self._to_amount(item.get("amount")) for item in line_items]
+        items_sum = sum((amount for amount in amounts if amount is not None), Decimal(0))
+        
+        stated_total, stated_label, stated_rank = None, None, None
+        for chunk in chunks:
+            for total in chunk.get("stated_totals") or []:
+                if not isinstance(total, dict):
+                    continue
+                rank = self._total_rank(total.get("label"))
+                amount = self._to_amount(total.get("amount"))
+                if rank is None or amount is None or amount < 0:
+                    continue
+                if stated_rank is None or rank <= stated_rank:
+                    stated_total, stated_label, stated_rank = amount, total.get("label"), rank
+        
+        if stated_total is not None:
+            total_amount, total_source = stated_total, "stated_total"
+        elif items_sum > 0:
+            total_amount, total_source = items_sum, "line_items"
+        else:
+            total_amount, total_source = regex_data.total_amount, "regex"
+        
+        difference = stated_total - items_sum if stated_total is not None and items_sum else None
+        reconciled = difference is not None and self._amounts_agree(stated_total, items_sum)
+        
+        bill_data = BillData(**fields, total_amount=total_amount, line_items=line_items)
+        for name in ("hospital_name", "patient_name", "bill_number", "date_of_service"):
+            if getattr(bill_data, name) is None:
+                setattr(bill_data, name, getattr(regex_data, name))
+        
+        log = logger.warning if difference is not None and not reconciled else logger.info
+        log(
+            "bill_map_reduce_completed",
+            filename=filename,
+            chunks=len(chunks),
+            line_items=len(line_items),
+            items_sum=str(items_sum),
+            stated_total=str(stated_total) if stated_total is not None else None,
+            stated_label=stated_label,
+            total_source=total_source,
+            reconciled=reconciled,
+            difference=str(difference) if difference is not None else None
+        )
+        
+        return bill_data
+
 
 class DischargeAgent:
     """
@@ -482,73 +730,77 @@ Maintain medical accuracy and extract dates in consistent format."""
         "medications": "array of strings or empty array"
     }
     
+    RESPONSE_SCHEMA = response_schema_for(DischargeSummaryData)
+    
+    # Fields a prefetched extraction of an over-budget (sampled) summary must include
+    PREFETCH_REQUIRED_FIELDS = ("patient_name", "diagnosis", "admission_date", "discharge_date")
+    
     def __init__(self):
         """Initialize discharge agent."""
         self.llm = get_llm_service()
         logger.info("discharge_agent_initialized")
     
-    async def extract(self, text: str, filename: str = "") -> DischargeSummaryData:
+    def _check_prefetched(
+        self,
+        prefetched: Dict[str, Any],
+        fixed_text: str,
+        filename: str = "",
+    ) -> Optional[DischargeSummaryData]:
         """
-        Extract structured data from discharge summary.
-        
-        Args:
-            text: Extracted text from discharge summary PDF (full document)
-            filename: Original filename
+        Prefetched fields from the fused call, if they can be trusted.
         
-        Returns:
-            DischargeSummaryData with extracted fields
+        The fused prompt holds at most `prompt_tokens_fused` of the document.
+        A longer summary's fields are only used when all of
+        PREFETCH_REQUIRED_FIELDS were found; otherwise it goes through the
+        normal extraction, which samples the discharge sections.
         """
         try:
-            logger.info("discharge_extraction_started", filename=filename)
-            
-            # Check if we have any meaningful text to process
-            if not text or len(text.strip()) < 10:
-                logger.warning("discharge_extraction_no_text", filename=filename, text_length=len(text))
-                return DischargeSummaryData()  # Return empty data, no hallucination
-            
-            # OCR TEXT PREPROCESSING: Fix common OCR artifacts
-            import re
-            
-            # Fix spaced characters
-            fixed_text = re.sub(r'(\d)\s+(?=\d)', r'\1', text)  # "3 2 5 6" → "3256"
-            fixed_text = re.sub(r'([A-Z])\s+([a-z])\s+([a-z])', r'\1\2\3', fixed_text)  # "M r s" → "Mrs"
-            fixed_text = re.sub(r'([A-Z])\s+([A-Z])\s+([A-Z])', r'\1\2\3', fixed_text)  # "V S L" → "VSL"
-            fixed_text = re.sub(r'([A-Za-z])\s+([A-Za-z])\s+([A-Za-z])\s*\.', r'\1\2\3.', fixed_text)  # "M r s ." → "Mrs."
-            fixed_text = re.sub(r'([A-Z])\s+([A-Z][a-z])', r'\1\2', fixed_text)  # "N ANDI" → "NANDI"
-            
-            # Fix OCR character substitutions
-            ocr_fixes = {
-                r'Mate\)': 'Male',
-                r'Femate\)': 'Female',
-                r'(\w+)!_\s+': r'\1 ',
-                r'!_': '',
-                r'\s+\)': ')',
-                r'\(\s+': '(',
-                r'\s+:': ':',
-                r':\s{2,}': ': ',
-            }
-            
-            for pattern, replacement in ocr_fixes.items():
-                fixed_text = re.sub(pattern, replacement, fixed_text)
-            
-            # For long documents, look for discharge summary section specifically
-            text_len = len(fixed_text)
-            if text_len > 10000:
-                # Find "Discharge Summary" section if it exists
-                text_lower = fixed_text.lower()
-                discharge_pos = text_lower.find("discharge summary")
-                
-                if discharge_pos > 0:
-                    # Extract from discharge summary section onwards (up to 5000 chars)
-                    sampled_text = fixed_text[discharge_pos:discharge_pos + 5000]
-                    logger.info("discharge_section_found", filename=filename, position=discharge_pos)
-                else:
-                    # Sample strategically from end where discharge summaries often are
-                    sampled_text = f"{fixed_text[:2000]}\n\n... [middle] ...\n\n{fixed_text[-5000:]}"
-            else:
-                sampled_text = fixed_text
-            
-            prompt = f"""Extract all relevant information from this medical discharge summary:
+            discharge_data = DischargeSummaryData(**prefetched)
+        except ValueError as e:
+            logger.warning("discharge_prefetched_fields_invalid", filename=filename, error=str(e))
+            return None
+        
+        complete = get_token_counter().count(fixed_text) <= settings.prompt_tokens_fused
+        missing = [name for name in self.PREFETCH_REQUIRED_FIELDS if not getattr(discharge_data, name)]
+        if not complete and missing:
+            logger.info("discharge_prefetched_fields_unverified", filename=filename, missing=missing)
+            return None
+        
+        logger.info(
+            "discharge_extraction_prefetched",
+            filename=filename,
+            verified_by="full_text" if complete else "required_fields"
+        )
+        return discharge_data
+    
+    def _sample_text(self, index: SectionIndex) -> str:
+        """The discharge summary section and clinical headings of a long document."""
+        section_start = index.first("discharge")
+        spans = [(section_start, section_start + 4000)] if section_start != -1 else []
+        return fit_sections(index, [
+            *spans,
+            index.head(1500),  # Patient details
+            *index.around("discharge", before=50, after=800),
+            *index.around("header", before=100, after=300),
+            index.tail(1500),
+        ], settings.prompt_tokens_discharge, purpose="discharge_summary")
+    
+    def _build_prompt(self, filename: str, fixed_text: str, section_index: Optional[SectionIndex] = None) -> str:
+        """Build the extraction prompt from the (sampled) normalized text."""
+        # Documents over the token budget are reduced to the discharge summary sections
+        text_len = len(fixed_text)
+        index = section_index if section_index is not None else SectionIndex(fixed_text)
+        sampled_text = self._sample_text(index)
+        if len(sampled_text) < text_len:
+            logger.info(
+                "discharge_text_chunked",
+                filename=filename,
+                original_len=text_len,
+                sampled_len=len(sampled_text),
+                section_position=index.first("discharge")
+            )
+        
+        return f"""Extract all relevant information from this medical discharge summary:
 
 Filename: {filename}
 Content:
@@ -569,15 +821,66 @@ Return the data in this JSON format:
 - **Date Format**: Convert any date format (DD/MM/YYYY, DD-MM-YYYY) to YYYY-MM-DD
 - Process ALL table content systematically for medical information
 - Extract even partial information - don't leave fields null if you find ANY related data"""
+    
+    async def extract(
+        self,
+        text: str,
+        filename: str = "",
+        prefetched: Optional[Dict[str, Any]] = None,
+        normalized_text: Optional[str] = None,
+        section_index: Optional[SectionIndex] = None,
+    ) -> DischargeSummaryData:
+        """
+        Extract structured data from discharge summary.
+        
+        Args:
+            text: Extracted text from discharge summary PDF (full document)
+            filename: Original filename
+            prefetched: Fields already extracted by the fused classification
+                call; used instead of a second LLM call if they pass
+                `_check_prefetched`
+            normalized_text: `text` after normalize_ocr_text, when the caller
+                already has it
+            section_index: SectionIndex over `normalized_text`, when the
+                caller already has it
+        
+        Returns:
+            DischargeSummaryData with extracted fields
+        """
+        try:
+            logger.info("discharge_extraction_started", filename=filename)
             
-            response = await self.llm.generate_structured(
-                prompt=prompt,
-                system_prompt=self.SYSTEM_PROMPT,
-                max_tokens=6000,  # Increased for comprehensive discharge summaries
-            )
+            # Check if we have any meaningful text to process
+            if not text or len(text.strip()) < 10:
+                logger.warning("discharge_extraction_no_text", filename=filename, text_length=len(text))
+                return DischargeSummaryData()  # Return empty data, no hallucination
+            
+            # OCR TEXT PREPROCESSING: Fix common OCR artifacts
+            fixed_text = normalized_text if normalized_text is not None else normalize_ocr_text(text)
             
-            # Parse into DischargeSummaryData model
-            discharge_data = DischargeSummaryData(**response)
+            try:
+                discharge_data = None
+                if prefetched is not None:
+                    discharge_data = self._check_prefetched(prefetched, fixed_text, filename)
+                if discharge_data is None:
+                    response = await self.llm.generate_structured(
+                        prompt=self._build_prompt(filename, fixed_text, section_index),
+                        system_prompt=self.SYSTEM_PROMPT,
+                        max_tokens=6000,  # Increased for comprehensive discharge summaries
+                        response_schema=self.RESPONSE_SCHEMA,
+                    )
+                    
+                    # Parse into DischargeSummaryData model
+                    discharge_data = DischargeSummaryData(**response)
+            except Exception as llm_error:
+                # LLM failed or the deadline left no time - regex patterns below fill what they can
+                logger.warning(
+                    "discharge_llm_failed_using_regex",
+                    filename=filename,
+                    error=str(llm_error),
+                    error_type=type(llm_error).__name__
+                )
+                discharge_data = DischargeSummaryData()
             
             # Fallback extraction if LLM fails - use original text for regex patterns
             if not discharge_data.patient_name or not discharge_data.admission_date or not discharge_data.diagnosis:
@@ -690,18 +993,64 @@ Extract all identifying information accurately."""
         "valid_until": "string in YYYY-MM-DD format or null"
     }
     
+    RESPONSE_SCHEMA = response_schema_for(IDCardData)
+    
+    # Fields a prefetched extraction of an over-budget (sampled) card must include
+    PREFETCH_REQUIRED_FIELDS = ("policy_holder_name", "policy_number")
+    
     def __init__(self):
         """Initialize ID card agent."""
         self.llm = get_llm_service()
         logger.info("idcard_agent_initialized")
     
-    async def extract(self, text: str, filename: str = "") -> IDCardData:
+    def _check_prefetched(
+        self,
+        prefetched: Dict[str, Any],
+        text: str,
+        filename: str = "",
+    ) -> Optional[IDCardData]:
+        """
+        Prefetched fields from the fused call, if they can be trusted.
+        
+        The fused prompt holds at most `prompt_tokens_fused` of the document.
+        A longer document's fields are only used when all of
+        PREFETCH_REQUIRED_FIELDS were found; otherwise it goes through the
+        normal extraction.
+        """
+        try:
+            idcard_data = IDCardData(**prefetched)
+        except ValueError as e:
+            logger.warning("idcard_prefetched_fields_invalid", filename=filename, error=str(e))
+            return None
+        
+        complete = get_token_counter().count(text) <= settings.prompt_tokens_fused
+        missing = [name for name in self.PREFETCH_REQUIRED_FIELDS if not getattr(idcard_data, name)]
+        if not complete and missing:
+            logger.info("idcard_prefetched_fields_unverified", filename=filename, missing=missing)
+            return None
+        
+        logger.info(
+            "idcard_extraction_prefetched",
+            filename=filename,
+            verified_by="full_text" if complete else "required_fields"
+        )
+        return idcard_data
+    
+    async def extract(
+        self,
+        text: str,
+        filename: str = "",
+        prefetched: Optional[Dict[str, Any]] = None,
+    ) -> IDCardData:
         """
         Extract structured data from insurance ID card.
         
         Args:
             text: Extracted text from ID card PDF
             filename: Original filename
+            prefetched: Fields already extracted by the fused classification
+                call; used instead of a second LLM call if they pass
+                `_check_prefetched`
         
         Returns:
             IDCardData with extracted fields
@@ -709,6 +1058,11 @@ Extract all identifying information accurately."""
         try:
             logger.info("idcard_extraction_started", filename=filename)
             
+            if prefetched is not None:
+                idcard_data = self._check_prefetched(prefetched, text, filename)
+                if idcard_data is not None:
+                    return idcard_data
+            
             prompt = f"""Extract all relevant information from this insurance ID card:
 
 {text[:2000]}
@@ -724,6 +1078,7 @@ Important:
             response = await self.llm.generate_structured(
                 prompt=prompt,
                 system_prompt=self.SYSTEM_PROMPT,
+                response_schema=self.RESPONSE_SCHEMA,
             )
             
             # Parse into IDCardData model
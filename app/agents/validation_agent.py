@@ -289,6 +289,7 @@ Provide a 1-2 sentence summary: Overall data quality assessment and whether the
                 system_prompt=self.SYSTEM_PROMPT,
                 temperature=0.3,
                 max_tokens=300,  # Increased for proper validation summary
+                priority="background",  # Narrative only; rule-based fallback exists
             )
             
             return summary.strip()
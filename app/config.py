@@ -29,14 +29,79 @@ class Settings(BaseSettings):
     gemini_model: str = "gemini-2.0-flash-lite"  # 4000 RPM, faster and cheaper
     openai_model: str = "gpt-4-turbo-preview"
     llm_temperature: float = 0.1
-    llm_max_retries: int = 3
-    llm_timeout: int = 60
+    llm_max_retries: int = 3  # Attempts for transient errors (429/5xx/network) only
+    llm_retry_max_wait: float = 30.0  # Cap on a provider's Retry-After
+    llm_timeout: int = 60  # Cap per LLM call, retries included
+    request_timeout: int = 120  # Total budget for one /process-claim request
+    llm_min_call_budget: float = 2.0  # Skip LLM calls (use regex/rules) with less time left
+    llm_stream_structured: bool = True  # Parse structured output incrementally as it streams
+    
+    # LLM Rate Limiting (provider quotas, shared by all requests in this process)
+    llm_rate_limit_enabled: bool = True
+    llm_rate_limit_headroom: float = 0.9  # Fraction of the quota we allow ourselves to use
+    llm_max_in_flight: int = 16  # Concurrent calls per provider
+    gemini_rpm: int = 4000
+    gemini_tpm: int = 4000000
+    openai_rpm: int = 500
+    openai_tpm: int = 30000
+    
+    # LLM Failover & Hedging
+    llm_fallback_provider: Literal["", "google", "openai"] = ""  # Secondary provider; empty disables
+    llm_hedge_enabled: bool = True
+    llm_hedge_percentile: float = 0.95  # Hedge once the primary is slower than this latency percentile
+    llm_hedge_initial_delay: float = 10.0  # Used until enough latency samples exist
+    llm_hedge_min_delay: float = 1.0
+    llm_hedge_min_samples: int = 20
+    llm_latency_window: int = 200  # Recent calls kept per provider for percentiles
+    llm_circuit_failure_threshold: int = 3  # Consecutive failed calls (after retries) before failover
+    llm_circuit_reset_timeout: float = 30.0
     
     # File Upload
     max_file_size: int = 10485760  # 10MB
     max_files_per_request: int = 10
     allowed_extensions: str = "pdf"
     
+    # PDF Extraction
+    pdf_extraction_strategy: Literal["race", "sequential"] = "race"
+    pdf_parallel_enabled: bool = True
+    pdf_process_workers: int = 0  # 0 = one per CPU core
+    pdf_parallel_min_pages: int = 8  # Smaller documents are parsed in a single thread
+    ocr_page_min_chars: int = 20  # Pages with less native text are OCRed
+    ocr_adaptive_enabled: bool = True  # Cheap pass first, re-render low-confidence pages
+    ocr_low_dpi: int = 150
+    ocr_high_dpi: int = 300
+    ocr_min_confidence: float = 70.0  # Mean Tesseract word confidence (0-100)
+    ocr_workers: int = 2  # Concurrent pdf2image/Tesseract jobs
+    ocr_max_queue: int = 20  # Jobs waiting for a worker; further submissions wait for a slot
+    ocr_max_pending_pages: int = 60  # Admitted pages not yet OCRed before new documents get 503
+    ocr_retry_after: int = 30  # Retry-After seconds before any OCR timing is known
+    ocr_store_enabled: bool = True  # Persist per-page OCR output across restarts
+    ocr_store_path: str = "./data/ocr_pages.sqlite3"
+    ocr_store_max_mb: int = 256  # Oldest pages are evicted beyond this size
+    
+    # Classification
+    classification_batch_enabled: bool = True  # Classify all files of a claim in one LLM call
+    classification_batch_max_docs: int = 10  # Larger claims are split into groups of this size
+    classification_local_enabled: bool = True  # Keyword classifier first, LLM only when unsure
+    classification_local_threshold: float = 0.85  # Local confidence needed to skip the LLM
+    classification_fused_enabled: bool = True  # Classify and extract a claim's documents in one LLM call
+    classification_fused_min_confidence: float = 0.8  # Below this, re-extract with the type's agent
+    classification_fused_batch_max_docs: int = 4  # Fused groups are smaller: each result carries fields
+    
+    # Prompt token budgets for document text (counted for the configured
+    # provider); longer documents are reduced to their highest-ranked sections
+    prompt_tokens_classification: int = 1500
+    prompt_tokens_fused: int = 4000
+    prompt_tokens_bill: int = 4000
+    prompt_tokens_discharge: int = 2000
+    
+    # Map-reduce extraction for bills over prompt_tokens_bill: line items and
+    # stated totals are extracted from page-aligned chunks concurrently, then
+    # summed and reconciled (chunks grow when a bill needs more than the cap)
+    bill_map_reduce_enabled: bool = True
+    bill_chunk_tokens: int = 3000
+    bill_max_chunks: int = 16
+    
     # Redis
     redis_host: str = "localhost"
     redis_port: int = 6379
@@ -44,7 +109,15 @@ class Settings(BaseSettings):
     redis_password: str = ""
     redis_enabled: bool = False
     cache_ttl: int = 3600
-    
+
+    # Caching
+    extraction_cache_enabled: bool = True
+    extraction_cache_max_entries: int = 128
+    extraction_cache_dir: str = ""  # e.g. ./data/cache; used when Redis is disabled
+    llm_cache_enabled: bool = True
+    llm_cache_max_entries: int = 512
+    llm_cache_max_temperature: float = 0.3  # Skip caching for sampling-heavy calls
+
     # PostgreSQL
     postgres_host: str = "localhost"
     postgres_port: int = 5432
@@ -18,6 +18,14 @@ from fastapi.exceptions import RequestValidationError
 from app.config import settings
 from app.schemas import ProcessClaimResponse, ErrorResponse, ErrorDetail, DocumentType
 from app.orchestrator import get_orchestrator
+from app.services.cache_service import get_extraction_cache, get_llm_cache
+from app.services.pdf_service import shutdown_process_pool
+from app.services.ocr_pool import OCRQueueFullError, get_ocr_pool, shutdown_ocr_pool
+from app.services.ocr_store import get_ocr_store, close_ocr_store
+from app.services.rate_limiter import get_rate_limiter_stats
+from app.services.provider_health import get_provider_health_stats
+from app.services.llm_retry import get_retry_stats
+from app.utils.deadline import Deadline
 from app.utils.logging import setup_logging, get_logger
 
 # Setup logging
@@ -40,6 +48,9 @@ async def lifespan(app: FastAPI):
     
     yield
     
+    shutdown_process_pool()
+    shutdown_ocr_pool()
+    close_ocr_store()
     logger.info("application_shutdown")
 
 
@@ -120,7 +131,8 @@ async def http_exception_handler(request: Request, exc: HTTPException):
             error=exc.detail,
             details=[],
             request_id=request.headers.get(settings.correlation_id_header)
-        ).model_dump()
+        ).model_dump(),
+        headers=exc.headers,
     )
 
 
@@ -206,6 +218,7 @@ async def process_claim(
         HTTPException: If validation fails or processing errors occur
     """
     start_time = time.time()
+    deadline = Deadline(settings.request_timeout)  # Upload validation counts against the budget too
     request_id = request.headers.get(settings.correlation_id_header, str(uuid.uuid4()))
     
     logger.info(
@@ -272,6 +285,7 @@ async def process_claim(
         final_state = await orchestrator.process_claim(
             files=validated_files,
             request_id=request_id,
+            deadline=deadline,
         )
         
         # ====================================================================
@@ -325,6 +339,18 @@ async def process_claim(
         
     except HTTPException:
         raise
+    except OCRQueueFullError as e:
+        logger.warning(
+            "process_claim_rejected_ocr_backpressure",
+            request_id=request_id,
+            queue_depth=e.queue_depth,
+            retry_after=e.retry_after
+        )
+        raise HTTPException(
+            status_code=503,
+            detail="OCR capacity exhausted. Please retry later.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except Exception as e:
         logger.error(
             "process_claim_error",
@@ -359,6 +385,23 @@ async def debug_config():
     }
 
 
+@app.get("/debug/stats")
+async def debug_stats():
+    """Debug endpoint to view runtime cache and pipeline statistics."""
+    if not settings.debug:
+        raise HTTPException(status_code=404, detail="Not found")
+    
+    return {
+        "extraction_cache": get_extraction_cache().stats(),
+        "llm_cache": get_llm_cache().stats(),
+        "ocr_pool": get_ocr_pool().stats(),
+        "ocr_store": get_ocr_store().stats() if settings.ocr_store_enabled else None,
+        "llm_rate_limits": get_rate_limiter_stats(),
+        "llm_providers": get_provider_health_stats(),
+        "llm_retries": get_retry_stats(),
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     
@@ -5,19 +5,21 @@ AI Tool Used: Claude + Cursor for LangGraph implementation
 Prompt: "Design a LangGraph StateGraph for orchestrating a multi-agent document
 processing pipeline with states for classification, extraction, processing, validation, and decision"
 """
-from typing import List, Dict, Any, TypedDict, Annotated
+from typing import List, Dict, Any, TypedDict, Annotated, Optional
 import asyncio
 from decimal import Decimal
 from langgraph.graph import StateGraph, END
 from fastapi import UploadFile
 
+from app.config import settings
 from app.schemas import (
     DocumentType,
     ProcessedDocument,
     ValidationResult,
     ClaimDecision,
 )
-from app.services.pdf_service import get_pdf_service
+from app.services.pdf_service import PDFDocument, get_pdf_service
+from app.services.ocr_pool import OCRQueueFullError
 from app.agents.classifier_agent import get_classifier_agent
 from app.agents.processing_agents import (
     get_bill_agent,
@@ -26,6 +28,9 @@ from app.agents.processing_agents import (
 )
 from app.agents.validation_agent import get_validation_agent
 from app.agents.decision_agent import get_decision_agent
+from app.utils.deadline import Deadline, deadline_scope
+from app.utils.section_index import SectionIndex
+from app.utils.text_normalizer import normalize_ocr_text
 from app.utils.logging import get_logger
 
 logger = get_logger(__name__)
@@ -40,10 +45,15 @@ class WorkflowState(TypedDict):
     # Input
     files: List[tuple[str, bytes]]  # (filename, content)
     request_id: str
+    deadline: Deadline  # Shared by every stage; LLM calls read it from context
+    documents: Dict[str, PDFDocument]  # filename -> parsed handle, closed when the request ends
     
     # Intermediate results
     extracted_texts: Dict[str, str]  # filename -> text
+    normalized_texts: Dict[str, str]  # filename -> text after OCR normalization, shared by the agents
+    section_indexes: Dict[str, SectionIndex]  # filename -> pages/tables/headings of the normalized text
     classified_docs: List[Dict[str, Any]]  # classification results
+    prefetched_fields: Dict[str, Dict[str, Any]]  # filename -> fields from a fused classify+extract call
     processed_docs: List[ProcessedDocument]  # processed with extracted data
     
     # Final results
@@ -103,19 +113,41 @@ class ClaimOrchestrator:
         
         return workflow.compile()
     
+    @staticmethod
+    def _remaining_ms(state: WorkflowState) -> float:
+        """Milliseconds left before the request deadline (for stage logs)."""
+        return round(state["deadline"].remaining() * 1000, 1)
+    
     async def _extract_text_node(self, state: WorkflowState) -> WorkflowState:
         """
         Node 1: Extract text from all PDF files.
         """
-        logger.info("workflow_extract_text_started", file_count=len(state["files"]))
+        logger.info(
+            "workflow_extract_text_started",
+            file_count=len(state["files"]),
+            remaining_ms=self._remaining_ms(state)
+        )
         
         extracted_texts = {}
         
         # Extract text from all files in parallel
         async def extract_one(filename: str, content: bytes):
+            # Parse each file at most once; text, tables and OCR page counts share it
+            document = PDFDocument(content)
+            state["documents"][filename] = document
             try:
-                text = await self.pdf_service.extract_text(content, filename)
+                # Extraction may use whatever budget remains; later stages fall back to rules
+                text = await asyncio.wait_for(
+                    self.pdf_service.extract_text(content, filename, document),
+                    timeout=state["deadline"].remaining()
+                )
                 return filename, text
+            except OCRQueueFullError:
+                raise
+            except asyncio.TimeoutError:
+                logger.error("text_extraction_deadline_exceeded", filename=filename)
+                state["errors"].append(f"Text extraction for {filename} exceeded the request deadline")
+                return filename, ""
             except Exception as e:
                 logger.error("text_extraction_failed", filename=filename, error=str(e))
                 state["errors"].append(f"Failed to extract text from {filename}: {str(e)}")
@@ -127,7 +159,22 @@ class ClaimOrchestrator:
         for filename, text in results:
             extracted_texts[filename] = text
         
+        # Normalize and index each document once here rather than in every agent that reads it
+        def prepare(text: str) -> tuple[str, SectionIndex]:
+            normalized_text = normalize_ocr_text(text)
+            return normalized_text, SectionIndex(normalized_text)
+        
+        prepared = await asyncio.gather(*[
+            asyncio.to_thread(prepare, text) for text in extracted_texts.values()
+        ])
+        
         state["extracted_texts"] = extracted_texts
+        state["normalized_texts"] = {
+            filename: normalized_text for filename, (normalized_text, _) in zip(extracted_texts, prepared)
+        }
+        state["section_indexes"] = {
+            filename: index for filename, (_, index) in zip(extracted_texts, prepared)
+        }
         
         logger.info("workflow_extract_text_completed", extracted_count=len(extracted_texts))
         
@@ -137,7 +184,7 @@ class ClaimOrchestrator:
         """
         Node 2: Classify each document type.
         """
-        logger.info("workflow_classify_started")
+        logger.info("workflow_classify_started", remaining_ms=self._remaining_ms(state))
         
         # Prepare documents for classification
         documents = [
@@ -145,8 +192,14 @@ class ClaimOrchestrator:
             for filename, text in state["extracted_texts"].items()
         ]
         
-        # Classify all documents
-        classified = await self.classifier_agent.classify_batch(documents)
+        # Classify all documents; in fused mode the same call extracts the
+        # fields, so confident documents skip the second LLM round trip
+        if settings.classification_fused_enabled:
+            classified, state["prefetched_fields"] = await self.classifier_agent.classify_and_extract_batch(
+                documents, state["section_indexes"]
+            )
+        else:
+            classified = await self.classifier_agent.classify_batch(documents, state["section_indexes"])
         
         # Convert to dict format (store enum as string for serialization)
         classified_dicts = [
@@ -164,7 +217,8 @@ class ClaimOrchestrator:
         logger.info(
             "workflow_classify_completed",
             classified_count=len(classified_dicts),
-            types=[c["document_type"] for c in classified_dicts]
+            types=[c["document_type"] for c in classified_dicts],
+            prefetched=len(state["prefetched_fields"])
         )
         
         return state
@@ -173,7 +227,7 @@ class ClaimOrchestrator:
         """
         Node 3: Process each document with specialized agent.
         """
-        logger.info("workflow_process_started")
+        logger.info("workflow_process_started", remaining_ms=self._remaining_ms(state))
         
         processed_docs = []
         
@@ -183,6 +237,9 @@ class ClaimOrchestrator:
             doc_type_str = doc_info["document_type"]  # This is a string after serialization
             doc_type = DocumentType(doc_type_str)  # Convert string back to enum
             text = state["extracted_texts"].get(filename, "")
+            prefetched = state["prefetched_fields"].get(filename)
+            normalized_text = state["normalized_texts"].get(filename)
+            section_index = state["section_indexes"].get(filename)
             
             results = []  # May return multiple ProcessedDocuments if multi-section detected
             
@@ -213,7 +270,10 @@ class ClaimOrchestrator:
                 
                 if doc_type == DocumentType.BILL:
                     try:
-                        extracted = await self.bill_agent.extract(text, filename)
+                        extracted = await self.bill_agent.extract(
+                            text, filename, prefetched,
+                            normalized_text=normalized_text, section_index=section_index
+                        )
                         data = extracted.model_dump()
                     except Exception as bill_error:
                         logger.error("bill_extraction_failed", filename=filename, error=str(bill_error))
@@ -232,7 +292,10 @@ class ClaimOrchestrator:
                     # If multi-section detected, also extract discharge summary
                     if should_also_extract_discharge:
                         try:
-                            discharge_extracted = await self.discharge_agent.extract(text, filename)
+                            discharge_extracted = await self.discharge_agent.extract(
+                                text, filename,
+                                normalized_text=normalized_text, section_index=section_index
+                            )
                             discharge_data = discharge_extracted.model_dump()
                             
                             results.append(ProcessedDocument(
@@ -264,7 +327,10 @@ class ClaimOrchestrator:
                             )
                 
                 elif doc_type == DocumentType.DISCHARGE_SUMMARY:
-                    extracted = await self.discharge_agent.extract(text, filename)
+                    extracted = await self.discharge_agent.extract(
+                        text, filename, prefetched,
+                        normalized_text=normalized_text, section_index=section_index
+                    )
                     data = extracted.model_dump()
                     
                     results.append(ProcessedDocument(
@@ -277,7 +343,7 @@ class ClaimOrchestrator:
                     ))
                 
                 elif doc_type == DocumentType.ID_CARD:
-                    extracted = await self.idcard_agent.extract(text, filename)
+                    extracted = await self.idcard_agent.extract(text, filename, prefetched)
                     data = extracted.model_dump()
                     
                     results.append(ProcessedDocument(
@@ -325,7 +391,7 @@ class ClaimOrchestrator:
         """
         Node 4: Validate data consistency across documents.
         """
-        logger.info("workflow_validate_started")
+        logger.info("workflow_validate_started", remaining_ms=self._remaining_ms(state))
         
         try:
             validation = await self.validation_agent.validate(state["processed_docs"])
@@ -362,7 +428,7 @@ class ClaimOrchestrator:
         """
         Node 5: Make final claim decision.
         """
-        logger.info("workflow_decide_started")
+        logger.info("workflow_decide_started", remaining_ms=self._remaining_ms(state))
         
         try:
             decision = await self.decision_agent.decide(
@@ -397,6 +463,7 @@ class ClaimOrchestrator:
         self,
         files: List[tuple[str, bytes]],
         request_id: str,
+        deadline: Optional[Deadline] = None,
     ) -> WorkflowState:
         """
         Process a claim through the entire workflow.
@@ -404,22 +471,32 @@ class ClaimOrchestrator:
         Args:
             files: List of (filename, content) tuples
             request_id: Unique request identifier
+            deadline: Request deadline shared by all stages (defaults to
+                `request_timeout` from now)
         
         Returns:
             Final workflow state with all results
         """
+        deadline = deadline or Deadline(settings.request_timeout)
+        
         logger.info(
             "claim_processing_started",
             request_id=request_id,
-            file_count=len(files)
+            file_count=len(files),
+            budget_ms=round(deadline.remaining() * 1000, 1)
         )
         
         # Initialize state
         initial_state: WorkflowState = {
             "files": files,
             "request_id": request_id,
+            "deadline": deadline,
+            "documents": {},
             "extracted_texts": {},
+            "normalized_texts": {},
+            "section_indexes": {},
             "classified_docs": [],
+            "prefetched_fields": {},
             "processed_docs": [],
             "validation": None,
             "decision": None,
@@ -428,17 +505,21 @@ class ClaimOrchestrator:
         }
         
         try:
-            # Run the workflow
-            final_state = await self.workflow.ainvoke(initial_state)
+            # Run the workflow; node tasks inherit the deadline from this context
+            with deadline_scope(deadline):
+                final_state = await self.workflow.ainvoke(initial_state)
             
             logger.info(
                 "claim_processing_completed",
                 request_id=request_id,
-                errors_count=len(final_state["errors"])
+                errors_count=len(final_state["errors"]),
+                remaining_ms=round(deadline.remaining() * 1000, 1)
             )
             
             return final_state
             
+        except OCRQueueFullError:
+            raise  # Let the API shed load with 503 instead of a degraded result
         except Exception as e:
             logger.error(
                 "claim_processing_failed",
@@ -450,6 +531,12 @@ class ClaimOrchestrator:
             # Return state with error
             initial_state["errors"].append(f"Workflow failed: {str(e)}")
             return initial_state
+        
+        finally:
+            # Nodes fill this same dict, so every handle opened for the request is closed here
+            await asyncio.gather(*[
+                document.aclose() for document in initial_state["documents"].values()
+            ])
 
 
 # Global orchestrator instance
@@ -48,7 +48,23 @@ class BillData(BaseModel):
     date_of_service: Optional[date] = Field(None, description="Date of service or bill date")
     patient_name: Optional[str] = Field(None, description="Patient name on the bill")
     bill_number: Optional[str] = Field(None, description="Invoice or bill number")
-    line_items: Optional[List[Dict[str, Any]]] = Field(default_factory=list, description="Individual charges")
+    line_items: Optional[List[Dict[str, Any]]] = Field(
+        default_factory=list,
+        description="Individual charges",
+        # Spell out the row shape so it can be enforced as a Gemini response schema
+        json_schema_extra={
+            "items": {
+                "type": "object",
+                "properties": {
+                    "description": {"type": "string"},
+                    "quantity": {"type": "number", "nullable": True},
+                    "rate": {"type": "number", "nullable": True},
+                    "amount": {"type": "number", "nullable": True},
+                },
+                "required": ["description"],
+            }
+        },
+    )
     
     @field_validator('total_amount', mode='before')
     @classmethod
@@ -0,0 +1,240 @@
+"""Caching layer with an in-process LRU tier and optional Redis/disk tiers."""
+import asyncio
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+from app.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Keys usable as file names on every platform (Windows rejects ":" and others)
+_SAFE_KEY = re.compile(r"[A-Za-z0-9._-]+")
+
+
+def hash_bytes(data: bytes) -> str:
+    """Return the SHA-256 hex digest of raw bytes (content address)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache with per-entry TTL and hit/miss counters.
+
+    Not thread-safe: intended to be used from the event loop only.
+    """
+
+    def __init__(self, max_entries: int, ttl: int):
+        """
+        Args:
+            max_entries: Maximum number of entries before LRU eviction
+            ttl: Time-to-live in seconds (0 disables expiry)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return cached value or None if missing/expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stored_at, value = entry
+        if self.ttl and time.monotonic() - stored_at > self.ttl:
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a value, evicting least recently used entries if full."""
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop all entries (counters are kept)."""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache statistics for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class TieredCache:
+    """
+    Two-tier cache: in-process LRU in front of an optional shared tier.
+
+    The shared tier is Redis when `settings.redis_enabled` is set, otherwise
+    an on-disk JSON store when a directory is configured. Values must be
+    JSON-serializable. Failures of the shared tier are logged and treated
+    as cache misses so they never break the request path.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int,
+        ttl: int,
+        disk_dir: Optional[str] = None,
+        use_redis: bool = False,
+    ):
+        """Initialize cache tiers."""
+        self.namespace = namespace
+        self.ttl = ttl
+        self.memory = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.use_redis = use_redis
+        self._redis = None
+        self.disk_dir = Path(disk_dir) / namespace if disk_dir and not use_redis else None
+        self.shared_hits = 0
+
+        logger.info(
+            "cache_initialized",
+            namespace=namespace,
+            max_entries=max_entries,
+            ttl=ttl,
+            shared_tier="redis" if use_redis else ("disk" if self.disk_dir else None)
+        )
+
+    def _get_redis(self):
+        """Lazily create the async Redis client."""
+        if self._redis is None:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.Redis.from_url(settings.redis_url)
+        return self._redis
+
+    def _disk_path(self, key: str) -> Path:
+        name = key if _SAFE_KEY.fullmatch(key) else hash_bytes(key.encode("utf-8"))
+        return self.disk_dir / name[:2] / f"{name}.json"
+
+    def _read_disk(self, key: str) -> Optional[Any]:
+        path = self._disk_path(key)
+        if not path.exists():
+            return None
+        if self.ttl and time.time() - path.stat().st_mtime > self.ttl:
+            path.unlink(missing_ok=True)
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def _write_disk(self, key: str, value: Any) -> None:
+        path = self._disk_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(value), encoding="utf-8")
+        tmp_path.replace(path)  # Atomic so readers never see partial files
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Look up a key in memory first, then in the shared tier."""
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+
+        try:
+            if self.use_redis:
+                raw = await self._get_redis().get(f"{self.namespace}:{key}")
+                value = json.loads(raw) if raw is not None else None
+            elif self.disk_dir:
+                value = await asyncio.to_thread(self._read_disk, key)
+        except Exception as e:
+            logger.warning(
+                "cache_shared_tier_read_error",
+                namespace=self.namespace,
+                error=str(e),
+                error_type=type(e).__name__
+            )
+            return None
+
+        if value is not None:
+            self.shared_hits += 1
+            self.memory.set(key, value)  # Promote to memory tier
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        """Store a value in all configured tiers."""
+        self.memory.set(key, value)
+
+        try:
+            if self.use_redis:
+                await self._get_redis().set(
+                    f"{self.namespace}:{key}",
+                    json.dumps(value),
+                    ex=self.ttl or None,
+                )
+            elif self.disk_dir:
+                await asyncio.to_thread(self._write_disk, key, value)
+        except Exception as e:
+            logger.warning(
+                "cache_shared_tier_write_error",
+                namespace=self.namespace,
+                error=str(e),
+                error_type=type(e).__name__
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache statistics for monitoring."""
+        return {
+            **self.memory.stats(),
+            "shared_tier": "redis" if self.use_redis else ("disk" if self.disk_dir else None),
+            "shared_hits": self.shared_hits,
+        }
+
+
+# Global cache instances
+_extraction_cache: Optional[TieredCache] = None
+_llm_cache: Optional[TieredCache] = None
+
+
+def get_extraction_cache() -> TieredCache:
+    """Get or create global PDF extraction cache instance."""
+    global _extraction_cache
+
+    if _extraction_cache is None:
+        _extraction_cache = TieredCache(
+            namespace="pdf_text",
+            max_entries=settings.extraction_cache_max_entries,
+            ttl=settings.cache_ttl,
+            disk_dir=settings.extraction_cache_dir or None,
+            use_redis=settings.redis_enabled,
+        )
+
+    return _extraction_cache
+
+
+def get_llm_cache() -> TieredCache:
+    """Get or create global LLM response cache instance."""
+    global _llm_cache
+
+    if _llm_cache is None:
+        _llm_cache = TieredCache(
+            namespace="llm",
+            max_entries=settings.llm_cache_max_entries,
+            ttl=settings.cache_ttl,
+            use_redis=settings.redis_enabled,
+        )
+
+    return _llm_cache
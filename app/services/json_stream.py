@@ -0,0 +1,114 @@
+"""Incremental parsing of a JSON object as it streams in from an LLM."""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class IncrementalJSONParser:
+    """
+    Parse the top-level fields of a JSON object chunk by chunk.
+
+    Only the top-level object is tracked: a field is reported once its value
+    is syntactically complete (a closed string, array or object, or a scalar
+    followed by `,` or `}`), then decoded with json.loads. Text before the
+    opening brace (e.g. a markdown fence) is ignored. If the stream stops
+    early, `fields` still holds every field that was fully received.
+    """
+
+    def __init__(self):
+        """Initialize an empty parser."""
+        self.fields: Dict[str, Any] = {}
+        self.started = False
+        self.complete = False
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key_start: Optional[int] = None
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+
+    def _finish_value(self, end: int, completed: List[Tuple[str, Any]]) -> None:
+        """Decode the pending value ending at `end` and record it."""
+        if self._key is None or self._value_start is None:
+            return
+        text = self._buffer[self._value_start:end].strip()
+        key = self._key
+        self._key = None
+        self._value_start = None
+        if not text:
+            return
+        value = json.loads(text)  # JSONDecodeError (a ValueError) on malformed output
+        self.fields[key] = value
+        completed.append((key, value))
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Consume the next piece of the response.
+
+        Returns:
+            (key, value) pairs for the fields completed by this chunk
+        """
+        completed: List[Tuple[str, Any]] = []
+        if self.complete or not chunk:
+            return completed
+
+        self._buffer += chunk
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+
+            if not self.started:
+                if char == "{":
+                    self.started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        if self._value_start is None:
+                            self._key = json.loads(buffer[self._key_start:i + 1])
+                        else:
+                            self._finish_value(i + 1, completed)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._value_start is None:
+                    self._key_start = i
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    self._finish_value(i + 1, completed)
+                elif self._depth == 0:
+                    self._finish_value(i, completed)  # Trailing scalar, if any
+                    self.complete = True
+                    break
+            elif self._depth == 1:
+                if char == ":":
+                    self._value_start = i + 1
+                elif char == ",":
+                    self._finish_value(i, completed)
+
+        self._pos = len(buffer)
+        return completed
+
+
+def parse_partial_json(text: str) -> Tuple[Dict[str, Any], bool]:
+    """
+    Parse a possibly truncated JSON object.
+
+    Returns:
+        (fields that were fully present, whether the object was complete)
+    """
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    return parser.fields, parser.complete
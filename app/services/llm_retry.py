@@ -0,0 +1,211 @@
+"""Retry policy for LLM provider calls: error taxonomy, Retry-After and metrics."""
+import functools
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+from tenacity import (
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_exponential,
+)
+from tenacity.wait import wait_base
+from app.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# Gemini puts the suggested delay in the message, e.g. "Please retry in 23.5s"
+RETRY_IN_PATTERN = re.compile(r"retry in\s+([\d.]+)\s*s", re.IGNORECASE)
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    """HTTP status of a provider error (OpenAI `status_code`, google-api-core `code`)."""
+    for attribute in ("status_code", "code"):
+        value = getattr(exc, attribute, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Whether a failed LLM call may succeed if simply repeated.
+
+    Transient network failures, timeouts, 429s and 5xx responses are
+    retryable. Everything else - safety/recitation blocks, bad API keys,
+    invalid requests, parsing errors - is deterministic and fails fast.
+    """
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+
+    # Client-library transport errors that carry no status code
+    return type(exc).__name__ in {
+        "APIConnectionError",  # openai (includes APITimeoutError)
+        "APITimeoutError",
+        "TransportError",  # google.auth / httpx
+        "ServerDisconnectedError",  # aiohttp
+        "ClientConnectionError",
+    }
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Server-suggested delay before retrying, if the error carries one."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            try:
+                return float(retry_after_ms) / 1000
+            except ValueError:
+                pass
+
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+
+    # google-api-core errors carry a RetryInfo detail on 429s
+    for detail in getattr(exc, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+
+    match = RETRY_IN_PATTERN.search(str(exc))
+    if match:
+        return float(match.group(1))
+
+    return None
+
+
+class wait_retry_after(wait_base):
+    """Wait the server's Retry-After when given (capped), otherwise back off exponentially."""
+
+    def __init__(self, fallback: wait_base, max_wait: float):
+        self.fallback = fallback
+        self.max_wait = max_wait
+
+    def __call__(self, retry_state) -> float:
+        exc = retry_state.outcome.exception() if retry_state.outcome else None
+        retry_after = retry_after_seconds(exc) if exc else None
+        if retry_after is not None:
+            return min(retry_after, self.max_wait)
+        return self.fallback(retry_state)
+
+
+class RetryMetrics:
+    """Retry counters for one provider."""
+
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.retry_wait_seconds = 0.0
+        self.retry_after_honored = 0
+        self.failed_fast = 0
+        self.retries_exhausted = 0
+        self.retries_by_error: Dict[str, int] = {}
+
+    def record_retry(self, exc: BaseException, wait: float) -> None:
+        self.retries += 1
+        self.retry_wait_seconds += wait
+        if retry_after_seconds(exc) is not None:
+            self.retry_after_honored += 1
+        name = type(exc).__name__
+        self.retries_by_error[name] = self.retries_by_error.get(name, 0) + 1
+
+    def record_failure(self, exc: BaseException) -> None:
+        if is_retryable(exc):
+            self.retries_exhausted += 1
+        else:
+            self.failed_fast += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Retry statistics for monitoring."""
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "retry_wait_seconds": round(self.retry_wait_seconds, 2),
+            "retry_after_honored": self.retry_after_honored,
+            "failed_fast": self.failed_fast,
+            "retries_exhausted": self.retries_exhausted,
+            "retries_by_error": dict(self.retries_by_error),
+        }
+
+
+# Global retry metrics, one per provider
+_retry_metrics: Dict[str, RetryMetrics] = {}
+
+
+def get_retry_metrics(provider_name: str) -> RetryMetrics:
+    """Get or create retry metrics for an LLM provider."""
+    if provider_name not in _retry_metrics:
+        _retry_metrics[provider_name] = RetryMetrics()
+    return _retry_metrics[provider_name]
+
+
+def get_retry_stats() -> Dict[str, Dict[str, Any]]:
+    """Retry stats for every provider seen so far."""
+    return {name: metrics.stats() for name, metrics in _retry_metrics.items()}
+
+
+def llm_retry(provider_name: str) -> Callable:
+    """
+    Decorator applying the LLM retry policy to an async provider method.
+
+    Only retryable errors (see is_retryable) are retried, up to
+    `llm_max_retries` attempts; waits follow Retry-After when the provider
+    sends one (capped at `llm_retry_max_wait`), otherwise exponential backoff.
+    """
+    metrics = get_retry_metrics(provider_name)
+
+    def before_sleep(retry_state) -> None:
+        exc = retry_state.outcome.exception()
+        wait = retry_state.next_action.sleep
+        metrics.record_retry(exc, wait)
+        logger.warning(
+            "llm_call_retrying",
+            provider=provider_name,
+            attempt=retry_state.attempt_number,
+            wait_s=round(wait, 2),
+            error_type=type(exc).__name__,
+            status_code=_status_code(exc)
+        )
+
+    def decorator(func: Callable) -> Callable:
+        retrying = retry(
+            stop=stop_after_attempt(settings.llm_max_retries),
+            wait=wait_retry_after(
+                fallback=wait_exponential(multiplier=1, min=2, max=10),
+                max_wait=settings.llm_retry_max_wait,
+            ),
+            retry=retry_if_exception(is_retryable),
+            before_sleep=before_sleep,
+            reraise=True,
+        )(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            metrics.calls += 1
+            try:
+                return await retrying(*args, **kwargs)
+            except Exception as e:
+                metrics.record_failure(e)
+                raise
+
+        return wrapper
+
+    return decorator
@@ -1,22 +1,63 @@
 """LLM service abstraction layer with retry logic."""
 import asyncio
-from typing import Optional, Dict, Any, List
+import copy
+import json
+import time
+from typing import Optional, Dict, Any, List, Tuple, Callable
 from abc import ABC, abstractmethod
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_exponential,
-    retry_if_exception_type,
-)
 import google.generativeai as genai
 from openai import AsyncOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.schema import HumanMessage, SystemMessage
 from app.config import settings
+from app.services.cache_service import get_llm_cache, hash_bytes
+from app.services.json_stream import IncrementalJSONParser, parse_partial_json
+from app.services.llm_retry import is_retryable, llm_retry
+from app.services.provider_health import CircuitBreaker, get_provider_health
+from app.services.rate_limiter import Priority, get_rate_limiter
+from app.services.token_counter import TokenCounter, TokenUsage, get_token_counter, record_usage, usage_scope
+from app.utils.deadline import DeadlineExceededError, get_deadline
 from app.utils.logging import get_logger
 
 logger = get_logger(__name__)
 
+# Output tokens reserved against the TPM budget when a caller sets no max_tokens
+RESERVED_OUTPUT_TOKENS = 2048
+
+# Callback receiving each top-level field of a streamed JSON response as it completes
+FieldCallback = Callable[[str, Any], None]
+
+
+def _streamed_result(
+    parser: IncrementalJSONParser,
+    truncated: bool,
+    provider_name: str,
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Final (fields, complete) of a streamed structured response.
+    
+    A response cut off by the output token limit keeps the fields that were
+    fully received; anything else short of a complete object is an error.
+    """
+    if parser.complete:
+        return parser.fields, True
+    
+    if truncated and parser.fields:
+        logger.warning(
+            "llm_stream_truncated",
+            provider=provider_name,
+            kept_fields=list(parser.fields)
+        )
+        return parser.fields, False
+    
+    raise ValueError("Streamed response did not contain a complete JSON object")
+
+
+def _report_gemini_usage(usage_metadata: Any) -> None:
+    """Pass Gemini's usage_metadata (absent on some responses) to record_usage."""
+    if usage_metadata:
+        record_usage(usage_metadata.prompt_token_count, usage_metadata.candidates_token_count)
+
 
 class LLMProvider(ABC):
     """Abstract base class for LLM providers."""
@@ -39,9 +80,40 @@ class LLMProvider(ABC):
         system_prompt: Optional[str] = None,
         schema: Optional[Dict[str, Any]] = None,
         max_tokens: Optional[int] = None,
+        response_schema: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
-        """Generate structured JSON output from the LLM."""
+        """
+        Generate structured JSON output from the LLM.
+        
+        `schema` is an illustrative example included in the prompt;
+        `response_schema` (see structured_output.response_schema_for) is
+        enforced by providers that support schema-constrained decoding.
+        """
         pass
+    
+    async def stream_structured(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        schema: Optional[Dict[str, Any]] = None,
+        max_tokens: Optional[int] = None,
+        response_schema: Optional[Dict[str, Any]] = None,
+        on_field: Optional[FieldCallback] = None,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Stream structured JSON output, reporting fields as they complete.
+        
+        Returns the parsed fields and whether the object was complete (False
+        when the output token limit cut it short). Providers without a
+        streaming API fall back to a single generate_structured call.
+        """
+        result = await self.generate_structured(
+            prompt, system_prompt, schema=schema, max_tokens=max_tokens, response_schema=response_schema
+        )
+        if on_field:
+            for key, value in result.items():
+                on_field(key, value)
+        return result, True
 
 
 class GeminiProvider(LLMProvider):
@@ -55,6 +127,14 @@ class GeminiProvider(LLMProvider):
         genai.configure(api_key=settings.google_api_key)
         self.model_name = settings.gemini_model
         self.temperature = settings.llm_temperature
+        self.safety_settings = {
+            genai.types.HarmCategory.HARM_CATEGORY_HARASSMENT: genai.types.HarmBlockThreshold.BLOCK_NONE,
+            genai.types.HarmCategory.HARM_CATEGORY_HATE_SPEECH: genai.types.HarmBlockThreshold.BLOCK_NONE,
+            genai.types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: genai.types.HarmBlockThreshold.BLOCK_NONE,
+            genai.types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: genai.types.HarmBlockThreshold.BLOCK_NONE,
+        }
+        # Model objects are immutable and reusable; only the generation config varies per call
+        self._models: Dict[Tuple[float, int, bool, Optional[str]], genai.GenerativeModel] = {}
         
         logger.info(
             "gemini_provider_initialized",
@@ -62,20 +142,73 @@ class GeminiProvider(LLMProvider):
             temperature=self.temperature
         )
     
-    @retry(
-        stop=stop_after_attempt(settings.llm_max_retries),
-        wait=wait_exponential(multiplier=1, min=2, max=10),
-        retry=retry_if_exception_type((Exception,)),
-        reraise=True,
-    )
+    def _get_model(
+        self,
+        temperature: float,
+        max_tokens: int,
+        json_mode: bool = False,
+        response_schema: Optional[Dict[str, Any]] = None,
+    ) -> genai.GenerativeModel:
+        """Return a cached GenerativeModel for this generation config."""
+        schema_key = json.dumps(response_schema, sort_keys=True) if response_schema else None
+        key = (temperature, max_tokens, json_mode, schema_key)
+        model = self._models.get(key)
+        if model is None:
+            generation_config = {
+                "temperature": temperature,
+                "max_output_tokens": max_tokens,
+            }
+            if json_mode:
+                generation_config["response_mime_type"] = "application/json"
+                if response_schema:
+                    generation_config["response_schema"] = response_schema
+            
+            model = genai.GenerativeModel(
+                self.model_name,
+                generation_config=generation_config,
+                safety_settings=self.safety_settings
+            )
+            self._models[key] = model
+            logger.debug(
+                "gemini_model_created",
+                temperature=temperature,
+                max_tokens=max_tokens,
+                cached_models=len(self._models)
+            )
+        return model
+    
+    @staticmethod
+    def _check_finish_reason(finish_reason: int) -> None:
+        """Raise for blocked responses; a MAX_TOKENS cut-off is only logged."""
+        # FinishReason enum: 1=STOP, 2=MAX_TOKENS, 3=SAFETY, 4=RECITATION
+        if finish_reason == 2:  # MAX_TOKENS
+            logger.warning("gemini_max_tokens", finish_reason=finish_reason, message="Response truncated - increase max_output_tokens")
+            # Don't raise - try to use partial response
+        elif finish_reason == 3:  # SAFETY
+            logger.error("gemini_safety_block", finish_reason=finish_reason)
+            raise ValueError("Response blocked by safety filters")
+        elif finish_reason == 4:  # RECITATION
+            logger.error("gemini_recitation_block", finish_reason=finish_reason)
+            raise ValueError("Response blocked due to recitation")
+        elif finish_reason != 1:  # Not STOP (normal completion)
+            logger.warning("gemini_unusual_finish", finish_reason=finish_reason)
+    
+    @llm_retry("google")
     async def generate(
         self,
         prompt: str,
         system_prompt: Optional[str] = None,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        json_mode: bool = False,
+        response_schema: Optional[Dict[str, Any]] = None,
     ) -> str:
-        """Generate text using Gemini with retry logic."""
+        """
+        Generate text using Gemini with retry logic.
+        
+        With `json_mode` the model is constrained to emit JSON, matching
+        `response_schema` when one is given.
+        """
         try:
             temp = temperature if temperature is not None else self.temperature
             
@@ -84,18 +217,11 @@ class GeminiProvider(LLMProvider):
             if system_prompt:
                 full_prompt = f"{system_prompt}\n\n{prompt}"
             
-            model = genai.GenerativeModel(
-                self.model_name,
-                generation_config={
-                    "temperature": temp,
-                    "max_output_tokens": max_tokens or 8192,  # Increased default for complex validations
-                },
-                safety_settings={
-                    genai.types.HarmCategory.HARM_CATEGORY_HARASSMENT: genai.types.HarmBlockThreshold.BLOCK_NONE,
-                    genai.types.HarmCategory.HARM_CATEGORY_HATE_SPEECH: genai.types.HarmBlockThreshold.BLOCK_NONE,
-                    genai.types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: genai.types.HarmBlockThreshold.BLOCK_NONE,
-                    genai.types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: genai.types.HarmBlockThreshold.BLOCK_NONE,
-                }
+            model = self._get_model(
+                temp,
+                max_tokens or 8192,  # Increased default for complex validations
+                json_mode=json_mode,
+                response_schema=response_schema
             )
             
             logger.debug(
@@ -105,30 +231,16 @@ class GeminiProvider(LLMProvider):
                 prompt_length=len(full_prompt)
             )
             
-            # Run in thread pool since genai is sync
-            response = await asyncio.to_thread(
-                model.generate_content,
-                full_prompt
-            )
+            # Native async call - no worker thread held while waiting on the API
+            response = await model.generate_content_async(full_prompt)
             
             # Check if response was blocked by safety filters
             if not response.candidates:
                 logger.error("gemini_no_candidates", message="Response blocked by safety filters")
                 raise ValueError("Response blocked by safety filters")
             
-            candidate = response.candidates[0]
-            # FinishReason enum: 1=STOP, 2=MAX_TOKENS, 3=SAFETY, 4=RECITATION
-            if candidate.finish_reason == 2:  # MAX_TOKENS
-                logger.warning("gemini_max_tokens", finish_reason=candidate.finish_reason, message="Response truncated - increase max_output_tokens")
-                # Don't raise - try to use partial response
-            elif candidate.finish_reason == 3:  # SAFETY
-                logger.error("gemini_safety_block", finish_reason=candidate.finish_reason)
-                raise ValueError("Response blocked by safety filters")
-            elif candidate.finish_reason == 4:  # RECITATION  
-                logger.error("gemini_recitation_block", finish_reason=candidate.finish_reason)
-                raise ValueError("Response blocked due to recitation")
-            elif candidate.finish_reason != 1:  # Not STOP (normal completion)
-                logger.warning("gemini_unusual_finish", finish_reason=candidate.finish_reason)
+            self._check_finish_reason(response.candidates[0].finish_reason)
+            _report_gemini_usage(getattr(response, "usage_metadata", None))
                 
             result = response.text
             
@@ -153,76 +265,102 @@ class GeminiProvider(LLMProvider):
         system_prompt: Optional[str] = None,
         schema: Optional[Dict[str, Any]] = None,
         max_tokens: Optional[int] = None,
+        response_schema: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
-        """Generate structured JSON output."""
-        import json
-        
-        # Add JSON formatting instruction to prompt
-        json_instruction = "\n\nIMPORTANT: Respond ONLY with valid JSON. No markdown, no explanations, just the JSON object."
-        
-        if schema:
-            json_instruction += f"\n\nUse this schema:\n{json.dumps(schema, indent=2)}"
+        """
+        Generate structured JSON output using Gemini's JSON mode.
         
-        full_prompt = prompt + json_instruction
+        Output is decoded as application/json, constrained to
+        `response_schema` when given, so no markdown stripping or JSON
+        repair is needed. The example `schema` is only added to the prompt
+        when there is no response schema to enforce.
+        """
+        if schema and not response_schema:
+            prompt += f"\n\nUse this schema:\n{json.dumps(schema, indent=2)}"
         
         response = await self.generate(
-            full_prompt,
+            prompt,
             system_prompt,
-            max_tokens=max_tokens
+            max_tokens=max_tokens,
+            json_mode=True,
+            response_schema=response_schema
         )
         
-        # Clean up response - remove markdown code blocks if present
-        cleaned = response.strip()
-        if cleaned.startswith("```json"):
-            cleaned = cleaned[7:]
-        elif cleaned.startswith("```"):
-            cleaned = cleaned[3:]
-        if cleaned.endswith("```"):
-            cleaned = cleaned[:-3]
-        cleaned = cleaned.strip()
-        
         try:
-            return json.loads(cleaned)
+            return json.loads(response)
         except json.JSONDecodeError as e:
+            # JSON mode output only fails to parse when cut off at max tokens;
+            # keep the fields that were fully written
+            try:
+                fields, _ = parse_partial_json(response)
+            except ValueError:
+                fields = {}
+            if fields:
+                logger.warning("json_response_truncated", kept_fields=list(fields))
+                return fields
+            
             logger.error(
                 "json_parse_error",
                 error=str(e),
-                response=cleaned[:500]
+                response=response[:500]
             )
-            # Try to extract JSON from text with better regex
-            import re
-            
-            # Fix truncated strings - complete the last incomplete string value
-            if "Unterminated string" in str(e):
-                # Find the last complete field before truncation
-                # Remove everything after the last complete value
-                last_complete = cleaned.rfind('",')
-                if last_complete > 0:
-                    # Truncate to last complete field and close JSON
-                    truncated = cleaned[:last_complete + 2] + '\n}'
-                    try:
-                        logger.info("attempting_json_repair_truncation")
-                        return json.loads(truncated)
-                    except:
-                        pass
-            
-            # Try to find complete JSON object (handles nested objects and multiline strings)
-            json_match = re.search(r'\{[^}]*(?:\{[^}]*\}[^}]*)*\}', cleaned, re.DOTALL)
-            if json_match:
-                try:
-                    return json.loads(json_match.group())
-                except:
-                    pass
-            
-            # Try to fix common JSON issues (unescaped newlines in strings)
-            try:
-                # Replace actual newlines within string values with \n
-                fixed = re.sub(r':\s*"([^"]*)\n([^"]*)"', r': "\1\\n\2"', cleaned)
-                return json.loads(fixed)
-            except:
-                pass
-                
             raise ValueError(f"Failed to parse JSON response: {e}")
+    
+    @llm_retry("google")
+    async def stream_structured(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        schema: Optional[Dict[str, Any]] = None,
+        max_tokens: Optional[int] = None,
+        response_schema: Optional[Dict[str, Any]] = None,
+        on_field: Optional[FieldCallback] = None,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Stream JSON mode output through an incremental parser."""
+        if schema and not response_schema:
+            prompt += f"\n\nUse this schema:\n{json.dumps(schema, indent=2)}"
+        full_prompt = f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
+        
+        model = self._get_model(
+            self.temperature,
+            max_tokens or 8192,
+            json_mode=True,
+            response_schema=response_schema
+        )
+        
+        parser = IncrementalJSONParser()
+        finish_reason = None
+        usage_metadata = None
+        try:
+            response = await model.generate_content_async(full_prompt, stream=True)
+            async for chunk in response:
+                # Counts arrive with the last chunk(s)
+                usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+                if not chunk.candidates:
+                    continue
+                candidate = chunk.candidates[0]
+                if candidate.finish_reason:
+                    finish_reason = candidate.finish_reason
+                # chunk.text raises on chunks without parts (e.g. the final one)
+                text = "".join(part.text for part in candidate.content.parts)
+                for key, value in parser.feed(text):
+                    if on_field:
+                        on_field(key, value)
+        except Exception as e:
+            logger.error(
+                "gemini_stream_error",
+                error=str(e),
+                error_type=type(e).__name__
+            )
+            raise
+        
+        if finish_reason is None:
+            logger.error("gemini_no_candidates", message="Response blocked by safety filters")
+            raise ValueError("Response blocked by safety filters")
+        self._check_finish_reason(finish_reason)
+        _report_gemini_usage(usage_metadata)
+        
+        return _streamed_result(parser, truncated=finish_reason == 2, provider_name="google")
 
 
 class OpenAIProvider(LLMProvider):
@@ -243,12 +381,7 @@ class OpenAIProvider(LLMProvider):
             temperature=self.temperature
         )
     
-    @retry(
-        stop=stop_after_attempt(settings.llm_max_retries),
-        wait=wait_exponential(multiplier=1, min=2, max=10),
-        retry=retry_if_exception_type((Exception,)),
-        reraise=True,
-    )
+    @llm_retry("openai")
     async def generate(
         self,
         prompt: str,
@@ -282,6 +415,8 @@ class OpenAIProvider(LLMProvider):
             )
             
             result = response.choices[0].message.content
+            if response.usage:
+                record_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
             
             logger.debug(
                 "openai_generate_response",
@@ -303,10 +438,15 @@ class OpenAIProvider(LLMProvider):
         prompt: str,
         system_prompt: Optional[str] = None,
         schema: Optional[Dict[str, Any]] = None,
+        max_tokens: Optional[int] = None,
+        response_schema: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
-        """Generate structured JSON output using response_format."""
-        import json
+        """
+        Generate structured JSON output using response_format.
         
+        JSON object mode only; `response_schema` is accepted for interface
+        parity and validated by the caller's Pydantic model instead.
+        """
         messages = []
         
         if system_prompt:
@@ -323,18 +463,124 @@ class OpenAIProvider(LLMProvider):
                 model=self.model_name,
                 messages=messages,
                 temperature=self.temperature,
+                max_tokens=max_tokens or 2048,
                 response_format={"type": "json_object"},
             )
             
             content = response.choices[0].message.content
             if not content:
                 raise ValueError("Empty response from OpenAI")
+            if response.usage:
+                record_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
             
             return json.loads(content)
             
         except Exception as e:
             logger.error("openai_structured_error", error=str(e))
             raise
+    
+    @llm_retry("openai")
+    async def stream_structured(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        schema: Optional[Dict[str, Any]] = None,
+        max_tokens: Optional[int] = None,
+        response_schema: Optional[Dict[str, Any]] = None,
+        on_field: Optional[FieldCallback] = None,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Stream JSON object mode output through an incremental parser."""
+        messages = []
+        
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        
+        json_instruction = "\n\nIMPORTANT: Respond ONLY with valid JSON."
+        if schema:
+            json_instruction += f"\n\nUse this schema:\n{json.dumps(schema, indent=2)}"
+        
+        messages.append({"role": "user", "content": prompt + json_instruction})
+        
+        parser = IncrementalJSONParser()
+        finish_reason = None
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=max_tokens or 2048,
+                response_format={"type": "json_object"},
+                stream=True,
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
+                for key, value in parser.feed(choice.delta.content or ""):
+                    if on_field:
+                        on_field(key, value)
+        except Exception as e:
+            logger.error("openai_structured_error", error=str(e))
+            raise
+        
+        return _streamed_result(parser, truncated=finish_reason == "length", provider_name="openai")
+
+
+class _FieldRelay:
+    """
+    Forward streamed fields from concurrent provider attempts to one callback.
+    
+    Each provider call (the primary, a hedge or a failover) reports through
+    its own `attempt()` callback. Only the first attempt to report a field
+    is forwarded live; the others are ignored until `settle` reconciles the
+    caller with the winning result. A field is forwarded again only when its
+    value changes, so a retry restarting the same stream is not repeated,
+    but a retry or another attempt that wins with a different value
+    corrects it.
+    """
+    
+    def __init__(self, on_field: Optional[FieldCallback]):
+        self.on_field = on_field
+        self.reported: Dict[str, Any] = {}
+        self.leader: Optional[int] = None
+        self.attempts = 0
+    
+    def attempt(self) -> FieldCallback:
+        self.attempts += 1
+        attempt = self.attempts
+        
+        def report_field(key: str, value: Any) -> None:
+            if self.leader is None:
+                self.leader = attempt
+            if attempt == self.leader:
+                self._forward(key, value)
+        
+        return report_field
+    
+    def settle(self, result: Dict[str, Any]) -> None:
+        """Correct the caller to the winning result; fields it lacks are reported as None."""
+        for key in [key for key in self.reported if key not in result]:
+            self._forward(key, None)
+        for key, value in result.items():
+            self._forward(key, value)
+    
+    def _forward(self, key: str, value: Any) -> None:
+        if key in self.reported and self.reported[key] == value:
+            return
+        self.reported[key] = value
+        if self.on_field:
+            self.on_field(key, value)
+
+
+def _create_provider(provider_name: str) -> LLMProvider:
+    """Instantiate a provider by its configuration name."""
+    if provider_name == "google":
+        return GeminiProvider()
+    if provider_name == "openai":
+        return OpenAIProvider()
+    raise ValueError(f"Unsupported LLM provider: {provider_name}")
 
 
 class LLMService:
@@ -347,24 +593,325 @@ class LLMService:
     """
     
     def __init__(self, provider_name: Optional[str] = None):
-        """Initialize LLM service with specified provider."""
+        """
+        Initialize LLM service with specified provider.
+        
+        When `llm_fallback_provider` names a second, configured provider, calls
+        are hedged to it once the primary runs slower than its recent latency
+        percentile, and fail over to it while the primary's circuit is open.
+        """
         provider_name = provider_name or settings.default_llm_provider
         
-        self.provider: LLMProvider
+        self.provider: LLMProvider = _create_provider(provider_name)
+        self.provider_name = provider_name
+        self.providers: Dict[str, LLMProvider] = {provider_name: self.provider}
         
-        if provider_name == "google":
-            self.provider = GeminiProvider()
-        elif provider_name == "openai":
-            self.provider = OpenAIProvider()
-        else:
-            raise ValueError(f"Unsupported LLM provider: {provider_name}")
+        self.fallback_provider_name: Optional[str] = None
+        fallback_name = settings.llm_fallback_provider
+        if fallback_name and fallback_name != provider_name:
+            try:
+                self.providers[fallback_name] = _create_provider(fallback_name)
+                self.fallback_provider_name = fallback_name
+            except ValueError as e:
+                logger.warning("llm_fallback_provider_unavailable", provider=fallback_name, error=str(e))
         
-        self.provider_name = provider_name
+        self.cache = get_llm_cache() if settings.llm_cache_enabled else None
+        self.rate_limiters = (
+            {name: get_rate_limiter(name) for name in self.providers}
+            if settings.llm_rate_limit_enabled else {}
+        )
+        self.health = {name: get_provider_health(name) for name in self.providers}
         
         logger.info(
             "llm_service_initialized",
-            provider=provider_name
+            provider=provider_name,
+            fallback_provider=self.fallback_provider_name,
+            cache_enabled=self.cache is not None,
+            rate_limit_enabled=bool(self.rate_limiters)
+        )
+    
+    def _cache_keys(
+        self,
+        kind: str,
+        prompt: str,
+        system_prompt: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        schema: Optional[Dict[str, Any]] = None,
+        response_schema: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Dict[str, str]]:
+        """
+        Build a response cache key per provider, or None if the call should not be cached.
+        
+        Answers are stored under the key of the provider that produced them,
+        so a failover answer is never labelled with the primary's model.
+        Prompts are whitespace-normalized before hashing so formatting-only
+        differences in f-string templates still hit the same entry.
+        """
+        if self.cache is None:
+            return None
+        
+        temp = temperature if temperature is not None else settings.llm_temperature
+        if temp > settings.llm_cache_max_temperature:
+            return None
+        
+        normalized_prompt = " ".join(prompt.split())
+        key_parts = {
+            "kind": kind,
+            "temperature": temp,
+            "max_tokens": max_tokens,
+            "system_prompt": system_prompt or "",
+            "schema": schema,
+            "response_schema": response_schema,
+            "prompt_hash": hash_bytes(normalized_prompt.encode("utf-8")),
+        }
+        return {
+            name: hash_bytes(
+                json.dumps(
+                    {**key_parts, "provider": name, "model": provider.model_name},
+                    sort_keys=True,
+                    default=str,
+                ).encode("utf-8")
+            )
+            for name, provider in self.providers.items()
+        }
+    
+    async def _cache_lookup(self, kind: str, cache_keys: Optional[Dict[str, str]]) -> Any:
+        """
+        Cached answer for a call, or None.
+        
+        The primary's entry is preferred; the secondary's is used only while
+        the primary's circuit is open, when the call would go to it anyway.
+        """
+        if not cache_keys:
+            return None
+        
+        names = [self.provider_name]
+        if (
+            self.fallback_provider_name
+            and self.health[self.provider_name].breaker.state == CircuitBreaker.OPEN
+        ):
+            names.append(self.fallback_provider_name)
+        
+        for name in names:
+            cached = await self.cache.get(cache_keys[name])
+            if cached is not None:
+                logger.debug("llm_cache_hit", kind=kind, provider=name)
+                return cached
+        return None
+    
+    @staticmethod
+    def _log_token_usage(
+        provider_name: str,
+        method: str,
+        counter: TokenCounter,
+        prompt_tokens: int,
+        result: Any,
+        usage: TokenUsage,
+    ) -> int:
+        """
+        Log one call's input and output tokens and return their total.
+        
+        Provider-reported counts are preferred and also calibrate the
+        provider's token counter; missing counts fall back to the counter.
+        """
+        reported = isinstance(usage.prompt_tokens, int)
+        if reported:
+            counter.observe(prompt_tokens, usage.prompt_tokens)
+        
+        if isinstance(usage.output_tokens, int):
+            output_tokens = usage.output_tokens
+        else:
+            output = result if isinstance(result, str) else json.dumps(result, default=str)
+            output_tokens = counter.count(output or "")
+        
+        input_tokens = usage.prompt_tokens if reported else prompt_tokens
+        logger.info(
+            "llm_token_usage",
+            provider=provider_name,
+            method=method,
+            input_tokens=input_tokens,
+            input_tokens_counted=prompt_tokens,
+            output_tokens=output_tokens,
+            source="provider" if reported else counter.name
         )
+        return input_tokens + output_tokens
+    
+    async def _call_provider(
+        self,
+        provider_name: str,
+        method: str,
+        kwargs: Dict[str, Any],
+        priority: Priority,
+    ) -> Any:
+        """
+        Run one provider call inside its rate limiter and record its health.
+        
+        Reserves the counted prompt tokens plus the output budget, then
+        reconciles with the usage the provider reports (or the counted size
+        of the response when it reports none). Latency is measured from
+        admission, so queueing in the limiter is not counted. Only transient
+        errors (see llm_retry.is_retryable) count toward the circuit breaker.
+        """
+        if isinstance(kwargs.get("on_field"), _FieldRelay):
+            kwargs = {**kwargs, "on_field": kwargs["on_field"].attempt()}
+        provider = self.providers[provider_name]
+        health = self.health[provider_name]
+        limiter = self.rate_limiters.get(provider_name)
+        counter = get_token_counter(provider_name)
+        
+        prompt_tokens = counter.count(kwargs["prompt"] + (kwargs.get("system_prompt") or ""))
+        reserved = prompt_tokens + (kwargs.get("max_tokens") or RESERVED_OUTPUT_TOKENS)
+        started = None
+        
+        async def call() -> Any:
+            nonlocal started
+            started = time.monotonic()
+            return await getattr(provider, method)(**kwargs)
+        
+        try:
+            with usage_scope() as usage:
+                if limiter is None:
+                    result = await call()
+                    self._log_token_usage(provider_name, method, counter, prompt_tokens, result, usage)
+                else:
+                    async with limiter.acquire(reserved, priority) as lease:
+                        result = await call()
+                        lease.report(
+                            self._log_token_usage(provider_name, method, counter, prompt_tokens, result, usage)
+                        )
+        except asyncio.CancelledError:
+            if started is not None:
+                # Hedged-away call: elapsed time is a lower bound on its latency
+                health.latency.record(time.monotonic() - started)
+            health.breaker.release_probe()
+            raise
+        except Exception as e:
+            if is_retryable(e):
+                health.breaker.record_failure()
+            else:
+                # Safety blocks, unparseable JSON and 4xx validation errors
+                # are the document's fault, not the provider's
+                health.breaker.release_probe()
+            raise
+        
+        health.latency.record(time.monotonic() - started)
+        health.breaker.record_success()
+        return result
+    
+    async def _execute(self, method: str, kwargs: Dict[str, Any], priority: Priority) -> Tuple[str, Any]:
+        """
+        Dispatch a call to the primary provider, hedging or failing over to the secondary.
+        
+        Returns the name of the provider that answered and its result.
+        Calls that lose a hedge are cancelled and awaited before returning,
+        so their health and rate-limiter bookkeeping completes first.
+        
+        Without a secondary this is a plain primary call. With one, the
+        secondary is used directly while the primary's circuit is open;
+        otherwise it is started when the primary exceeds its hedge delay or
+        fails, and whichever provider answers first wins.
+        """
+        primary = self.provider_name
+        secondary = self.fallback_provider_name
+        if secondary is None:
+            return primary, await self._call_provider(primary, method, kwargs, priority)
+        
+        health = self.health[primary]
+        if not health.breaker.allow_request():
+            health.failovers += 1
+            logger.warning("llm_failover", primary=primary, secondary=secondary, reason="circuit_open")
+            return secondary, await self._call_provider(secondary, method, kwargs, priority)
+        
+        tasks: Dict[asyncio.Task, str] = {
+            asyncio.create_task(self._call_provider(primary, method, kwargs, priority)): primary
+        }
+        pending = set(tasks)
+        done = set()
+        hedged = False
+        
+        def start_secondary() -> None:
+            task = asyncio.create_task(self._call_provider(secondary, method, kwargs, priority))
+            tasks[task] = secondary
+            pending.add(task)
+        
+        try:
+            if settings.llm_hedge_enabled:
+                hedge_delay = health.hedge_delay()
+                done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+                if not done:
+                    hedged = True
+                    health.hedges += 1
+                    logger.info(
+                        "llm_hedge_started",
+                        primary=primary,
+                        secondary=secondary,
+                        hedge_delay_ms=round(hedge_delay * 1000, 1)
+                    )
+                    start_secondary()
+            
+            while True:
+                if not done:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                
+                # Dict order prefers the primary when both finish together
+                for task in sorted(done, key=list(tasks).index):
+                    error = task.exception()
+                    if error is None:
+                        if hedged and tasks[task] == secondary:
+                            health.hedge_wins += 1
+                        return tasks[task], task.result()
+                    
+                    logger.warning(
+                        "llm_provider_call_failed",
+                        provider=tasks[task],
+                        error=str(error),
+                        error_type=type(error).__name__
+                    )
+                    last_error = error
+                done = set()
+                
+                if secondary not in tasks.values():
+                    health.failovers += 1
+                    logger.warning("llm_failover", primary=primary, secondary=secondary, reason="primary_error")
+                    start_secondary()
+                
+                if not pending:
+                    raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+            # Retrieve the losers' exceptions and let their bookkeeping finish
+            await asyncio.gather(*pending, return_exceptions=True)
+    
+    async def _execute_within_deadline(
+        self, method: str, kwargs: Dict[str, Any], priority: Priority
+    ) -> Tuple[str, Any]:
+        """
+        Run `_execute` bounded by `llm_timeout` and the current request deadline.
+        
+        Calls are skipped outright when less than `llm_min_call_budget` remains,
+        and cut off (retries included) when the budget runs out. Both raise
+        DeadlineExceededError so agents fall back to regex/rule-based results.
+        """
+        timeout = float(settings.llm_timeout)
+        deadline = get_deadline()
+        if deadline is not None:
+            remaining = deadline.remaining()
+            if remaining < settings.llm_min_call_budget:
+                logger.warning(
+                    "llm_call_skipped_deadline",
+                    method=method,
+                    remaining_ms=round(remaining * 1000, 1)
+                )
+                raise DeadlineExceededError(f"Request deadline leaves {remaining:.1f}s for LLM call")
+            timeout = deadline.budget(timeout)
+        
+        try:
+            return await asyncio.wait_for(self._execute(method, kwargs, priority), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("llm_call_timeout", method=method, timeout_s=round(timeout, 1))
+            raise DeadlineExceededError(f"LLM call exceeded its {timeout:.1f}s budget")
     
     async def generate(
         self,
@@ -372,14 +919,34 @@ class LLMService:
         system_prompt: Optional[str] = None,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        priority: Priority = "interactive",
     ) -> str:
-        """Generate text response."""
-        return await self.provider.generate(
-            prompt=prompt,
-            system_prompt=system_prompt,
-            temperature=temperature,
-            max_tokens=max_tokens,
+        """
+        Generate text response.
+        
+        `priority="background"` lets user-facing extraction calls go first
+        when the provider quota is under pressure.
+        """
+        cache_keys = self._cache_keys("text", prompt, system_prompt, temperature, max_tokens)
+        cached = await self._cache_lookup("text", cache_keys)
+        if cached is not None:
+            return cached
+        
+        provider_name, result = await self._execute_within_deadline(
+            "generate",
+            {
+                "prompt": prompt,
+                "system_prompt": system_prompt,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+            },
+            priority
         )
+        
+        if cache_keys and result:
+            await self.cache.set(cache_keys[provider_name], result)
+        
+        return result
     
     async def generate_structured(
         self,
@@ -387,14 +954,61 @@ class LLMService:
         system_prompt: Optional[str] = None,
         schema: Optional[Dict[str, Any]] = None,
         max_tokens: Optional[int] = None,
+        priority: Priority = "interactive",
+        response_schema: Optional[Dict[str, Any]] = None,
+        stream: Optional[bool] = None,
+        on_field: Optional[FieldCallback] = None,
     ) -> Dict[str, Any]:
-        """Generate structured JSON response."""
-        return await self.provider.generate_structured(
-            prompt=prompt,
-            system_prompt=system_prompt,
-            schema=schema,
-            max_tokens=max_tokens,
+        """
+        Generate structured JSON response.
+        
+        Pass `response_schema=response_schema_for(Model)` to have the
+        provider enforce the shape of the output.
+        
+        When streaming (`stream`, default `llm_stream_structured`), the
+        response is parsed incrementally: `on_field(key, value)` is called
+        once per top-level field as soon as it is complete, and a response
+        cut off by the output token limit returns the fields received so far
+        (not cached) instead of failing. Fields stream from the first
+        provider attempt to produce any; if a retry, hedge or failover wins
+        with a different value, `on_field` is called again with the
+        winning value.
+        """
+        cache_keys = self._cache_keys(
+            "structured", prompt, system_prompt, None, max_tokens, schema, response_schema
         )
+        cached = await self._cache_lookup("structured", cache_keys)
+        if cached is not None:
+            result = copy.deepcopy(cached)  # Callers may mutate the parsed dict
+            if on_field:
+                for key, value in result.items():
+                    on_field(key, value)
+            return result
+        
+        kwargs = {
+            "prompt": prompt,
+            "system_prompt": system_prompt,
+            "schema": schema,
+            "max_tokens": max_tokens,
+            "response_schema": response_schema,
+        }
+        if stream is None:
+            stream = settings.llm_stream_structured
+        
+        complete = True
+        if stream or on_field:
+            relay = _FieldRelay(on_field)
+            provider_name, (result, complete) = await self._execute_within_deadline(
+                "stream_structured", {**kwargs, "on_field": relay}, priority
+            )
+            relay.settle(result)
+        else:
+            provider_name, result = await self._execute_within_deadline("generate_structured", kwargs, priority)
+        
+        if cache_keys and result and complete:
+            await self.cache.set(cache_keys[provider_name], copy.deepcopy(result))
+        
+        return result
 
 
 # Global LLM service instance
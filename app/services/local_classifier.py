@@ -0,0 +1,194 @@
+"""Local keyword classifier used before (and instead of) the LLM classifier."""
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+from app.schemas import ClassifiedDocument, DocumentType
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Weighted content terms per document type. Terms specific to one type weigh
+# more; generic ones (bills also print admission/discharge dates) weigh less.
+CONTENT_TERMS: Dict[DocumentType, Dict[str, float]] = {
+    DocumentType.BILL: {
+        "invoice": 2.0,
+        "bill no": 2.5,
+        "bill number": 2.5,
+        "bill date": 2.0,
+        "billing": 1.5,
+        "gross amount": 2.0,
+        "net amount": 2.0,
+        "net payable": 2.5,
+        "amount due": 2.0,
+        "grand total": 2.0,
+        "total amount": 1.5,
+        "amount in words": 2.0,
+        "receipt": 1.5,
+        "payment": 1.0,
+        "gstin": 1.5,
+        "qty": 1.0,
+        "charges": 1.0,
+    },
+    DocumentType.DISCHARGE_SUMMARY: {
+        "discharge summary": 4.0,
+        "diagnosis": 2.0,
+        "chief complaints": 2.0,
+        "history of present illness": 2.5,
+        "course in hospital": 2.5,
+        "hospital course": 2.5,
+        "condition at discharge": 2.5,
+        "advice on discharge": 2.0,
+        "discharge advice": 2.0,
+        "date of admission": 1.0,
+        "admission date": 1.0,
+        "date of discharge": 1.0,
+        "discharge date": 1.0,
+        "investigations": 1.0,
+        "follow up": 1.0,
+        "surgeon": 1.0,
+        "procedure": 1.0,
+        "medication": 1.0,
+    },
+    DocumentType.ID_CARD: {
+        "member id": 3.0,
+        "e-card": 3.0,
+        "health card": 3.0,
+        "card no": 2.0,
+        "policy number": 2.0,
+        "policy no": 2.0,
+        "policy holder": 2.0,
+        "sum insured": 2.0,
+        "valid from": 2.0,
+        "valid till": 2.0,
+        "valid upto": 2.0,
+        "valid through": 2.0,
+        "tpa": 1.5,
+        "insured": 1.0,
+        "insurance": 1.0,
+    },
+}
+
+# Filename keywords, matched as substrings of the lowercased name so run-together
+# names ("DischargeSummary.pdf", "hospitalbill.pdf") still count
+FILENAME_TERMS: Dict[DocumentType, Dict[str, float]] = {
+    DocumentType.BILL: {"bill": 4.0, "invoice": 4.0, "receipt": 3.0, "payment": 2.0},
+    DocumentType.DISCHARGE_SUMMARY: {"discharge": 4.0, "summary": 2.0, "report": 1.5, "medical": 1.0},
+    DocumentType.ID_CARD: {"card": 4.0, "insurance": 2.0, "policy": 2.0, "id": 1.0},
+}
+
+# Filename terms too short to match as substrings ("id" is in "paid" and
+# "invalid"); these must be a whole token of the name
+FILENAME_TOKEN_TERMS = frozenset({"id"})
+
+# Content beyond this is not scanned; headers and summaries carry the signal
+MAX_CONTENT_CHARS = 50000
+
+# Softmax temperature over the type scores
+SCORE_TEMPERATURE = 2.0
+
+# Score at which the evidence is considered sufficient on its own
+EVIDENCE_SATURATION = 8.0
+
+
+# Separators splitting a filename into tokens ("patient_id-card.pdf")
+_FILENAME_SEPARATORS = re.compile(r"[_\-.\s]+")
+
+
+def _term_pattern(term: str) -> str:
+    return r"\s+".join(re.escape(word) for word in term.split())
+
+
+class LocalClassifier:
+    """
+    Zero-LLM document classifier based on weighted keyword evidence.
+
+    Each type is scored from its content terms (sublinear in the match count,
+    so a repeated term cannot dominate) plus filename keywords. Confidence is
+    the softmax share of the winning type, scaled down when the total evidence
+    is thin, so only documents with strong, unambiguous signals clear the
+    `classification_local_threshold` used by ClassifierAgent.
+    """
+
+    def __init__(
+        self,
+        content_terms: Optional[Dict[DocumentType, Dict[str, float]]] = None,
+        filename_terms: Optional[Dict[DocumentType, Dict[str, float]]] = None,
+    ):
+        """Compile all content terms into a single alternation."""
+        self.content_terms = content_terms or CONTENT_TERMS
+        self.filename_terms = filename_terms or FILENAME_TERMS
+
+        self._term_lookup: Dict[str, Tuple[DocumentType, float]] = {}
+        for doc_type, terms in self.content_terms.items():
+            for term, weight in terms.items():
+                self._term_lookup[term] = (doc_type, weight)
+
+        # Longest first so "discharge summary" wins over shorter overlapping terms
+        ordered = sorted(self._term_lookup, key=len, reverse=True)
+        self._pattern = re.compile(r"\b(?:" + "|".join(_term_pattern(t) for t in ordered) + r")\b")
+
+    def score(self, filename: str, content: str) -> Dict[DocumentType, Tuple[float, List[str]]]:
+        """Evidence score and matched terms per document type."""
+        counts: Dict[str, int] = {}
+        for match in self._pattern.finditer(content[:MAX_CONTENT_CHARS].lower()):
+            term = " ".join(match.group().split())
+            counts[term] = counts.get(term, 0) + 1
+
+        scores: Dict[DocumentType, Tuple[float, List[str]]] = {
+            doc_type: (0.0, []) for doc_type in self.content_terms
+        }
+        for term, count in counts.items():
+            doc_type, weight = self._term_lookup[term]
+            total, matched = scores[doc_type]
+            scores[doc_type] = (total + weight * (1 + math.log(count)), matched + [term])
+
+        filename_lower = filename.lower()
+        filename_tokens = set(_FILENAME_SEPARATORS.split(filename_lower))
+        for doc_type, terms in self.filename_terms.items():
+            for term, weight in terms.items():
+                if term in (filename_tokens if term in FILENAME_TOKEN_TERMS else filename_lower):
+                    total, matched = scores.get(doc_type, (0.0, []))
+                    scores[doc_type] = (total + weight, matched + [f"filename:{term}"])
+
+        return scores
+
+    def classify(self, filename: str, content: str = "") -> ClassifiedDocument:
+        """Classify a document from its filename and text."""
+        scores = self.score(filename, content)
+        best_type, (best_score, matched) = max(scores.items(), key=lambda item: item[1][0])
+
+        if best_score <= 0:
+            return ClassifiedDocument(
+                filename=filename,
+                document_type=DocumentType.UNKNOWN,
+                confidence=0.3,
+                reasoning="No clear indicators found in filename or content"
+            )
+
+        exp_scores = {
+            doc_type: math.exp((score - best_score) / SCORE_TEMPERATURE)
+            for doc_type, (score, _) in scores.items()
+        }
+        share = exp_scores[best_type] / sum(exp_scores.values())
+        confidence = round(share * min(1.0, best_score / EVIDENCE_SATURATION), 3)
+
+        return ClassifiedDocument(
+            filename=filename,
+            document_type=best_type,
+            confidence=confidence,
+            reasoning=f"Keyword evidence {best_score:.1f} ({', '.join(matched[:6])})"
+        )
+
+
+# Global local classifier instance
+_local_classifier: Optional[LocalClassifier] = None
+
+
+def get_local_classifier() -> LocalClassifier:
+    """Get or create the global local classifier."""
+    global _local_classifier
+
+    if _local_classifier is None:
+        _local_classifier = LocalClassifier()
+
+    return _local_classifier
@@ -0,0 +1,206 @@
+"""Bounded worker pool for OCR rasterization and Tesseract calls."""
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from app.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+# Pool jobs per OCRed page: one render, one Tesseract call
+JOBS_PER_PAGE = 2
+
+
+class OCRQueueFullError(Exception):
+    """Raised when the OCR queue is full and new documents must be rejected."""
+
+    def __init__(self, queue_depth: int, retry_after: int):
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+        super().__init__(f"OCR queue is full ({queue_depth} pages waiting)")
+
+
+class OCRAdmission:
+    """Pages an admitted document still has to OCR, released as each one finishes."""
+
+    def __init__(self, pool: "OCRWorkerPool", pages: int):
+        self.pool = pool
+        self.pages = 0
+        self.add(pages)
+
+    def add(self, pages: int) -> None:
+        """Reserve more pages for a document already admitted (e.g. a re-render pass)."""
+        with self.pool._lock:
+            self.pool.pending_pages += pages
+        self.pages += pages
+
+    def page_done(self) -> None:
+        self.release(1)
+
+    def release(self, pages: Optional[int] = None) -> None:
+        """Release `pages` (default: all remaining) of the reservation."""
+        pages = self.pages if pages is None else min(pages, self.pages)
+        with self.pool._lock:
+            self.pool.pending_pages -= pages
+        self.pages -= pages
+
+    def __enter__(self) -> "OCRAdmission":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.release()
+
+
+class OCRWorkerPool:
+    """
+    Dedicated executor for OCR work with a bounded queue.
+
+    pdf2image and pytesseract each spawn a CPU-heavy subprocess, so running
+    them on the shared default thread pool lets a burst of scanned claims
+    oversubscribe the machine. This pool caps concurrent OCR jobs at
+    `max_workers` and jobs submitted to the executor at `max_workers +
+    max_queue` (later submissions wait for a slot). Documents reserve their
+    pages on admission and are admitted only while fewer than
+    `max_pending_pages` pages are outstanding, otherwise OCRQueueFullError
+    is raised so the API can shed load with 503 + Retry-After.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, max_pending_pages: int):
+        """Initialize the OCR executor."""
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_pending_pages = max_pending_pages
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr-worker")
+        self._lock = threading.Lock()  # Counters are updated from worker threads
+        self._slots = asyncio.Semaphore(max_workers + max_queue)
+
+        self.pending_pages = 0
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self._total_wait = 0.0
+        self._total_service = 0.0
+        self.max_wait = 0.0
+
+        logger.info(
+            "ocr_pool_initialized",
+            workers=max_workers,
+            max_queue=max_queue,
+            max_pending_pages=max_pending_pages
+        )
+
+    def estimate_retry_after(self) -> int:
+        """Estimate seconds until the current backlog drains."""
+        if not self.completed:
+            return settings.ocr_retry_after
+        avg_service = self._total_service / self.completed
+        backlog = max(self.queued + self.running, self.pending_pages * JOBS_PER_PAGE)
+        return max(1, math.ceil(backlog * avg_service / self.max_workers))
+
+    def admit(self, pages: int) -> OCRAdmission:
+        """
+        Reserve `pages` for a new document or raise OCRQueueFullError if the backlog is full.
+
+        A document larger than `max_pending_pages` is still admitted when
+        nothing else is pending, so it is never rejected forever.
+        """
+        with self._lock:
+            full = self.pending_pages > 0 and self.pending_pages + pages > self.max_pending_pages
+        if full:
+            self.rejected += 1
+            retry_after = self.estimate_retry_after()
+            logger.warning(
+                "ocr_queue_full",
+                queue_depth=self.pending_pages,
+                requested_pages=pages,
+                running=self.running,
+                retry_after=retry_after
+            )
+            raise OCRQueueFullError(queue_depth=self.pending_pages, retry_after=retry_after)
+        return OCRAdmission(self, pages)
+
+    def _on_done(self, future: Future) -> None:
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1  # Cancelled before a worker picked it up
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking OCR job on the pool (once a submission slot is free) and await its result."""
+        async with self._slots:
+            return await self._submit(func, *args, **kwargs)
+
+    async def _submit(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        submitted_at = time.monotonic()
+
+        def job():
+            started_at = time.monotonic()
+            wait = started_at - submitted_at
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self._total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self._total_service += time.monotonic() - started_at
+
+        with self._lock:
+            self.queued += 1
+        future = self._executor.submit(job)
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        """Stop accepting work and cancel queued jobs."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool statistics for monitoring."""
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "max_pending_pages": self.max_pending_pages,
+            "pending_pages": self.pending_pages,
+            "queue_depth": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self._total_wait / self.completed * 1000, 1) if self.completed else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
+
+
+# Global OCR pool instance
+_ocr_pool: Optional[OCRWorkerPool] = None
+
+
+def get_ocr_pool() -> OCRWorkerPool:
+    """Get or create global OCR worker pool instance."""
+    global _ocr_pool
+
+    if _ocr_pool is None:
+        _ocr_pool = OCRWorkerPool(
+            max_workers=settings.ocr_workers,
+            max_queue=settings.ocr_max_queue,
+            max_pending_pages=settings.ocr_max_pending_pages,
+        )
+
+    return _ocr_pool
+
+
+def shutdown_ocr_pool() -> None:
+    """Shut down the OCR worker pool (called on app shutdown)."""
+    global _ocr_pool
+
+    if _ocr_pool is not None:
+        _ocr_pool.shutdown()
+        _ocr_pool = None
@@ -0,0 +1,147 @@
+"""Persistent per-page OCR result store backed by SQLite."""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from app.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class OCRPageStore:
+    """
+    Embedded store for OCR output that survives restarts.
+
+    Rows are keyed by (document hash, page number, DPI, Tesseract config) so
+    a re-processed document reuses every page already OCRed at the same
+    settings. Total stored text is capped at `max_bytes`; the oldest rows
+    are evicted first once the cap is exceeded.
+
+    Methods are blocking; call them via asyncio.to_thread from async code.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        """Open (or create) the store database."""
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ocr_pages (
+                doc_hash TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                dpi INTEGER NOT NULL,
+                config TEXT NOT NULL,
+                text TEXT NOT NULL,
+                confidence REAL NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (doc_hash, page, dpi, config)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_pages_created ON ocr_pages (created_at)")
+        self._conn.commit()
+
+        row = self._conn.execute("SELECT COALESCE(SUM(size_bytes), 0), COUNT(*) FROM ocr_pages").fetchone()
+        self.size_bytes, self.entries = row
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        logger.info(
+            "ocr_store_opened",
+            path=str(self.path),
+            entries=self.entries,
+            size_bytes=self.size_bytes,
+            max_bytes=max_bytes
+        )
+
+    def get(self, doc_hash: str, page: int, dpi: int, config: str) -> Optional[Tuple[str, float]]:
+        """Return stored (text, confidence) for a page, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, confidence FROM ocr_pages WHERE doc_hash = ? AND page = ? AND dpi = ? AND config = ?",
+                (doc_hash, page, dpi, config),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0], row[1]
+
+    def put(self, doc_hash: str, page: int, dpi: int, config: str, text: str, confidence: float) -> None:
+        """Store OCR output for a page, evicting the oldest rows if over the cap."""
+        size_bytes = len(text.encode("utf-8"))
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT size_bytes FROM ocr_pages WHERE doc_hash = ? AND page = ? AND dpi = ? AND config = ?",
+                (doc_hash, page, dpi, config),
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (doc_hash, page, dpi, config, text, confidence, size_bytes, time.time()),
+            )
+            if previous:
+                self.size_bytes -= previous[0]
+            else:
+                self.entries += 1
+            self.size_bytes += size_bytes
+
+            while self.size_bytes > self.max_bytes and self.entries > 1:
+                oldest = self._conn.execute(
+                    "SELECT rowid, size_bytes FROM ocr_pages ORDER BY created_at, rowid LIMIT 1"
+                ).fetchone()
+                self._conn.execute("DELETE FROM ocr_pages WHERE rowid = ?", (oldest[0],))
+                self.size_bytes -= oldest[1]
+                self.entries -= 1
+                self.evictions += 1
+
+            self._conn.commit()
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Store statistics for monitoring."""
+        return {
+            "entries": self.entries,
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Global OCR store instance
+_ocr_store: Optional[OCRPageStore] = None
+
+
+def get_ocr_store() -> Optional[OCRPageStore]:
+    """Get or create global OCR page store (None when disabled)."""
+    global _ocr_store
+
+    if _ocr_store is None and settings.ocr_store_enabled:
+        _ocr_store = OCRPageStore(
+            path=settings.ocr_store_path,
+            max_bytes=settings.ocr_store_max_mb * 1024 * 1024,
+        )
+
+    return _ocr_store
+
+
+def close_ocr_store() -> None:
+    """Close the OCR page store (called on app shutdown)."""
+    global _ocr_store
+
+    if _ocr_store is not None:
+        _ocr_store.close()
+        _ocr_store = None
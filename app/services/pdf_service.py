@@ -1,13 +1,311 @@
 """PDF text extraction service."""
 import asyncio
-from typing import Optional
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import cached_property
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 from io import BytesIO
 import PyPDF2
 import pdfplumber
+from app.config import settings
+from app.services.cache_service import get_extraction_cache, hash_bytes
+from app.services.ocr_pool import OCRAdmission, OCRQueueFullError, get_ocr_pool
+from app.services.ocr_store import get_ocr_store
 from app.utils.logging import get_logger
+from app.utils.section_index import PAGE_BREAK
 
 logger = get_logger(__name__)
 
+# Bump whenever extraction output changes so cached results are invalidated
+EXTRACTOR_VERSION = "4"
+
+# Tesseract page segmentation: uniform block of text
+TESSERACT_CONFIG = "--psm 6"
+
+# Native text shorter than this is treated as a failed extraction
+MIN_TEXT_LENGTH = 500
+
+# Process pool for CPU-bound pdfplumber parsing (created lazily)
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+# Parts of a document the current extraction could not recover (see _extraction_gap_scope)
+_extraction_gaps: ContextVar[Optional[List[str]]] = ContextVar("pdf_extraction_gaps", default=None)
+
+
+@contextmanager
+def _extraction_gap_scope() -> Iterator[List[str]]:
+    """Collect the gaps (e.g. failed OCR runs) reported by extraction inside the block."""
+    gaps: List[str] = []
+    token = _extraction_gaps.set(gaps)
+    try:
+        yield gaps
+    finally:
+        _extraction_gaps.reset(token)
+
+
+def _report_gap(gap: str) -> None:
+    """Report part of a document that could not be extracted to the enclosing scope, if any."""
+    gaps = _extraction_gaps.get()
+    if gaps is not None:
+        gaps.append(gap)
+
+
+def _join_pages(pages: List[str], separator: str = "\n\n") -> str:
+    """Join per-page texts into one document, skipping empty pages."""
+    return separator.join(text for text in pages if text)
+
+
+def _text_length(pages: List[str]) -> int:
+    """Total text length across pages, ignoring surrounding whitespace."""
+    return sum(len(text.strip()) for text in pages)
+
+
+def _get_worker_count() -> int:
+    """Number of processes used for page-sharded extraction."""
+    return settings.pdf_process_workers or os.cpu_count() or 1
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Get or create the global extraction process pool."""
+    global _process_pool
+    
+    if _process_pool is None:
+        # spawn avoids forking a process that already runs event-loop threads
+        _process_pool = ProcessPoolExecutor(
+            max_workers=_get_worker_count(),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        logger.info("pdf_process_pool_started", workers=_get_worker_count())
+    
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    """Shut down the extraction process pool (called on app shutdown)."""
+    global _process_pool
+    
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+async def _render_pages(
+    pdf_bytes: bytes,
+    page_numbers: List[int],
+    output_dir: str,
+    poppler_path: Optional[str],
+    dpi: int = 300,
+    grayscale: bool = False,
+) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Rasterize pages one at a time into `output_dir`, yielding image paths.
+    
+    The next page is rendered in a worker thread while the caller OCRs the
+    current one, so at most two page images exist at any time. Callers own
+    the yielded file and should delete it once processed.
+    """
+    import pdf2image
+    
+    def render(page_number: int) -> Optional[str]:
+        paths = pdf2image.convert_from_bytes(
+            pdf_bytes,
+            dpi=dpi,
+            grayscale=grayscale,
+            poppler_path=poppler_path,
+            first_page=page_number,
+            last_page=page_number,
+            output_folder=output_dir,
+            output_file=f"page{page_number}_{dpi}",
+            paths_only=True,
+        )
+        return paths[0] if paths else None
+    
+    if not page_numbers:
+        return
+    
+    ocr_pool = get_ocr_pool()
+    next_render = asyncio.create_task(ocr_pool.run(render, page_numbers[0]))
+    try:
+        for index, page_number in enumerate(page_numbers):
+            image_path = await next_render
+            if index + 1 < len(page_numbers):
+                next_render = asyncio.create_task(ocr_pool.run(render, page_numbers[index + 1]))
+            if image_path:
+                yield page_number, image_path
+    finally:
+        next_render.cancel()
+
+
+def _tesseract_page(image_path: str) -> Tuple[str, float]:
+    """
+    OCR one page image and return (text, mean word confidence).
+    
+    Uses image_to_data so confidence comes for free with the words; the
+    text is rebuilt from Tesseract's block/paragraph/line numbering.
+    """
+    import pytesseract
+    
+    data = pytesseract.image_to_data(
+        image_path,
+        lang='eng',
+        config=TESSERACT_CONFIG,
+        output_type=pytesseract.Output.DICT,
+    )
+    
+    lines: Dict[Tuple[int, int, int], List[str]] = {}
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        word = (word or "").strip()
+        confidence = float(data["conf"][i])
+        if not word or confidence < 0:
+            continue
+        confidences.append(confidence)
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word)
+    
+    text_parts = []
+    previous_block = None
+    for (block_num, _, _), words in lines.items():
+        if previous_block is not None and block_num != previous_block:
+            text_parts.append("")  # Blank line between blocks
+        text_parts.append(" ".join(words))
+        previous_block = block_num
+    
+    mean_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return "\n".join(text_parts), mean_confidence
+
+
+def _extract_page_range(pdf, first_page: int, last_page: int) -> List[Tuple[int, str, float]]:
+    """
+    Extract text and tables from a 1-based inclusive page range.
+    
+    Returns:
+        List of (page_number, page_text, elapsed_ms) tuples
+    """
+    pages = []
+    for page_number in range(first_page, last_page + 1):
+        started = time.perf_counter()
+        page = pdf.pages[page_number - 1]
+        
+        text_parts = []
+        text = page.extract_text()
+        if text:
+            text_parts.append(text)
+        
+        # Also try to extract tables
+        tables = page.extract_tables()
+        for table in tables:
+            if table:  # Only process non-empty tables
+                table_text = "\n".join(
+                    " | ".join(str(cell) if cell else "" for cell in row)
+                    for row in table if row
+                )
+                if table_text.strip():  # Only add if table has content
+                    text_parts.append(f"\n[TABLE]\n{table_text}\n[/TABLE]\n")
+        
+        pages.append((page_number, "\n\n".join(text_parts), (time.perf_counter() - started) * 1000))
+    
+    return pages
+
+
+def _extract_page_shard(pdf_bytes: bytes, first_page: int, last_page: int) -> List[Tuple[int, str, float]]:
+    """Process-pool entry point: parse the PDF and extract one page range."""
+    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
+        return _extract_page_range(pdf, first_page, last_page)
+
+
+async def _extract_pages_in_process_pool(pdf_bytes: bytes, page_count: int) -> List[Tuple[int, str, float]]:
+    """Split a document into page ranges and extract them across the process pool."""
+    workers = _get_worker_count()
+    shard_size = max(1, math.ceil(page_count / workers))
+    shards = [
+        (first, min(first + shard_size - 1, page_count))
+        for first in range(1, page_count + 1, shard_size)
+    ]
+    
+    loop = asyncio.get_running_loop()
+    pool = _get_process_pool()
+    results = await asyncio.gather(*[
+        loop.run_in_executor(pool, _extract_page_shard, pdf_bytes, first, last)
+        for first, last in shards
+    ])
+    
+    # Reassemble in page order regardless of shard completion order
+    return sorted((page for shard in results for page in shard), key=lambda page: page[0])
+
+
+class PDFDocument:
+    """
+    Parsed-PDF handle shared by every extractor for one file.
+    
+    PyPDF2 and pdfplumber each parse the document once, on first use, and the
+    parsed objects are reused for text, tables, metadata and page counts.
+    Neither library is safe to use from two threads at once, so each backend
+    is guarded by its own lock. Call aclose() (or use it as an async context manager)
+    once the request is done.
+    """
+    
+    def __init__(self, pdf_bytes: bytes):
+        """Wrap raw PDF bytes; nothing is parsed until first use."""
+        self.pdf_bytes = pdf_bytes
+        self._reader: Optional[PyPDF2.PdfReader] = None
+        self._plumber = None
+        self._reader_lock = threading.Lock()
+        self._plumber_lock = threading.Lock()
+    
+    @cached_property
+    def content_hash(self) -> str:
+        """SHA-256 of the PDF bytes (cache and OCR store key)."""
+        return hash_bytes(self.pdf_bytes)
+    
+    @contextmanager
+    def reader(self) -> Iterator[PyPDF2.PdfReader]:
+        """Exclusive access to the PyPDF2 reader, parsed on first use."""
+        with self._reader_lock:
+            if self._reader is None:
+                self._reader = PyPDF2.PdfReader(BytesIO(self.pdf_bytes))
+            yield self._reader
+    
+    @contextmanager
+    def plumber(self) -> Iterator["pdfplumber.PDF"]:
+        """Exclusive access to the pdfplumber document, parsed on first use."""
+        with self._plumber_lock:
+            if self._plumber is None:
+                self._plumber = pdfplumber.open(BytesIO(self.pdf_bytes))
+            yield self._plumber
+    
+    @property
+    def page_count(self) -> int:
+        """Number of pages (blocking on first use)."""
+        with self.reader() as reader:
+            return len(reader.pages)
+    
+    def close(self) -> None:
+        """Release parsed objects; waits for any extractor still using them."""
+        with self._plumber_lock:
+            if self._plumber is not None:
+                self._plumber.close()
+                self._plumber = None
+        with self._reader_lock:
+            self._reader = None
+    
+    async def aclose(self) -> None:
+        """Close from async code without blocking the event loop."""
+        await asyncio.to_thread(self.close)
+    
+    async def __aenter__(self) -> "PDFDocument":
+        return self
+    
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
 
 class PDFExtractionService:
     """
@@ -19,27 +317,22 @@ class PDFExtractionService:
     """
     
     @staticmethod
-    async def extract_text_pypdf2(pdf_bytes: bytes) -> str:
-        """Extract text using PyPDF2 (fast but limited)."""
+    async def extract_pages_pypdf2(document: PDFDocument) -> List[str]:
+        """Extract per-page text using PyPDF2 (fast but limited)."""
         try:
-            pdf_file = BytesIO(pdf_bytes)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            
-            text_parts = []
-            for page in pdf_reader.pages:
-                text = page.extract_text()
-                if text:
-                    text_parts.append(text)
+            def _extract():
+                with document.reader() as pdf_reader:
+                    return [page.extract_text() or "" for page in pdf_reader.pages]
             
-            result = "\n\n".join(text_parts)
+            pages = await asyncio.to_thread(_extract)
             
             logger.debug(
                 "pypdf2_extraction_success",
-                pages=len(pdf_reader.pages),
-                text_length=len(result)
+                pages=len(pages),
+                text_length=_text_length(pages)
             )
             
-            return result
+            return pages
             
         except Exception as e:
             logger.error(
@@ -47,44 +340,62 @@ class PDFExtractionService:
                 error=str(e),
                 error_type=type(e).__name__
             )
-            return ""
+            return []
+    
+    @classmethod
+    async def extract_text_pypdf2(cls, document: PDFDocument) -> str:
+        """Extract text using PyPDF2 (fast but limited)."""
+        return _join_pages(await cls.extract_pages_pypdf2(document))
     
     @staticmethod
-    async def extract_text_pdfplumber(pdf_bytes: bytes) -> str:
-        """Extract text using pdfplumber (better for tables and layout)."""
+    async def extract_pages_pdfplumber(document: PDFDocument) -> List[str]:
+        """
+        Extract per-page text using pdfplumber (better for tables and layout).
+        
+        Documents with at least `pdf_parallel_min_pages` pages are split into
+        page ranges and parsed in a process pool, then reassembled in page order.
+        """
         try:
-            pdf_file = BytesIO(pdf_bytes)
+            use_pool = settings.pdf_parallel_enabled and _get_worker_count() > 1
             
             def _extract():
-                with pdfplumber.open(pdf_file) as pdf:
-                    text_parts = []
-                    for page in pdf.pages:
-                        text = page.extract_text()
-                        if text:
-                            text_parts.append(text)
-                        
-                        # Also try to extract tables
-                        tables = page.extract_tables()
-                        for table in tables:
-                            if table:  # Only process non-empty tables
-                                table_text = "\n".join(
-                                    " | ".join(str(cell) if cell else "" for cell in row)
-                                    for row in table if row
-                                )
-                                if table_text.strip():  # Only add if table has content
-                                    text_parts.append(f"\n[TABLE]\n{table_text}\n[/TABLE]\n")
-                    
-                    return "\n\n".join(text_parts)
+                with document.plumber() as pdf:
+                    page_count = len(pdf.pages)
+                    if use_pool and page_count >= settings.pdf_parallel_min_pages:
+                        return page_count, None  # Too big for one core - shard it
+                    return page_count, _extract_page_range(pdf, 1, page_count)
             
             # Run in thread pool since pdfplumber is sync
-            result = await asyncio.to_thread(_extract)
+            page_count, pages = await asyncio.to_thread(_extract)
             
-            logger.debug(
+            sharded = pages is None
+            if sharded:
+                try:
+                    # Worker processes cannot share the parsed handle and re-parse their shard
+                    pages = await _extract_pages_in_process_pool(document.pdf_bytes, page_count)
+                except Exception as e:
+                    logger.warning(
+                        "pdfplumber_process_pool_failed_fallback_inline",
+                        error=str(e),
+                        error_type=type(e).__name__
+                    )
+                    
+                    def _extract_inline():
+                        with document.plumber() as pdf:
+                            return _extract_page_range(pdf, 1, page_count)
+                    
+                    pages = await asyncio.to_thread(_extract_inline)
+                    sharded = False
+            
+            logger.info(
                 "pdfplumber_extraction_success",
-                text_length=len(result)
+                pages=page_count,
+                sharded=sharded,
+                text_length=sum(len(text) for _, text, _ in pages),
+                page_timings_ms=[round(elapsed_ms, 1) for _, _, elapsed_ms in pages]
             )
             
-            return result
+            return [text for _, text, _ in pages]
             
         except Exception as e:
             logger.error(
@@ -92,15 +403,34 @@ class PDFExtractionService:
                 error=str(e),
                 error_type=type(e).__name__
             )
-            return ""
+            return []
+    
+    @classmethod
+    async def extract_text_pdfplumber(cls, document: PDFDocument) -> str:
+        """Extract text using pdfplumber (better for tables and layout)."""
+        return _join_pages(await cls.extract_pages_pdfplumber(document))
     
     @classmethod
-    async def _extract_with_ocr(cls, pdf_bytes: bytes, filename: str) -> str:
-        """Extract text using OCR (Tesseract + pdf2image)."""
+    async def _ocr_pages(
+        cls,
+        document: PDFDocument,
+        filename: str,
+        page_numbers: Optional[List[int]] = None,
+    ) -> Dict[int, str]:
+        """
+        Extract text from selected pages using OCR (Tesseract + pdf2image).
+        
+        Args:
+            document: Parsed PDF handle
+            filename: Original filename (for logging)
+            page_numbers: 1-based pages to OCR (None = every page)
+        
+        Returns:
+            Mapping of page number to "[PAGE n]"-prefixed OCR text
+        """
         try:
             import pdf2image
             import pytesseract
-            import os
             from pathlib import Path
             
             # Auto-detect poppler path on Windows
@@ -138,85 +468,324 @@ class PDFExtractionService:
             if tesseract_path:
                 pytesseract.pytesseract.tesseract_cmd = tesseract_path
                 
+            ocr_pool = get_ocr_pool()
+            ocr_store = get_ocr_store()
+            doc_hash = document.content_hash if ocr_store else None
+            admission: Optional[OCRAdmission] = None
+            
+            if page_numbers is None:
+                try:
+                    page_count = await asyncio.to_thread(lambda: document.page_count)
+                except Exception:
+                    # PyPDF2 could not parse it - poppler is more forgiving
+                    info = await ocr_pool.run(
+                        pdf2image.pdfinfo_from_bytes, document.pdf_bytes, poppler_path=poppler_path
+                    )
+                    page_count = info["Pages"]
+                page_numbers = list(range(1, page_count + 1))
+            
             logger.info("ocr_extraction_started", 
                        filename=filename, 
+                       pages=page_numbers,
+                       queue_depth=ocr_pool.queued,
+                       pending_pages=ocr_pool.pending_pages,
                        tesseract_path=tesseract_path,
                        poppler_path=poppler_path)
             
-            # Convert PDF to images with high DPI for better OCR
-            images = await asyncio.to_thread(
-                pdf2image.convert_from_bytes,
-                pdf_bytes,
-                dpi=300,
-                fmt='RGB',
-                poppler_path=poppler_path,
-                first_page=1,
-                last_page=5  # Limit to first 5 pages to avoid timeouts
-            )
-            
-            extracted_text = ""
-            for i, image in enumerate(images):
-                # Extract text from image using Tesseract
-                page_text = await asyncio.to_thread(
-                    pytesseract.image_to_string,
-                    image,
-                    lang='eng',
-                    config='--psm 6'  # Uniform block of text
-                )
-                extracted_text += f"\n[PAGE {i+1}]\n{page_text}\n"
+            ocr_pages = {}
+            page_dpi = {}
+            with tempfile.TemporaryDirectory(prefix="superclaims_ocr_", ignore_cleanup_errors=True) as tmp_dir:
+                
+                async def ocr_pass(pass_pages: List[int], dpi: int, grayscale: bool) -> List[int]:
+                    """OCR pages at one resolution; returns pages below the confidence bar."""
+                    nonlocal admission
+                    low_confidence = []
+                    config = f"{TESSERACT_CONFIG} lang=eng{' gray' if grayscale else ''}"
+                    
+                    def record(page_number: int, page_text: str, confidence: float) -> None:
+                        ocr_pages[page_number] = f"[PAGE {page_number}]\n{page_text.strip()}"
+                        page_dpi[page_number] = dpi
+                        if confidence < settings.ocr_min_confidence:
+                            low_confidence.append(page_number)
+                    
+                    # Reuse pages already OCRed at these settings (survives restarts)
+                    pages_to_render = []
+                    for page_number in pass_pages:
+                        stored = None
+                        if ocr_store:
+                            stored = await asyncio.to_thread(ocr_store.get, doc_hash, page_number, dpi, config)
+                        if stored:
+                            record(page_number, *stored)
+                        else:
+                            pages_to_render.append(page_number)
+                    
+                    if pages_to_render:
+                        if admission is None:
+                            # Reject before any rendering rather than abandoning a document half-way through
+                            admission = ocr_pool.admit(len(pages_to_render))
+                        else:
+                            admission.add(len(pages_to_render))
+                    
+                    # Pages are rendered to disk one at a time, one page ahead of OCR
+                    async for page_number, image_path in _render_pages(
+                        document.pdf_bytes, pages_to_render, tmp_dir, poppler_path, dpi=dpi, grayscale=grayscale
+                    ):
+                        try:
+                            # Tesseract reads the file itself, so no bitmap is held in memory
+                            page_text, confidence = await ocr_pool.run(_tesseract_page, image_path)
+                        finally:
+                            os.remove(image_path)  # Free the page as soon as its text is out
+                            admission.page_done()
+                        
+                        logger.debug(
+                            "ocr_page_completed",
+                            filename=filename,
+                            page=page_number,
+                            dpi=dpi,
+                            confidence=round(confidence, 1)
+                        )
+                        if ocr_store:
+                            await asyncio.to_thread(
+                                ocr_store.put, doc_hash, page_number, dpi, config, page_text, confidence
+                            )
+                        record(page_number, page_text, confidence)
+                    
+                    return sorted(low_confidence)
+                
+                try:
+                    if settings.ocr_adaptive_enabled:
+                        # Cheap grayscale pass first; re-render only pages Tesseract struggled with
+                        retry_pages = await ocr_pass(page_numbers, settings.ocr_low_dpi, grayscale=True)
+                        if retry_pages:
+                            logger.info(
+                                "ocr_low_confidence_rerender",
+                                filename=filename,
+                                pages=retry_pages,
+                                dpi=settings.ocr_high_dpi
+                            )
+                            await ocr_pass(retry_pages, settings.ocr_high_dpi, grayscale=False)
+                    else:
+                        await ocr_pass(page_numbers, settings.ocr_high_dpi, grayscale=False)
+                finally:
+                    if admission is not None:
+                        admission.release()  # Pages that failed or never rendered
             
             logger.info("ocr_extraction_completed", 
                        filename=filename, 
-                       pages_processed=len(images),
-                       text_length=len(extracted_text))
+                       pages_processed=len(ocr_pages),
+                       page_dpi=page_dpi,
+                       text_length=sum(len(text) for text in ocr_pages.values()))
             
-            return extracted_text.strip()
+            return ocr_pages
             
+        except OCRQueueFullError:
+            raise  # Backpressure must reach the API layer
         except Exception as e:
             logger.error("ocr_extraction_error", 
                         filename=filename, 
                         error=str(e), 
                         error_type=type(e).__name__)
-            return ""
+            return {}
     
     @classmethod
-    async def extract_text(cls, pdf_bytes: bytes, filename: str = "") -> str:
+    async def _ocr_image_pages(cls, document: PDFDocument, filename: str, pages: List[str]) -> List[str]:
+        """
+        OCR only the pages that lack a usable text layer.
+        
+        Pages whose native text is shorter than `ocr_page_min_chars` are
+        rasterized and replaced with OCR output; all other pages keep their
+        native text. If native extraction produced no pages at all, every
+        page is OCRed.
+        """
+        if not pages:
+            ocr_pages = await cls._ocr_pages(document, filename)
+            if not ocr_pages:
+                _report_gap("ocr_failed")
+            return [ocr_pages[n] for n in sorted(ocr_pages)]
+        
+        image_pages = [
+            page_number
+            for page_number, text in enumerate(pages, start=1)
+            if len(text.strip()) < settings.ocr_page_min_chars
+        ]
+        if not image_pages:
+            return pages
+        
+        logger.info(
+            "ocr_image_pages_detected",
+            filename=filename,
+            image_pages=image_pages,
+            total_pages=len(pages)
+        )
+        
+        ocr_pages = await cls._ocr_pages(document, filename, image_pages)
+        missing = [page_number for page_number in image_pages if page_number not in ocr_pages]
+        if missing:
+            _report_gap(f"ocr_failed_pages={missing}")
+        return [ocr_pages.get(page_number, text) for page_number, text in enumerate(pages, start=1)]
+    
+    
+    @staticmethod
+    def has_text_layer(document: PDFDocument) -> bool:
+        """
+        Quick check whether the first page carries a text layer.
+        
+        Scanned PDFs are page-sized images with no font resources, so a
+        missing /Font dictionary is a cheap signal that OCR will be needed.
+        """
+        try:
+            with document.reader() as pdf_reader:
+                if not pdf_reader.pages:
+                    return False
+                resources = pdf_reader.pages[0].get("/Resources") or {}
+                resources = resources.get_object() if hasattr(resources, "get_object") else resources
+                return bool(resources.get("/Font"))
+        except Exception as e:
+            logger.debug("text_layer_check_failed", error=str(e))
+            return True  # Unknown - let the text extractors decide
+    
+    @classmethod
+    async def _extract_sequential(cls, document: PDFDocument, filename: str) -> List[str]:
+        """Run pdfplumber, then PyPDF2 if it fell short, then OCR image pages."""
+        # Try pdfplumber first (better quality)
+        pages = await cls.extract_pages_pdfplumber(document)
+        
+        # Fallback to PyPDF2 if pdfplumber fails or returns empty
+        if _text_length(pages) < MIN_TEXT_LENGTH:  # Increased threshold for table-heavy PDFs
+            logger.warning(
+                "pdfplumber_insufficient_fallback_to_pypdf2",
+                filename=filename,
+                text_length=_text_length(pages)
+            )
+            pypdf2_pages = await cls.extract_pages_pypdf2(document)
+            if _text_length(pypdf2_pages) > _text_length(pages):
+                pages = pypdf2_pages
+        
+        # OCR fallback only for pages without a usable text layer
+        return await cls._ocr_image_pages(document, filename, pages)
+    
+    @classmethod
+    async def _extract_racing(cls, document: PDFDocument, filename: str) -> List[str]:
+        """
+        Run extractors concurrently and keep the first result that is good enough.
+        
+        pdfplumber and PyPDF2 start together, and whole-document OCR starts
+        immediately when the first page has no text layer. Remaining
+        extractors are cancelled as soon as one result passes MIN_TEXT_LENGTH;
+        if none does, the longest result wins. Pages of a native result that
+        still lack text are then OCRed individually.
+        
+        Cancelled extractors are awaited before returning. Cancelling stops
+        awaiting work already handed to a thread; the thread itself runs to
+        completion and its result is discarded.
+        """
+        async def ocr_all_pages() -> List[str]:
+            ocr_pages = await cls._ocr_pages(document, filename)
+            return [ocr_pages[n] for n in sorted(ocr_pages)]
+        
+        # Dict order doubles as preference order when several finish together
+        tasks: Dict[asyncio.Task, str] = {
+            asyncio.create_task(cls.extract_pages_pdfplumber(document)): "pdfplumber",
+        }
+        
+        # Check the text layer before PyPDF2 extraction takes the reader lock;
+        # the parse it triggers is reused by the PyPDF2 extractor
+        text_layer = await asyncio.to_thread(cls.has_text_layer, document)
+        tasks[asyncio.create_task(cls.extract_pages_pypdf2(document))] = "pypdf2"
+        
+        if not text_layer:
+            logger.info("ocr_started", filename=filename, reason="no_text_layer")
+            tasks[asyncio.create_task(ocr_all_pages())] = "ocr"
+        
+        best_pages, best_method = [], None
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                
+                for task in sorted(done, key=list(tasks).index):
+                    pages = task.result() or []
+                    if _text_length(pages) > _text_length(best_pages):
+                        best_pages, best_method = pages, tasks[task]
+                
+                if _text_length(best_pages) >= MIN_TEXT_LENGTH:
+                    logger.info(
+                        "pdf_extraction_race_won",
+                        filename=filename,
+                        method=best_method,
+                        cancelled=[tasks[t] for t in pending]
+                    )
+                    break
+            else:
+                logger.info("pdf_extraction_race_no_winner", filename=filename, method=best_method)
+        finally:
+            for task in pending:
+                task.cancel()
+            # Let cancelled tasks unwind and retrieve every exception (e.g. a
+            # losing OCR task's OCRQueueFullError) so none goes unobserved
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        if best_method == "ocr":
+            return best_pages
+        
+        return await cls._ocr_image_pages(document, filename, best_pages)
+    
+    @classmethod
+    async def extract_text(
+        cls,
+        pdf_bytes: bytes,
+        filename: str = "",
+        document: Optional[PDFDocument] = None,
+    ) -> str:
         """
         Extract text from PDF using multiple methods.
         
+        The extraction strategy is set by `pdf_extraction_strategy`: "race"
+        runs extractors concurrently, "sequential" runs them one after another.
+        Results are cached by SHA-256 of the PDF bytes plus EXTRACTOR_VERSION,
+        so re-uploads of the same file skip extraction entirely. A result
+        with gaps (pages whose OCR failed) is not cached, so
+        a transient OCR failure is retried on the next upload.
+        
         Args:
             pdf_bytes: PDF file content as bytes
             filename: Original filename (for logging)
+            document: Shared parsed handle for `pdf_bytes`; when omitted a
+                temporary one is created and closed before returning
         
         Returns:
             Extracted text content
         """
+        if document is None:
+            async with PDFDocument(pdf_bytes) as document:
+                return await cls.extract_text(pdf_bytes, filename, document)
+        
+        cache = get_extraction_cache() if settings.extraction_cache_enabled else None
+        cache_key = f"{document.content_hash}-v{EXTRACTOR_VERSION}"
+        
+        if cache:
+            cached_text = await cache.get(cache_key)
+            if cached_text is not None:
+                logger.info(
+                    "pdf_extraction_cache_hit",
+                    filename=filename,
+                    text_length=len(cached_text)
+                )
+                return cached_text
+        
         logger.info(
             "pdf_extraction_started",
             filename=filename,
             size_bytes=len(pdf_bytes)
         )
         
-        # Try pdfplumber first (better quality)
-        text = await cls.extract_text_pdfplumber(pdf_bytes)
-        
-        # Fallback to PyPDF2 if pdfplumber fails or returns empty
-        if not text or len(text.strip()) < 500:  # Increased threshold for table-heavy PDFs
-            logger.warning(
-                "pdfplumber_insufficient_fallback_to_pypdf2",
-                filename=filename,
-                text_length=len(text)
-            )
-            text = await cls.extract_text_pypdf2(pdf_bytes)
-            
-        # OCR fallback for image-based PDFs 
-        if not text or len(text.strip()) < 500:  # Trigger OCR for poor extractions
-            logger.warning(
-                "pypdf2_insufficient_attempting_ocr",
-                filename=filename,
-                text_length=len(text)
-            )
-            text = await cls._extract_with_ocr(pdf_bytes, filename)
+        with _extraction_gap_scope() as gaps:
+            if settings.pdf_extraction_strategy == "race":
+                pages = await cls._extract_racing(document, filename)
+            else:
+                pages = await cls._extract_sequential(document, filename)
+        # Page breaks stay in the text so SectionIndex can recover page boundaries
+        text = _join_pages(pages, PAGE_BREAK)
         
         # Final check
         if not text or len(text.strip()) < 10:
@@ -234,25 +803,35 @@ class PDFExtractionService:
             preview=text[:200].replace("\n", " ")
         )
         
+        if cache and gaps:
+            logger.warning("pdf_extraction_not_cached", filename=filename, gaps=gaps)
+        elif cache:
+            await cache.set(cache_key, text)
+        
         return text
     
     @classmethod
-    async def extract_metadata(cls, pdf_bytes: bytes) -> dict:
-        """Extract PDF metadata."""
+    async def extract_metadata(cls, pdf_bytes: bytes, document: Optional[PDFDocument] = None) -> dict:
+        """Extract PDF metadata (reusing `document` when given)."""
+        if document is None:
+            async with PDFDocument(pdf_bytes) as document:
+                return await cls.extract_metadata(pdf_bytes, document)
+        
         try:
-            pdf_file = BytesIO(pdf_bytes)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            
-            metadata = pdf_reader.metadata
+            def _extract():
+                with document.reader() as pdf_reader:
+                    metadata = pdf_reader.metadata or {}
+                    
+                    return {
+                        "title": metadata.get("/Title", ""),
+                        "author": metadata.get("/Author", ""),
+                        "subject": metadata.get("/Subject", ""),
+                        "creator": metadata.get("/Creator", ""),
+                        "producer": metadata.get("/Producer", ""),
+                        "pages": len(pdf_reader.pages),
+                    }
             
-            return {
-                "title": metadata.get("/Title", ""),
-                "author": metadata.get("/Author", ""),
-                "subject": metadata.get("/Subject", ""),
-                "creator": metadata.get("/Creator", ""),
-                "producer": metadata.get("/Producer", ""),
-                "pages": len(pdf_reader.pages),
-            }
+            return await asyncio.to_thread(_extract)
         except Exception as e:
             logger.error("pdf_metadata_extraction_error", error=str(e))
             return {}
@@ -0,0 +1,44 @@
+"""Fit ranked document sections into a prompt token budget."""
+from typing import Iterable, Optional
+from app.services.token_counter import TokenCounter, get_token_counter
+from app.utils.logging import get_logger
+from app.utils.section_index import SectionIndex, Span
+
+logger = get_logger(__name__)
+
+
+def fit_sections(
+    index: SectionIndex,
+    spans: Iterable[Span],
+    token_budget: int,
+    purpose: str,
+    counter: Optional[TokenCounter] = None,
+) -> str:
+    """
+    Document text for a prompt, within `token_budget` tokens.
+
+    Documents that fit are returned whole; longer ones are reduced to the
+    ranked `spans` (highest priority first) as counted by the configured
+    provider's token counter.
+
+    Args:
+        index: SectionIndex of the document
+        spans: Candidate spans, most important first
+        token_budget: Tokens the document text may use in the prompt
+        purpose: Prompt name for logs (e.g. "bill")
+        counter: Token counter (default: the configured provider's)
+    """
+    counter = counter or get_token_counter()
+    text = index.sample(spans, token_budget, measure=counter.count)
+
+    if len(text) < len(index.text):
+        logger.info(
+            "prompt_sections_fitted",
+            purpose=purpose,
+            token_budget=token_budget,
+            tokens=counter.count(text),
+            original_chars=len(index.text),
+            sampled_chars=len(text),
+            counter=counter.name
+        )
+    return text
@@ -0,0 +1,164 @@
+"""Latency tracking and circuit breaking for LLM providers."""
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+from app.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies with percentile lookup."""
+
+    def __init__(self, window: int):
+        """
+        Args:
+            window: Number of most recent samples kept
+        """
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        """Add one latency sample."""
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Latency at `fraction` (e.g. 0.95), or None without samples."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+        return ordered[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Opens after `failure_threshold` failed calls in a row. While open, calls
+    are refused until `reset_timeout` seconds have passed; then a single
+    probe is let through (half-open) and its outcome closes or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        """Initialize a closed breaker."""
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        """Whether a call may be sent to this provider now."""
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+            logger.info("circuit_breaker_half_open", provider=self.name)
+
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        """Close the breaker after a successful call."""
+        if self.state != self.CLOSED:
+            logger.info("circuit_breaker_closed", provider=self.name)
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """Allow a new probe when the current one was cancelled without an outcome."""
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """Count a failed call, opening the breaker at the threshold."""
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(
+                    "circuit_breaker_opened",
+                    provider=self.name,
+                    failures=self.failures,
+                    reset_timeout=self.reset_timeout
+                )
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class ProviderHealth:
+    """Latency and breaker state for one provider, shared by all callers."""
+
+    def __init__(self, name: str):
+        """Initialize from settings."""
+        self.name = name
+        self.latency = LatencyTracker(window=settings.llm_latency_window)
+        self.breaker = CircuitBreaker(
+            name,
+            failure_threshold=settings.llm_circuit_failure_threshold,
+            reset_timeout=settings.llm_circuit_reset_timeout,
+        )
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def hedge_delay(self) -> float:
+        """
+        Seconds to wait on this provider before hedging to the secondary.
+
+        Uses the configured latency percentile once enough samples exist,
+        otherwise the initial delay; never less than the configured floor.
+        """
+        if len(self.latency) < settings.llm_hedge_min_samples:
+            return settings.llm_hedge_initial_delay
+        return max(settings.llm_hedge_min_delay, self.latency.percentile(settings.llm_hedge_percentile))
+
+    def stats(self) -> Dict[str, Any]:
+        """Health statistics for monitoring."""
+        p50 = self.latency.percentile(0.5)
+        p95 = self.latency.percentile(0.95)
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "times_opened": self.breaker.times_opened,
+            "latency_samples": len(self.latency),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+        }
+
+
+# Global provider health, one per provider
+_provider_health: Dict[str, ProviderHealth] = {}
+
+
+def get_provider_health(provider_name: str) -> ProviderHealth:
+    """Get or create the shared health tracker for an LLM provider."""
+    if provider_name not in _provider_health:
+        _provider_health[provider_name] = ProviderHealth(provider_name)
+
+    return _provider_health[provider_name]
+
+
+def get_provider_health_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats for every provider tracked so far."""
+    return {name: health.stats() for name, health in _provider_health.items()}
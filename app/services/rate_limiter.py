@@ -0,0 +1,255 @@
+"""Token-bucket rate limiting and concurrency control for LLM providers."""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Literal, Optional, Tuple
+from app.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+Priority = Literal["interactive", "background"]
+
+# Lower value is admitted first
+PRIORITY_ORDER: Dict[str, int] = {"interactive": 0, "background": 1}
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `per_minute / 60` per second.
+
+    The level may go negative when actual usage turns out higher than the
+    amount reserved; later callers then wait for the debt to refill.
+    """
+
+    def __init__(self, per_minute: float):
+        """Start with a full bucket holding one minute of capacity."""
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until `amount` can be consumed (0 if available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)  # Oversized requests wait for a full bucket, never forever
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount: float) -> None:
+        """Take `amount` from the bucket (callers check time_until first)."""
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float) -> None:
+        """Return (positive) or charge (negative) tokens after the fact."""
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimitLease:
+    """Admission granted by LLMRateLimiter; report actual usage before release."""
+
+    def __init__(self, reserved_tokens: int, priority: str):
+        self.reserved_tokens = reserved_tokens
+        self.actual_tokens: Optional[int] = None
+        self.priority = priority
+
+    def report(self, actual_tokens: int) -> None:
+        """Record tokens actually used so the TPM bucket can be reconciled."""
+        self.actual_tokens = actual_tokens
+
+
+class LLMRateLimiter:
+    """
+    Per-provider governor combining RPM/TPM token buckets with an in-flight cap.
+
+    Callers reserve an estimated token count on admission and report actual
+    usage when the call finishes; the difference is returned to (or charged
+    against) the TPM bucket. When a call cannot be admitted it waits in a
+    priority queue where interactive requests always go ahead of background
+    ones and equal priorities are served first-come first-served.
+
+    Not thread-safe: intended to be used from the event loop only.
+    """
+
+    def __init__(self, name: str, rpm: int, tpm: int, max_in_flight: int):
+        """Initialize buckets for one provider."""
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_in_flight = max_in_flight
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.in_flight = 0
+
+        self._waiters: List[Tuple[int, int, asyncio.Future, int, str]] = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self._usage: Deque[Tuple[float, int]] = deque()  # (timestamp, tokens) over the last minute
+
+        self.admitted = 0
+        self.throttled = 0
+        self._total_wait = 0.0
+        self.max_wait = 0.0
+
+        logger.info(
+            "llm_rate_limiter_initialized",
+            provider=name,
+            rpm=rpm,
+            tpm=tpm,
+            max_in_flight=max_in_flight
+        )
+
+    def _wait_time(self, tokens: int) -> float:
+        """Seconds until a call of `tokens` fits both buckets (ignores in-flight cap)."""
+        return max(self.requests.time_until(1), self.tokens.time_until(tokens))
+
+    def _take(self, tokens: int) -> None:
+        self.requests.consume(1)
+        self.tokens.consume(tokens)
+        self.in_flight += 1
+        self.admitted += 1
+
+    def _dispatch(self) -> None:
+        """Admit queued callers in priority order while capacity allows."""
+        self._wakeup = None
+        while self._waiters:
+            _, _, future, tokens, _ = self._waiters[0]
+            if future.done():  # Cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= self.max_in_flight:
+                return  # A release will dispatch again
+            wait = self._wait_time(tokens)
+            if wait > 0:
+                # Head-of-line blocking keeps lower priorities from jumping ahead
+                self._wakeup = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self._take(tokens)
+            future.set_result(None)
+
+    async def _admit(self, tokens: int, priority: str) -> None:
+        if not self._waiters and self.in_flight < self.max_in_flight and self._wait_time(tokens) == 0:
+            self._take(tokens)
+            return
+
+        self.throttled += 1
+        queued_at = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self._waiters,
+            (PRIORITY_ORDER.get(priority, 0), next(self._sequence), future, tokens, priority)
+        )
+        logger.debug(
+            "llm_rate_limit_wait",
+            provider=self.name,
+            priority=priority,
+            waiting=len(self._waiters),
+            in_flight=self.in_flight
+        )
+        if self._wakeup is None:
+            self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(tokens, 0)  # Admitted just as the caller gave up
+            raise
+        finally:
+            wait = time.monotonic() - queued_at
+            self._total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def _release(self, reserved_tokens: int, actual_tokens: int) -> None:
+        self.in_flight -= 1
+        self.tokens.adjust(reserved_tokens - actual_tokens)
+        now = time.monotonic()
+        self._usage.append((now, actual_tokens))
+        if self._waiters and self._wakeup is None:
+            self._dispatch()
+
+    @asynccontextmanager
+    async def acquire(self, estimated_tokens: int, priority: Priority = "interactive") -> AsyncIterator[RateLimitLease]:
+        """
+        Wait for capacity, then hold an in-flight slot for the duration of the block.
+
+        Args:
+            estimated_tokens: Prompt plus maximum output tokens to reserve
+            priority: "interactive" calls are admitted before "background" ones
+        """
+        await self._admit(estimated_tokens, priority)
+        lease = RateLimitLease(estimated_tokens, priority)
+        try:
+            yield lease
+        finally:
+            actual = lease.actual_tokens if lease.actual_tokens is not None else lease.reserved_tokens
+            self._release(lease.reserved_tokens, actual)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current usage against the configured quota."""
+        cutoff = time.monotonic() - 60
+        while self._usage and self._usage[0][0] < cutoff:
+            self._usage.popleft()
+        requests_last_minute = len(self._usage)
+        tokens_last_minute = sum(tokens for _, tokens in self._usage)
+        waiting = {name: 0 for name in PRIORITY_ORDER}
+        for _, _, future, _, priority in self._waiters:
+            if not future.done():
+                waiting[priority] = waiting.get(priority, 0) + 1
+
+        return {
+            "rpm_limit": self.rpm,
+            "tpm_limit": self.tpm,
+            "requests_last_minute": requests_last_minute,
+            "tokens_last_minute": tokens_last_minute,
+            "rpm_utilization": round(requests_last_minute / self.rpm, 3) if self.rpm else 0.0,
+            "tpm_utilization": round(tokens_last_minute / self.tpm, 3) if self.tpm else 0.0,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "waiting": waiting,
+            "admitted": self.admitted,
+            "throttled": self.throttled,
+            "avg_wait_ms": round(self._total_wait / self.throttled * 1000, 1) if self.throttled else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
+
+
+# Global rate limiters, one per provider
+_rate_limiters: Dict[str, LLMRateLimiter] = {}
+
+
+def get_rate_limiter(provider_name: str) -> LLMRateLimiter:
+    """Get or create the shared rate limiter for an LLM provider."""
+    if provider_name not in _rate_limiters:
+        if provider_name == "openai":
+            rpm, tpm = settings.openai_rpm, settings.openai_tpm
+        else:
+            rpm, tpm = settings.gemini_rpm, settings.gemini_tpm
+
+        # Headroom keeps us just under the quota so bursts don't trip provider 429s
+        headroom = settings.llm_rate_limit_headroom
+        _rate_limiters[provider_name] = LLMRateLimiter(
+            name=provider_name,
+            rpm=max(1, int(rpm * headroom)),
+            tpm=max(1, int(tpm * headroom)),
+            max_in_flight=settings.llm_max_in_flight,
+        )
+
+    return _rate_limiters[provider_name]
+
+
+def get_rate_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats for every provider limiter created so far."""
+    return {name: limiter.stats() for name, limiter in _rate_limiters.items()}
@@ -0,0 +1,93 @@
+"""Gemini response schemas derived from the Pydantic models in app.schemas."""
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, Type
+from pydantic import BaseModel
+
+# Formats Gemini cannot enforce are turned into a description hint instead
+FORMAT_HINTS = {"date": "YYYY-MM-DD", "date-time": "ISO 8601 date-time"}
+
+
+def _resolve_ref(schema: Dict[str, Any], defs: Dict[str, Any]) -> Dict[str, Any]:
+    """Inline a local `$ref`, keeping any sibling keys."""
+    if "$ref" not in schema:
+        return schema
+    target = defs[schema["$ref"].split("/")[-1]]
+    return {**target, **{k: v for k, v in schema.items() if k != "$ref"}}
+
+
+def _convert(schema: Dict[str, Any], defs: Dict[str, Any], path: str) -> Dict[str, Any]:
+    """Convert one JSON Schema node to the OpenAPI subset Gemini accepts."""
+    schema = _resolve_ref(schema, defs)
+
+    # Optional[X] / Union[X, ...] - Gemini has no unions, so keep the first
+    # non-null variant; keys next to anyOf (description, json_schema_extra) win
+    for union_key in ("anyOf", "oneOf", "allOf"):
+        if union_key in schema:
+            variants = [_resolve_ref(v, defs) for v in schema[union_key]]
+            non_null = [v for v in variants if v.get("type") != "null"]
+            outer = {k: v for k, v in schema.items() if k != union_key}
+            converted = _convert({**non_null[0], **outer}, defs, path)
+            if len(non_null) < len(variants):
+                converted["nullable"] = True
+            return converted
+
+    result: Dict[str, Any] = {}
+    description = schema.get("description")
+    if schema.get("format") in FORMAT_HINTS:
+        hint = FORMAT_HINTS[schema["format"]]
+        description = f"{description} ({hint})" if description else hint
+    if description:
+        result["description"] = description
+
+    if "enum" in schema:
+        result["type"] = "string"
+        result["enum"] = [str(value) for value in schema["enum"]]
+        return result
+
+    schema_type = schema.get("type", "string")
+    result["type"] = schema_type
+    if schema.get("nullable"):
+        result["nullable"] = True
+
+    if schema_type == "array":
+        result["items"] = _convert(schema.get("items", {}), defs, f"{path}[]")
+    elif schema_type == "object":
+        properties = schema.get("properties") or {}
+        if not properties:
+            raise ValueError(
+                f"{path}: free-form objects cannot be expressed in a Gemini response schema; "
+                f"describe their properties with json_schema_extra"
+            )
+        result["properties"] = {
+            name: _convert(prop, defs, f"{path}.{name}") for name, prop in properties.items()
+        }
+        required = [name for name in schema.get("required", []) if name in properties]
+        if required:
+            result["required"] = required
+
+    return result
+
+
+@lru_cache(maxsize=None)
+def _response_schema(model: Type[BaseModel], exclude: FrozenSet[str]) -> Dict[str, Any]:
+    json_schema = model.model_json_schema()
+    defs = json_schema.get("$defs", {})
+    json_schema["properties"] = {
+        name: prop for name, prop in json_schema["properties"].items() if name not in exclude
+    }
+    json_schema.pop("description", None)  # Model docstrings are for developers, not the LLM
+    return _convert(json_schema, defs, model.__name__)
+
+
+def response_schema_for(model: Type[BaseModel], exclude: Iterable[str] = ()) -> Dict[str, Any]:
+    """
+    Build a Gemini `response_schema` from a Pydantic model.
+
+    Args:
+        model: Model whose fields the LLM should return
+        exclude: Fields the caller fills itself (e.g. filename)
+
+    Returns:
+        OpenAPI-style schema dict (cached per model; do not mutate)
+    """
+    return _response_schema(model, frozenset(exclude))
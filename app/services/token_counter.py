@@ -0,0 +1,157 @@
+"""Prompt token counting per provider and reporting of actual token usage."""
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from itertools import repeat
+from typing import Dict, Iterator, Optional
+from app.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Character classes for the estimator, as str.translate tables (a regex pass
+# per class is several times slower on long documents). Line breaks count as
+# symbols; other whitespace is folded into neighbouring tokens.
+_SYMBOL_CHARS = "".join(chr(i) for i in range(128) if not chr(i).isalnum() and chr(i) not in " \t\r\f\v")
+_SYMBOL_CHARS += "₹–—‘’“”•"
+_TO_SPACE = {ord(c): " " for c in _SYMBOL_CHARS + " \t\r\f\v"}
+_LETTER_RUNS = str.maketrans({**_TO_SPACE, **{ord(c): " " for c in "0123456789"}})
+_DIGIT_RUNS = str.maketrans({**_TO_SPACE, **{i: " " for i in range(128) if chr(i).isalpha()}})
+_DROP_SYMBOLS = str.maketrans({ord(c): None for c in _SYMBOL_CHARS})
+
+# Calibration: weight of each new observation, accepted scale range, and the
+# smallest prompt worth learning from (short prompts are dominated by overhead)
+CALIBRATION_WEIGHT = 0.2
+CALIBRATION_BOUNDS = (0.5, 2.0)
+CALIBRATION_MIN_TOKENS = 200
+
+
+class TokenCounter(ABC):
+    """Counts the tokens a text costs for one model."""
+
+    name = "estimate"
+
+    @abstractmethod
+    def count(self, text: str) -> int:
+        """Tokens `text` costs as (part of) a prompt."""
+
+    def observe(self, estimated: int, actual: int) -> None:
+        """Learn from the provider's count for a prompt this counter estimated."""
+
+
+class EstimatedTokenCounter(TokenCounter):
+    """
+    Offline token estimate by character class, calibrated against real counts.
+
+    Words cost about one token per `chars_per_word_token` letters, digit runs
+    one token per `digits_per_token` digits (Gemini's tokenizer splits every
+    digit, OpenAI's groups up to three), and each symbol and line break one
+    token. This tracks number- and table-heavy bills far better than a flat
+    characters-per-token ratio. The provider's reported prompt token counts
+    then adjust `scale` so estimates converge on the model's real tokenizer.
+    """
+
+    def __init__(self, digits_per_token: int = 1, chars_per_word_token: float = 6.0):
+        """
+        Args:
+            digits_per_token: Digits the target tokenizer packs into one token
+            chars_per_word_token: Average letters per token within words
+        """
+        self.digits_per_token = digits_per_token
+        self.chars_per_word_token = chars_per_word_token
+        self.scale = 1.0
+
+    def count(self, text: str) -> int:
+        word_lengths = map(len, text.translate(_LETTER_RUNS).split())
+        words = sum(map(max, repeat(self.chars_per_word_token), word_lengths)) / self.chars_per_word_token
+
+        digit_runs = filter(str.isdigit, text.translate(_DIGIT_RUNS).split())
+        if self.digits_per_token == 1:
+            digits = sum(map(len, digit_runs))
+        else:
+            digits = sum(-(-len(run) // self.digits_per_token) for run in digit_runs)
+
+        symbols = len(text) - len(text.translate(_DROP_SYMBOLS))
+        return int((words + digits + symbols) * self.scale + 0.5)
+
+    def observe(self, estimated: int, actual: int) -> None:
+        if estimated < CALIBRATION_MIN_TOKENS or actual <= 0:
+            return
+        ratio = self.scale * actual / estimated
+        scale = (1 - CALIBRATION_WEIGHT) * self.scale + CALIBRATION_WEIGHT * ratio
+        self.scale = min(max(scale, CALIBRATION_BOUNDS[0]), CALIBRATION_BOUNDS[1])
+
+
+class TiktokenCounter(TokenCounter):
+    """Exact counts for OpenAI models using tiktoken."""
+
+    name = "tiktoken"
+
+    def __init__(self, model: str):
+        """Load the encoding for `model`, or the current default if tiktoken does not know it."""
+        import tiktoken
+
+        try:
+            self.encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            self.encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+def _create_counter(provider_name: str) -> TokenCounter:
+    if provider_name == "openai":
+        try:
+            return TiktokenCounter(settings.openai_model)
+        except ImportError:
+            # tiktoken is in requirements.txt; only a partial install lacks it
+            logger.warning("tiktoken_unavailable", fallback="estimate")
+            return EstimatedTokenCounter(digits_per_token=3)
+    # google-generativeai has no offline tokenizer (count_tokens is an API
+    # call), so Gemini prompts are estimated and calibrated from usage_metadata
+    return EstimatedTokenCounter(digits_per_token=1)
+
+
+# Global counters, one per provider
+_counters: Dict[str, TokenCounter] = {}
+
+
+def get_token_counter(provider_name: Optional[str] = None) -> TokenCounter:
+    """Get or create the token counter for a provider (default: the configured one)."""
+    provider_name = provider_name or settings.default_llm_provider
+
+    if provider_name not in _counters:
+        _counters[provider_name] = _create_counter(provider_name)
+
+    return _counters[provider_name]
+
+
+@dataclass
+class TokenUsage:
+    """Token counts a provider reported for one call."""
+    prompt_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+
+
+_current_usage: ContextVar[Optional[TokenUsage]] = ContextVar("llm_token_usage", default=None)
+
+
+@contextmanager
+def usage_scope() -> Iterator[TokenUsage]:
+    """Collect the usage reported by provider calls made inside the block."""
+    usage = TokenUsage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+def record_usage(prompt_tokens: Optional[int], output_tokens: Optional[int]) -> None:
+    """Report a provider's token counts to the enclosing usage_scope, if any."""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.prompt_tokens = prompt_tokens
+        usage.output_tokens = output_tokens
@@ -0,0 +1,105 @@
+"""Keyword-anchored regex matching: locate anchor keywords once, run patterns only there."""
+import re
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Non-ASCII characters that re.IGNORECASE equates with ASCII letters (and the
+# one whose lower() changes length). Texts containing any of them are matched
+# with plain full-text scans, so anchored results never differ from re.search.
+_CASEFOLD_SPECIALS = re.compile("[İıſK]")
+
+
+class AnchorIndex:
+    """Start positions of every anchor keyword in one text, found in one lowercase copy."""
+
+    def __init__(self, text: str, keywords: Iterable[str]):
+        """
+        Args:
+            text: Text the patterns will run over
+            keywords: Lowercase anchor literals to locate
+        """
+        self.text = text
+        self.anchored = _CASEFOLD_SPECIALS.search(text) is None
+        self._positions: Dict[str, List[int]] = {}
+
+        if self.anchored:
+            lowered = text.lower()
+            for keyword in set(keywords):
+                positions = []
+                pos = lowered.find(keyword)
+                while pos != -1:
+                    positions.append(pos)
+                    pos = lowered.find(keyword, pos + 1)
+                self._positions[keyword] = positions
+
+    def candidates(self, keywords: Sequence[str], offsets: Sequence[int]) -> List[int]:
+        """Sorted candidate start positions for a pattern."""
+        starts = {
+            pos + offset
+            for keyword in keywords
+            for pos in self._positions.get(keyword, ())
+            for offset in offsets
+        }
+        return sorted(start for start in starts if start >= 0)
+
+
+class AnchoredPattern:
+    """
+    A case-insensitive regex that can only start where one of its anchors starts.
+
+    `anchors` are the lowercase literals the pattern begins with; `offsets`
+    shift candidate starts for patterns whose keyword follows a bounded
+    prefix (e.g. "12-Feb-2025" anchored on the month). Instead of rescanning
+    the whole text, the pattern is tried only at candidate positions, which
+    gives the same matches as re.search / re.findall. Patterns without
+    anchors fall back to a full-text scan.
+    """
+
+    def __init__(
+        self,
+        pattern: str,
+        anchors: Sequence[str] = (),
+        offsets: Sequence[int] = (0,),
+        flags: int = re.IGNORECASE,
+    ):
+        """Compile the pattern once."""
+        self.regex = re.compile(pattern, flags)
+        self.pattern = pattern
+        self.anchors = tuple(anchors)
+        self.offsets = tuple(offsets)
+
+    def search(self, index: AnchorIndex) -> Optional[re.Match]:
+        """Leftmost match, like re.search."""
+        if not self.anchors or not index.anchored:
+            return self.regex.search(index.text)
+
+        for start in index.candidates(self.anchors, self.offsets):
+            match = self.regex.match(index.text, start)
+            if match:
+                return match
+        return None
+
+    def findall(self, index: AnchorIndex) -> List[str]:
+        """Non-overlapping matches, like re.findall (patterns with at most one group)."""
+        if not self.anchors or not index.anchored:
+            return self.regex.findall(index.text)
+
+        results = []
+        end = 0
+        for start in index.candidates(self.anchors, self.offsets):
+            if start < end:
+                continue
+            match = self.regex.match(index.text, start)
+            if match:
+                results.append(match.groups("")[0] if self.regex.groups else match.group())
+                end = max(match.end(), start + 1)
+        return results
+
+
+def anchor_keywords(*pattern_groups: Sequence[AnchoredPattern]) -> frozenset:
+    """All anchor literals used by the given pattern lists."""
+    return frozenset(
+        anchor
+        for patterns in pattern_groups
+        for pattern in patterns
+        for anchor in pattern.anchors
+    )
@@ -0,0 +1,53 @@
+"""Request deadlines propagated through the processing pipeline."""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+class DeadlineExceededError(Exception):
+    """Raised when work is skipped or cut short because the request deadline passed."""
+
+
+class Deadline:
+    """Absolute point in time by which a request must finish."""
+
+    def __init__(self, timeout: float):
+        """
+        Args:
+            timeout: Seconds from now until the deadline
+        """
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (never negative)."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        """Whether the deadline has passed."""
+        return self.remaining() <= 0
+
+    def budget(self, cap: float) -> float:
+        """Time a single stage or call may take: the remaining time, capped at `cap`."""
+        return min(cap, self.remaining())
+
+
+# Deadline of the request being processed in the current task (inherited by child tasks)
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def get_deadline() -> Optional[Deadline]:
+    """Deadline of the current request, or None outside a request."""
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Deadline) -> Iterator[Deadline]:
+    """Make `deadline` current for the enclosed code and tasks it creates."""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
@@ -0,0 +1,227 @@
+"""Per-document index of pages, tables and section headings for prompt sampling."""
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+Span = Tuple[int, int]
+
+# Separator PDFExtractionService puts between pages. Pages are split on the
+# form feed alone, since normalization may trim the newlines around it.
+PAGE_BREAK = "\n\f\n"
+
+TABLE_START = "[TABLE]"
+TABLE_END = "[/TABLE]"
+
+# Marker placed between non-adjacent sampled spans
+OMISSION_MARKER = "\n\n... [section omitted] ...\n\n"
+
+# Upper bound on characters per unit of a non-len measure, so fitting text to
+# a token budget never measures more than this many characters per token
+MAX_CHARS_PER_TOKEN = 16
+
+# Heading / label keywords per section group, matched case-insensitively
+SECTION_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "totals": (
+        "payor amount", "net amount", "net bill amount", "net payable", "bill amount",
+        "total amount", "final amount", "grand total", "amount payable", "amount due",
+    ),
+    "header": (
+        "patient name", "uhid", "ipid", "bill no", "bill number", "bill date",
+        "invoice no", "invoice date", "date of admission", "admission date",
+        "admitted on", "date of discharge", "discharge date", "discharged on",
+    ),
+    "discharge": (
+        "discharge summary", "diagnosis", "chief complaints", "history of present illness",
+        "course in hospital", "hospital course", "procedure", "surgery", "operation",
+        "condition at discharge", "advice on discharge", "consultant", "surgeon",
+    ),
+    "id_card": (
+        "member id", "policy number", "policy no", "card no", "sum insured",
+        "valid from", "valid till", "valid upto", "e-card",
+    ),
+}
+
+
+def _uncovered(span: Span, covered: List[Span]) -> List[Span]:
+    """Parts of `span` not inside any of the `covered` spans."""
+    pieces = [span]
+    for covered_start, covered_end in covered:
+        pieces = [
+            piece
+            for start, end in pieces
+            for piece in ((start, min(end, covered_start)), (max(start, covered_end), end))
+            if piece[0] < piece[1]
+        ]
+    return pieces
+
+
+class SectionIndex:
+    """
+    Offsets of pages, [TABLE] blocks and section keywords in one document.
+
+    Built once per document (on the normalized text) by the orchestrator and
+    shared by the classifier and extraction agents, which pick the spans
+    relevant to them and call `sample` instead of cutting fixed head/tail
+    windows.
+    """
+
+    def __init__(self, text: str, keywords: Optional[Dict[str, Sequence[str]]] = None):
+        """
+        Args:
+            text: Document text the offsets refer to
+            keywords: Section groups to index (default SECTION_KEYWORDS)
+        """
+        self.text = text
+        self.pages = self._find_pages(text)
+        self.tables = self._find_tables(text)
+
+        lowered = text.lower()
+        self.sections: Dict[str, List[int]] = {}
+        for group, terms in (keywords or SECTION_KEYWORDS).items():
+            offsets = set()
+            for term in terms:
+                pos = lowered.find(term)
+                while pos != -1:
+                    offsets.add(pos)
+                    pos = lowered.find(term, pos + 1)
+            self.sections[group] = sorted(offsets)
+
+    @staticmethod
+    def _find_pages(text: str) -> List[Span]:
+        pages = []
+        start = 0
+        pos = text.find("\f")
+        while pos != -1:
+            pages.append((start, pos))
+            start = pos + 1
+            pos = text.find("\f", start)
+        pages.append((start, len(text)))
+        return pages
+
+    @staticmethod
+    def _find_tables(text: str) -> List[Span]:
+        tables = []
+        start = text.find(TABLE_START)
+        while start != -1:
+            end = text.find(TABLE_END, start)
+            if end == -1:
+                break
+            end += len(TABLE_END)
+            tables.append((start, end))
+            start = text.find(TABLE_START, end)
+        return tables
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def first(self, group: str) -> int:
+        """Offset of the first keyword of a section group, or -1."""
+        offsets = self.sections.get(group)
+        return offsets[0] if offsets else -1
+
+    def head(self, size: int) -> Span:
+        return (0, min(size, len(self.text)))
+
+    def tail(self, size: int) -> Span:
+        return (max(0, len(self.text) - size), len(self.text))
+
+    def around(self, group: str, before: int, after: int, last_first: bool = False) -> List[Span]:
+        """Windows around every keyword of a section group."""
+        offsets = self.sections.get(group, [])
+        if last_first:
+            offsets = offsets[::-1]
+        return [(max(0, pos - before), min(len(self.text), pos + after)) for pos in offsets]
+
+    def page_heads(self, size: int) -> List[Span]:
+        """The first `size` characters of every page after the first."""
+        return [(start, min(end, start + size)) for start, end in self.pages[1:]]
+
+    def _fit(self, start: int, end: int, budget: int, measure: Callable[[str], int]) -> int:
+        """Largest end <= `end` such that text[start:end] measures within `budget`."""
+        low, high = start, min(end, start + budget * (1 if measure is len else MAX_CHARS_PER_TOKEN))
+        while low < high:
+            middle = (low + high + 1) // 2
+            if measure(self.text[start:middle]) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def _split_page(self, start: int, end: int, max_size: int, measure: Callable[[str], int]) -> List[Tuple[int, int, int]]:
+        """(start, end, size) pieces of one page, each within `max_size`, cut at line breaks where possible."""
+        size = measure(self.text[start:end])
+        if size <= max_size:
+            return [(start, end, size)]
+
+        pieces = []
+        while start < end:
+            cut = max(self._fit(start, end, max_size, measure), start + 1)
+            if cut < end:
+                line_end = self.text.rfind("\n", start, cut)
+                if line_end > start:
+                    cut = line_end + 1
+            pieces.append((start, cut, measure(self.text[start:cut])))
+            start = cut
+        return pieces
+
+    def chunks(self, max_size: int, measure: Callable[[str], int] = len) -> List[Span]:
+        """
+        Consecutive spans covering every page, each at most `max_size`.
+
+        Chunks follow page boundaries: short pages are grouped, and a page
+        larger than `max_size` is split at line breaks.
+        """
+        chunks: List[Span] = []
+        chunk_start, chunk_end, chunk_size = 0, 0, 0
+        for page_start, page_end in self.pages:
+            for start, end, size in self._split_page(page_start, page_end, max_size, measure):
+                if chunk_end > chunk_start and chunk_size + size <= max_size:
+                    chunk_end, chunk_size = end, chunk_size + size
+                    continue
+                if chunk_end > chunk_start:
+                    chunks.append((chunk_start, chunk_end))
+                chunk_start, chunk_end, chunk_size = start, end, size
+        if chunk_end > chunk_start:
+            chunks.append((chunk_start, chunk_end))
+        return chunks
+
+    def sample(self, spans: Iterable[Span], budget: int, measure: Callable[[str], int] = len) -> str:
+        """
+        Text of the given spans, at most `budget` units of document text.
+
+        `measure` sizes a piece of text (characters by default; pass a token
+        counter to budget in tokens). Spans are taken in priority order (a
+        span that does not fit is cut short), then emitted in document order
+        with OMISSION_MARKER between gaps. A document within the budget is
+        returned whole.
+        """
+        if measure(self.text) <= budget:
+            return self.text
+
+        chosen: List[Span] = []
+        used = 0
+        for span in spans:
+            for start, end in _uncovered(span, chosen):
+                if used >= budget:
+                    break
+                cost = measure(self.text[start:end])
+                if used + cost > budget:
+                    end = self._fit(start, end, budget - used, measure)
+                    cost = measure(self.text[start:end])
+                if end > start:
+                    chosen.append((start, end))
+                    used += cost
+
+        merged: List[Span] = []
+        for start, end in sorted(chosen):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+
+        parts = []
+        for i, (start, end) in enumerate(merged):
+            if i or start > 0:
+                parts.append(OMISSION_MARKER)
+            parts.append(self.text[start:end])
+        if merged and merged[-1][1] < len(self.text):
+            parts.append(OMISSION_MARKER)
+        return "".join(parts).strip("\n")
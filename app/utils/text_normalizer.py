@@ -0,0 +1,64 @@
+"""Shared OCR text normalization, compiled once and run once per document."""
+import re
+
+# Whitespace other than the form feed in PAGE_BREAK, so page breaks survive
+# normalization (and digits on either side of one are never merged)
+_WS = r"[^\S\f]"
+
+# Spacing and punctuation fixes in one alternation, tried in order at each
+# position. Each branch is rewritten by deleting the whitespace it matched,
+# except the last (a ":" keeps one space after it)
+_SPACING = re.compile("|".join([
+    rf"(?<=\d){_WS}+(?=\d)",  # "3 2 5 6" -> "3256"
+    rf"[A-Z]{_WS}+[a-z]{_WS}+[a-z]",  # "M r s ." -> "Mrs ."
+    rf"[A-Z]{_WS}+[A-Z]{_WS}+[A-Z]",  # "V S L" -> "VSL"
+    rf"[A-Za-z]{_WS}+[A-Za-z]{_WS}+[A-Za-z]{_WS}*\.",  # "e t c ." -> "etc."
+    rf"[A-Z]{_WS}+(?=[A-Z][a-z])",  # "R Aghav" -> "RAghav" (not "N ANDI": A is followed by N)
+    rf"{_WS}+(?=[):])",  # "Paid )" -> "Paid)", "Name :" -> "Name:"
+    rf"\({_WS}+",  # "( Paid" -> "(Paid"
+    rf":{_WS}{{2,}}(?!{_WS}*[):])",  # ":   5000" -> ": 5000" (unless the run ends at ":" or ")")
+]))
+
+# OCR artifacts in one alternation; skipped unless a marker occurs in the
+# text, which is a plain substring scan and much cheaper than a regex pass
+_ARTIFACTS = re.compile(rf"Mate\)|Femate\)|(?<=\w)!_{_WS}+|!_")
+_ARTIFACT_MARKERS = ("ate)", "!_")
+_ARTIFACT_REPLACEMENTS = {"Mate)": "Male", "Femate)": "Female", "!_": ""}
+
+
+def _drop_spaces(match: re.Match) -> str:
+    text = match.group()
+    return ": " if text[0] == ":" else "".join(text.split())
+
+
+def _fix_artifact(match: re.Match) -> str:
+    text = match.group()
+    return _ARTIFACT_REPLACEMENTS.get(text, " ")  # "KOSG!_ " -> "KOSG "
+
+
+def normalize_ocr_text(text: str) -> str:
+    """
+    Fix common OCR spacing and character issues.
+
+    Examples:
+    - "M r s . N ANDI RAWAT" -> "Mrs . N ANDI RAWAT" (the letter-spaced
+      title is joined; the space before "." and the "N ANDI" split stay)
+    - "Bill No : 3 2 5 6 24" -> "Bill No: 325624"
+    - "Gender : Mate)" -> "Gender: Male"
+
+    Runs at most two regex passes (spacing and punctuation, then OCR
+    artifacts), compiled once at import. Each pass scans the text once, so
+    letters joined by one rule are not re-joined by another ("L V N Paid"
+    -> "LVN Paid"). The orchestrator normalizes each document once and
+    passes the result to every agent that needs it.
+    """
+    if not text:
+        return text
+
+    text = _SPACING.sub(_drop_spaces, text)
+
+    # After spacing, so the space an artifact leaves is never joined ("KOSG!_ Paid" -> "KOSG Paid")
+    if any(marker in text for marker in _ARTIFACT_MARKERS):
+        text = _ARTIFACTS.sub(_fix_artifact, text)
+
+    return text
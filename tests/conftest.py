@@ -119,3 +119,91 @@ startxref
 %%EOF
 """
     return pdf_content
+
+
+def build_pdf(page_texts):
+    """Build a PDF with one page per entry; None entries get no text layer."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages object, filled in once page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for text in page_texts:
+        if text is None:
+            content = b""
+            resources = b"<< >>"
+        else:
+            lines = [b"BT /F1 12 Tf 72 720 Td 14 TL"]
+            for line in text.split("\n"):
+                escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+                lines.append(b"(" + escaped.encode("latin-1") + b") Tj T*")
+            lines.append(b"ET")
+            content = b"\n".join(lines)
+            resources = b"<< /Font << /F1 3 0 R >> >>"
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources "
+            + resources + b" /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return bytes(out)
+
+
+@pytest.fixture
+def make_pdf():
+    """Factory fixture building multi-page PDFs for extraction tests."""
+    return build_pdf
+
+
+class FakeLLM:
+    """Stands in for the LLM service: records every generate_structured call."""
+
+    def __init__(self, respond, delay=0.0):
+        """
+        Args:
+            respond: Response dict, or callable(prompt, **kwargs) returning one
+                (an Exception it returns or raises fails the call)
+            delay: Seconds each call takes, to observe concurrency
+        """
+        self.respond = respond
+        self.delay = delay
+        self.prompts = []
+        self.calls = []
+        self.running = 0
+        self.peak = 0
+
+    async def generate_structured(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        self.calls.append(kwargs)
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            response = self.respond(prompt, **kwargs) if callable(self.respond) else self.respond
+        finally:
+            self.running -= 1
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def fake_llm():
+    """Factory fixture building FakeLLM stand-ins with the given responses."""
+    return FakeLLM
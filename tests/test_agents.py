@@ -29,6 +29,29 @@ def test_classifier_fallback_classification():
     assert result.document_type == DocumentType.UNKNOWN
 
 
+def test_local_classifier_matches_filename_terms_as_tokens():
+    """Test the short filename term "id" only matches a whole token."""
+    from app.services.local_classifier import LocalClassifier
+
+    scores = LocalClassifier().score("invoice_paid.pdf", "")
+    assert "filename:id" not in scores[DocumentType.ID_CARD][1]
+    assert scores[DocumentType.BILL][1] == ["filename:invoice"]
+
+    scores = LocalClassifier().score("patient-id.card.pdf", "")
+    assert scores[DocumentType.ID_CARD][1] == ["filename:card", "filename:id"]
+
+
+def test_local_classifier_matches_run_together_filenames():
+    """Test longer filename terms still match inside concatenated names."""
+    from app.services.local_classifier import LocalClassifier
+
+    classifier = LocalClassifier()
+    for filename in ("DischargeSummary.pdf", "patientdischarge2024.pdf"):
+        assert "filename:discharge" in classifier.score(filename, "")[DocumentType.DISCHARGE_SUMMARY][1]
+    for filename in ("hospitalbill.pdf", "bill123.pdf", "Apollo_Bill.pdf"):
+        assert "filename:bill" in classifier.score(filename, "")[DocumentType.BILL][1]
+
+
 def test_bill_data_amount_parsing():
     """Test BillData amount parsing from various formats."""
     # Test with currency symbols
@@ -186,3 +209,233 @@ async def test_classifier_batch_processing():
     # results = await agent.classify_batch(documents)
     # assert len(results) == 3
     pass  # Skip actual LLM call in unit test
+
+
+@pytest.mark.asyncio
+async def test_classifier_batch_single_call_with_fallback(fake_llm):
+    """Test documents are classified in one call, re-asking only for missing results."""
+    def respond(prompt, response_schema=None, **kwargs):
+        if "results" in response_schema["properties"]:
+            return {"results": [
+                {"index": 1, "document_type": "bill", "confidence": 0.9, "reasoning": "invoice"},
+                {"index": 3, "document_type": "not_a_type", "confidence": 0.8},
+            ]}
+        return {"document_type": "discharge_summary", "confidence": 0.85}
+
+    agent = ClassifierAgent()
+    agent.llm = fake_llm(respond)
+    documents = [
+        ("bill.pdf", "Invoice Total: $1000"),
+        ("discharge.pdf", "Patient discharged on..."),
+        ("other.pdf", "Some random text"),
+    ]
+
+    results = await agent.classify_batch(documents)
+
+    assert [r.filename for r in results] == ["bill.pdf", "discharge.pdf", "other.pdf"]
+    assert [r.document_type for r in results] == ["bill", "discharge_summary", "unknown"]
+    assert len(agent.llm.prompts) == 2
+    assert "### Document 3" in agent.llm.prompts[0]
+
+
+@pytest.mark.asyncio
+async def test_classifier_local_fast_path_skips_llm(fake_llm):
+    """Test clear-cut documents are classified locally and only ambiguous ones reach the LLM."""
+    agent = ClassifierAgent()
+    agent.llm = fake_llm({"document_type": "unknown", "confidence": 0.4})
+    documents = [
+        ("apollo_bill.pdf", "INVOICE  Bill No: 991  Gross Amount 5,000  Net Payable 5,000"),
+        ("scan_01.pdf", "DISCHARGE SUMMARY  Diagnosis: Dengue  Course in hospital: stable  Condition at discharge: fair"),
+        ("notes.pdf", "Patient visited the clinic"),
+    ]
+
+    results = await agent.classify_batch(documents)
+
+    assert [r.document_type for r in results] == ["bill", "discharge_summary", "unknown"]
+    assert len(agent.llm.prompts) == 1
+    assert "notes.pdf" in agent.llm.prompts[0]
+
+
+@pytest.mark.asyncio
+async def test_classifier_fused_classify_and_extract(fake_llm):
+    """Test one call returns type and fields, and low confidence falls back to two-stage extraction."""
+    from app.agents.processing_agents import BillAgent
+
+    def fused_response(confidence):
+        return {"results": [{
+            "index": 1,
+            "document_type": "bill",
+            "confidence": confidence,
+            "bill": {"hospital_name": "City Hospital", "total_amount": 4200.5},
+            "discharge_summary": None,
+            "id_card": None,
+        }]}
+
+    agent = ClassifierAgent()
+    agent.llm = fake_llm(fused_response(0.95))
+    classified, fields = await agent.classify_and_extract("scan_17.pdf", "Patient visited the clinic")
+
+    assert classified.document_type == "bill"
+    assert fields == {"hospital_name": "City Hospital", "total_amount": 4200.5}
+
+    bill_agent = BillAgent()
+    bill_agent.llm = None  # A second LLM call would fail loudly
+    bill = await bill_agent.extract("Patient visited the clinic", "scan_17.pdf", prefetched=fields)
+    assert bill.total_amount == Decimal("4200.5")
+
+    agent.llm = fake_llm(fused_response(0.5))
+    classified, fields = await agent.classify_and_extract("scan_17.pdf", "Patient visited the clinic")
+    assert classified.document_type == "bill"
+    assert fields is None
+
+
+@pytest.mark.asyncio
+async def test_classifier_fused_batch_one_call_per_claim(fake_llm):
+    """Test a claim's documents are fused in one call, with failures falling back to classify_batch."""
+    def respond(prompt, response_schema=None, **kwargs):
+        if "results" in response_schema["properties"]:
+            return {"results": [
+                {"index": 1, "document_type": "bill", "confidence": 0.9, "bill": {"total_amount": 120}},
+                {"index": 2, "document_type": "discharge_summary", "confidence": 0.9,
+                 "discharge_summary": {"diagnosis": "Dengue"}},
+            ]}
+        return {"document_type": "id_card", "confidence": 0.8}
+
+    agent = ClassifierAgent()
+    agent.llm = fake_llm(respond)
+    documents = [
+        ("scan_1.pdf", "Patient visited the clinic"),
+        ("scan_2.pdf", "Patient seen again"),
+        ("scan_3.pdf", "Member details"),
+    ]
+
+    classified, prefetched = await agent.classify_and_extract_batch(documents)
+
+    assert [c.document_type for c in classified] == ["bill", "discharge_summary", "id_card"]
+    assert prefetched == {"scan_1.pdf": {"total_amount": 120}, "scan_2.pdf": {"diagnosis": "Dengue"}}
+    assert len(agent.llm.prompts) == 2  # One fused call, one classification for the missing result
+    assert "### Document 3" in agent.llm.prompts[0]
+
+    agent.llm = fake_llm(RuntimeError("invalid JSON"))
+    classified, prefetched = await agent.classify_and_extract_batch(documents)
+    assert [c.document_type for c in classified] == ["unknown"] * 3
+    assert prefetched == {}
+    assert "results" in agent.llm.calls[1]["response_schema"]["properties"]  # Batched re-classification
+
+
+@pytest.mark.asyncio
+async def test_bill_agent_samples_totals_from_long_bills(monkeypatch, fake_llm):
+    """Test a long bill's LLM prompt keeps a total buried mid-document."""
+    from app.agents.processing_agents import BillAgent
+    from app.config import settings
+    from app.services.token_counter import get_token_counter
+    from app.utils.section_index import PAGE_BREAK, SectionIndex
+
+    filler = "Room service charges applied as per tariff\n" * 200
+    text = PAGE_BREAK.join([
+        "CITY HOSPITAL\n" + filler,
+        filler + "Grand Total : 98765.00\n" + filler,
+        filler + "Thank you",
+    ])
+    assert get_token_counter().count(text) > settings.prompt_tokens_bill
+
+    monkeypatch.setattr(settings, "bill_map_reduce_enabled", False)
+    agent = BillAgent()
+    agent.llm = fake_llm({})
+    await agent.extract(text, "bill.pdf", normalized_text=text, section_index=SectionIndex(text))
+
+    prompt = agent.llm.prompts[0]
+    assert "Grand Total : 98765.00" in prompt
+    assert "CITY HOSPITAL" in prompt and "Thank you" in prompt
+    assert len(prompt) < len(text)
+
+
+@pytest.mark.asyncio
+async def test_bill_agent_verifies_prefetched_fields_on_long_bills(fake_llm):
+    """Test fused fields from a sampled long bill are used only when the regex total agrees."""
+    from app.agents.processing_agents import BillAgent
+    from app.utils.section_index import PAGE_BREAK
+
+    filler = "Room service charges applied as per tariff\n" * 300
+    text = PAGE_BREAK.join(["CITY HOSPITAL\n" + filler, filler + "Net Payable Amount: 98765.00\n" + filler])
+
+    agent = BillAgent()
+    agent.llm = fake_llm({"line_items": [], "stated_totals": [{"label": "Net Payable Amount", "amount": 98765}]})
+    bill = await agent.extract(text, "bill.pdf", prefetched={"hospital_name": "City Hospital", "total_amount": 98765.0})
+    assert bill.hospital_name == "City Hospital"
+    assert agent.llm.prompts == []
+
+    bill = await agent.extract(text, "bill.pdf", prefetched={"hospital_name": "City Hospital", "total_amount": 1200})
+    assert bill.total_amount == Decimal("98765")  # Sampled total rejected, map-reduce ran
+    assert agent.llm.prompts
+
+
+@pytest.mark.asyncio
+async def test_discharge_and_idcard_agents_verify_prefetched_fields(fake_llm):
+    """Test fused fields from a sampled long document are used only when the required fields are present."""
+    from app.agents.processing_agents import DischargeAgent, IDCardAgent
+
+    filler = "Clinical notes recorded during the stay\n" * 800
+    partial = {"patient_name": "Ravi Kumar", "diagnosis": "Dengue fever"}
+
+    agent = DischargeAgent()
+    agent.llm = fake_llm({**partial, "admission_date": "2024-03-01", "discharge_date": "2024-03-05"})
+    summary = await agent.extract("Discharge summary\n" + filler, "summary.pdf", prefetched=partial)
+    assert summary.discharge_date == date(2024, 3, 5)  # Sampled fields incomplete, LLM extraction ran
+    assert len(agent.llm.prompts) == 1
+
+    short = "Discharge summary\nPatient: Ravi Kumar\nDiagnosis: Dengue fever"
+    summary = await agent.extract(short, "summary.pdf", prefetched=partial)
+    assert summary.diagnosis == "Dengue fever"
+    assert len(agent.llm.prompts) == 1  # Whole document was in the fused prompt
+
+    agent = IDCardAgent()
+    agent.llm = fake_llm({"policy_holder_name": "Ravi Kumar", "policy_number": "P-778"})
+    card = await agent.extract("Health card\n" + filler, "card.pdf", prefetched={"policy_holder_name": "Ravi Kumar"})
+    assert card.policy_number == "P-778"
+    assert len(agent.llm.prompts) == 1
+
+    card = await agent.extract("Health card\n" + filler, "card.pdf", prefetched={"policy_holder_name": "Ravi Kumar", "policy_number": "P-1"})
+    assert card.policy_number == "P-1"
+    assert len(agent.llm.prompts) == 1
+
+
+@pytest.mark.asyncio
+async def test_bill_agent_map_reduces_long_bills(fake_llm):
+    """Test long bills are extracted per chunk concurrently, summed and reconciled."""
+    from app.agents.processing_agents import BillAgent
+    from app.utils.section_index import PAGE_BREAK, SectionIndex
+
+    def respond(prompt, **kwargs):
+        if "PHARMACY" in prompt:
+            return RuntimeError("quota exceeded")
+        if "CITY HOSPITAL" in prompt:
+            return {"hospital_name": "City Hospital", "line_items": [
+                {"description": "Room", "amount": 1000}, {"description": "ICU", "amount": 2000}
+            ], "stated_totals": []}
+        return {"hospital_name": None, "line_items": [{"description": "Lab", "amount": 499.5}],
+                "stated_totals": [{"label": "Lab Sub Total", "amount": 499.5},
+                                  {"label": "GRAND  TOTAL", "amount": 3500}]}
+
+    filler = "Service charges applied as per tariff\n" * 300
+    text = PAGE_BREAK.join(["CITY HOSPITAL\n" + filler, "PHARMACY\n" + filler, "LAB\n" + filler])
+
+    agent = BillAgent()
+    agent.llm = fake_llm(respond, delay=0.01)
+    bill = await agent.extract(text, "bill.pdf", normalized_text=text, section_index=SectionIndex(text))
+
+    assert agent.llm.peak == 3  # All chunks in flight at once
+    assert bill.hospital_name == "City Hospital"
+    assert len(bill.line_items) == 3
+    assert bill.total_amount == Decimal("3500")  # Stated grand total, not the subtotal
+
+    chunk = {"line_items": [{"description": "Room", "amount": "1,200.50"}], "stated_totals": []}
+    assert agent._reduce_chunks([chunk], BillData()).total_amount == Decimal("1200.50")
+
+    # A malformed header field in one chunk is skipped, not fatal to the merge
+    bad = {"date_of_service": {"day": 7}, "bill_number": ["B-1"], "line_items": [], "stated_totals": []}
+    good = {"date_of_service": "2024-03-07", "line_items": [{"description": "Lab", "amount": 10}]}
+    merged = agent._reduce_chunks([bad, chunk, good], BillData(bill_number="B-99"))
+    assert merged.date_of_service == date(2024, 3, 7)
+    assert merged.bill_number == "B-99"
+    assert len(merged.line_items) == 2
@@ -94,3 +94,20 @@ def test_process_claim_file_size_limit(client: TestClient):
     response = client.post("/process-claim", files=files)
     assert response.status_code == 400
     assert "exceeds" in response.json()["error"].lower()
+
+
+def test_process_claim_ocr_backpressure_returns_503(client: TestClient, sample_pdf_bytes, monkeypatch):
+    """Test process-claim returns 503 with Retry-After when OCR is saturated."""
+    from app import main
+    from app.services.ocr_pool import OCRQueueFullError
+
+    class SaturatedOrchestrator:
+        async def process_claim(self, files, request_id, deadline=None):
+            raise OCRQueueFullError(queue_depth=20, retry_after=12)
+
+    monkeypatch.setattr(main, "get_orchestrator", lambda: SaturatedOrchestrator())
+
+    files = {"files": ("scan.pdf", sample_pdf_bytes, "application/pdf")}
+    response = client.post("/process-claim", files=files)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "12"
@@ -0,0 +1,1026 @@
+"""Tests for service-layer components."""
+import pytest
+
+from app.services.cache_service import TTLCache, TieredCache
+from app.services.llm_service import LLMProvider
+
+
+def test_ttl_cache_lru_eviction():
+    """Test TTLCache evicts least recently used entries when full."""
+    cache = TTLCache(max_entries=2, ttl=0)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" is now most recently used
+
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_cache_expiry(monkeypatch):
+    """Test TTLCache drops entries older than the TTL."""
+    from app.services import cache_service
+
+    now = [1000.0]
+    monkeypatch.setattr(cache_service.time, "monotonic", lambda: now[0])
+
+    cache = TTLCache(max_entries=10, ttl=60)
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+
+    now[0] += 61
+    assert cache.get("key") is None
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_tiered_cache_disk_tier(tmp_path):
+    """Test disk tier serves entries after the memory tier is cleared."""
+    cache = TieredCache(namespace="test", max_entries=10, ttl=60, disk_dir=str(tmp_path))
+
+    await cache.set("abc123", "extracted text")
+    await cache.set("abc123:v2", "other version")
+    cache.memory.clear()
+
+    assert await cache.get("abc123") == "extracted text"
+    assert await cache.get("abc123:v2") == "other version"
+    assert cache.stats()["shared_hits"] == 2
+    assert not any(":" in path.name for path in tmp_path.rglob("*"))  # Valid file names on Windows
+
+
+@pytest.mark.asyncio
+async def test_pdf_extraction_cache_hit(monkeypatch):
+    """Test repeated extraction of identical bytes is served from cache."""
+    from app.services import cache_service
+    from app.services.pdf_service import PDFExtractionService
+
+    monkeypatch.setattr(
+        cache_service, "_extraction_cache",
+        TieredCache(namespace="pdf_text", max_entries=10, ttl=60)
+    )
+
+    calls = []
+
+    async def fake_pdfplumber(document):
+        calls.append(document)
+        return ["Hospital bill text " * 50]
+
+    monkeypatch.setattr(PDFExtractionService, "extract_pages_pdfplumber", staticmethod(fake_pdfplumber))
+
+    first = await PDFExtractionService.extract_text(b"%PDF-same-bytes", "bill.pdf")
+    second = await PDFExtractionService.extract_text(b"%PDF-same-bytes", "bill_copy.pdf")
+
+    assert first == second
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_pdf_extraction_cache_skips_failed_ocr(monkeypatch, make_pdf):
+    """Test an extraction whose OCR failed is not cached, so the next upload retries OCR."""
+    from app.services import cache_service
+    from app.services.pdf_service import PDFExtractionService
+
+    monkeypatch.setattr(
+        cache_service, "_extraction_cache",
+        TieredCache(namespace="pdf_text", max_entries=10, ttl=60)
+    )
+    pdf_bytes = make_pdf([None, "Consultation charges 1500.00\n" * 40])
+    ocr = {"up": False, "calls": 0}
+
+    async def flaky_ocr(document, filename, page_numbers=None):
+        ocr["calls"] += 1
+        if not ocr["up"]:
+            return {}  # Tesseract crashed
+        return {1: "[PAGE 1]\nScanned admission note"}
+
+    monkeypatch.setattr(PDFExtractionService, "_ocr_pages", staticmethod(flaky_ocr))
+
+    degraded = await PDFExtractionService.extract_text(pdf_bytes, "mixed.pdf")
+    assert "Consultation charges" in degraded
+    assert "Scanned admission note" not in degraded
+
+    ocr["up"] = True
+    repaired = await PDFExtractionService.extract_text(pdf_bytes, "mixed.pdf")
+    assert "Scanned admission note" in repaired
+
+    calls = ocr["calls"]
+    assert await PDFExtractionService.extract_text(pdf_bytes, "mixed.pdf") == repaired
+    assert ocr["calls"] == calls  # Complete extraction was cached
+
+
+class FakeProvider(LLMProvider):
+    """Stand-in LLM provider that records calls."""
+
+    def __init__(self):
+        self.model_name = "fake-model"
+        self.calls = []
+
+    async def generate(self, prompt, system_prompt=None, temperature=None, max_tokens=None):
+        self.calls.append(prompt)
+        return f"response {len(self.calls)}"
+
+    async def generate_structured(self, prompt, system_prompt=None, schema=None, max_tokens=None, response_schema=None):
+        self.calls.append(prompt)
+        return {"document_type": "bill", "confidence": 0.9}
+
+
+@pytest.fixture
+def fake_llm_service(monkeypatch):
+    """LLMService backed by FakeProvider with a fresh response cache."""
+    from app.services import cache_service, llm_service
+
+    monkeypatch.setattr(cache_service, "_llm_cache", TieredCache(namespace="llm", max_entries=10, ttl=60))
+    monkeypatch.setattr(llm_service, "GeminiProvider", FakeProvider)
+    return llm_service.LLMService("google")
+
+
+@pytest.mark.asyncio
+async def test_llm_cache_normalizes_prompt_whitespace(fake_llm_service):
+    """Test repeated prompts differing only in whitespace hit the cache."""
+    first = await fake_llm_service.generate("Classify   this\n document", system_prompt="sys")
+    second = await fake_llm_service.generate("Classify this document", system_prompt="sys")
+
+    assert first == second
+    assert len(fake_llm_service.provider.calls) == 1
+    assert fake_llm_service.cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_llm_cache_keys_on_system_prompt_and_temperature(fake_llm_service):
+    """Test different system prompts or high temperatures bypass cached entries."""
+    await fake_llm_service.generate("prompt", system_prompt="a")
+    await fake_llm_service.generate("prompt", system_prompt="b")
+    await fake_llm_service.generate("prompt", system_prompt="a", temperature=0.9)
+    await fake_llm_service.generate("prompt", system_prompt="a", temperature=0.9)
+
+    assert len(fake_llm_service.provider.calls) == 4
+
+
+@pytest.mark.asyncio
+async def test_llm_cache_structured_returns_copy(fake_llm_service):
+    """Test cached structured responses are not shared mutable objects."""
+    first = await fake_llm_service.generate_structured("classify")
+    first["document_type"] = "mutated"
+
+    second = await fake_llm_service.generate_structured("classify")
+    assert second["document_type"] == "bill"
+    assert len(fake_llm_service.provider.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_pdfplumber_sharded_extraction_preserves_page_order(monkeypatch, make_pdf):
+    """Test process-pool extraction reassembles pages in document order."""
+    from app.config import settings
+    from app.services import pdf_service
+    from app.services.pdf_service import PDFDocument, PDFExtractionService
+
+    pdf_bytes = make_pdf([f"Page {i} charges" for i in range(1, 6)])
+
+    monkeypatch.setattr(settings, "pdf_parallel_enabled", False)
+    inline = await PDFExtractionService.extract_text_pdfplumber(PDFDocument(pdf_bytes))
+
+    monkeypatch.setattr(settings, "pdf_parallel_enabled", True)
+    monkeypatch.setattr(settings, "pdf_process_workers", 2)
+    monkeypatch.setattr(settings, "pdf_parallel_min_pages", 2)
+    try:
+        sharded = await PDFExtractionService.extract_text_pdfplumber(PDFDocument(pdf_bytes))
+    finally:
+        pdf_service.shutdown_process_pool()
+
+    assert sharded == inline
+    assert [line for line in sharded.split("\n\n")] == [f"Page {i} charges" for i in range(1, 6)]
+
+
+@pytest.mark.asyncio
+async def test_race_extraction_starts_ocr_early_without_text_layer(monkeypatch, make_pdf):
+    """Test scanned PDFs go straight to OCR instead of waiting on native extractors."""
+    from app.services.pdf_service import PDFDocument, PDFExtractionService
+
+    document = PDFDocument(make_pdf([None, None]))
+    assert PDFExtractionService.has_text_layer(document) is False
+
+    async def fake_ocr(document, filename, page_numbers=None):
+        return {1: "[PAGE 1]\n" + "OCR text " * 100, 2: "[PAGE 2]\nmore"}
+
+    monkeypatch.setattr(PDFExtractionService, "_ocr_pages", staticmethod(fake_ocr))
+
+    pages = await PDFExtractionService._extract_racing(document, "scan.pdf")
+    assert pages[0].startswith("[PAGE 1]\nOCR text")
+    assert len(pages) == 2
+
+
+@pytest.mark.asyncio
+async def test_race_extraction_skips_ocr_for_native_text(monkeypatch, make_pdf):
+    """Test OCR is never started when a native extractor passes the threshold."""
+    from app.services.pdf_service import PDFDocument, PDFExtractionService
+
+    document = PDFDocument(make_pdf(["Consultation charges 1500.00\n" * 40]))
+    assert PDFExtractionService.has_text_layer(document) is True
+
+    async def fail_ocr(document, filename, page_numbers=None):
+        raise AssertionError("OCR should not run")
+
+    monkeypatch.setattr(PDFExtractionService, "_ocr_pages", staticmethod(fail_ocr))
+
+    pages = await PDFExtractionService._extract_racing(document, "bill.pdf")
+    assert "Consultation charges" in pages[0]
+
+
+@pytest.mark.asyncio
+async def test_race_extraction_awaits_cancelled_extractors(monkeypatch, make_pdf):
+    """Test losing extractors are cancelled and fully unwound before the race returns."""
+    import asyncio
+    from app.services.pdf_service import PDFDocument, PDFExtractionService
+
+    document = PDFDocument(make_pdf([None, "Consultation charges 1500.00\n" * 40]))
+    unwound = []
+
+    async def slow_ocr(document, filename, page_numbers=None):
+        if page_numbers is not None:
+            return {}  # Per-page OCR of the native winner's empty page
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            await asyncio.sleep(0)  # Cleanup that needs the event loop
+            unwound.append(True)
+            raise
+
+    monkeypatch.setattr(PDFExtractionService, "_ocr_pages", staticmethod(slow_ocr))
+
+    pages = await PDFExtractionService._extract_racing(document, "mixed.pdf")
+    assert "Consultation charges" in pages[1]
+    assert unwound == [True]
+
+
+@pytest.mark.asyncio
+async def test_ocr_runs_only_on_pages_without_text_layer(monkeypatch, make_pdf):
+    """Test mixed PDFs keep native text and OCR just the scanned pages."""
+    from app.services.pdf_service import PDFDocument, PDFExtractionService
+
+    document = PDFDocument(make_pdf(["Room charges 2500.00\n" * 30, None, "Pharmacy charges 800.00\n" * 30]))
+    ocr_requests = []
+
+    async def fake_ocr(document, filename, page_numbers=None):
+        ocr_requests.append(page_numbers)
+        return {n: f"[PAGE {n}]\nStamp: Paid" for n in page_numbers}
+
+    monkeypatch.setattr(PDFExtractionService, "_ocr_pages", staticmethod(fake_ocr))
+
+    pages = await PDFExtractionService._extract_sequential(document, "mixed.pdf")
+
+    assert ocr_requests == [[2]]
+    assert pages[0].startswith("Room charges")
+    assert pages[1] == "[PAGE 2]\nStamp: Paid"
+    assert pages[2].startswith("Pharmacy charges")
+
+
+@pytest.fixture
+def fake_ocr_tools(monkeypatch, tmp_path):
+    """Replace poppler/Tesseract with fakes; confidence is looked up per (page, dpi)."""
+    import os
+    import pdf2image
+    import pytesseract
+    from app.services import ocr_store
+    from app.services.ocr_store import OCRPageStore
+
+    store = OCRPageStore(str(tmp_path / "ocr_pages.sqlite3"), max_bytes=1024 * 1024)
+    monkeypatch.setattr(ocr_store, "_ocr_store", store)
+
+    rendered = []
+    confidence = {}
+
+    def fake_convert(pdf_bytes, dpi, first_page, last_page, output_folder, output_file, **kwargs):
+        assert first_page == last_page
+        path = os.path.join(output_folder, f"{output_file}.ppm")
+        with open(path, "w") as f:
+            f.write(f"{first_page}:{dpi}")
+        rendered.append((first_page, dpi, path))
+        return [path]
+
+    def fake_image_to_data(image_path, **kwargs):
+        with open(image_path) as f:
+            page, dpi = (int(part) for part in f.read().split(":"))
+        return {
+            "text": ["text", "of", f"page{page}", ""],
+            "conf": [confidence.get((page, dpi), 95)] * 3 + [-1],
+            "block_num": [1, 1, 1, 1],
+            "par_num": [1, 1, 1, 1],
+            "line_num": [1, 1, 1, 1],
+        }
+
+    monkeypatch.setattr(pdf2image, "convert_from_bytes", fake_convert)
+    monkeypatch.setattr(pytesseract, "image_to_data", fake_image_to_data)
+    yield rendered, confidence
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_ocr_streams_pages_through_temp_files(fake_ocr_tools):
+    """Test OCR renders one page per call and deletes each image after use."""
+    import os
+    from app.services.pdf_service import PDFDocument, PDFExtractionService
+
+    rendered, _ = fake_ocr_tools
+
+    ocr_pages = await PDFExtractionService._ocr_pages(PDFDocument(b"%PDF"), "scan.pdf", [2, 5])
+
+    assert ocr_pages == {2: "[PAGE 2]\ntext of page2", 5: "[PAGE 5]\ntext of page5"}
+    assert len(rendered) == 2
+    assert not any(os.path.exists(path) for _, _, path in rendered)
+
+
+@pytest.mark.asyncio
+async def test_adaptive_ocr_rerenders_only_low_confidence_pages(fake_ocr_tools):
+    """Test adaptive OCR uses low DPI first and re-renders weak pages at high DPI."""
+    from app.config import settings
+    from app.services.pdf_service import PDFDocument, PDFExtractionService
+
+    rendered, confidence = fake_ocr_tools
+    confidence[(2, settings.ocr_low_dpi)] = 40
+
+    await PDFExtractionService._ocr_pages(PDFDocument(b"%PDF"), "scan.pdf", [1, 2, 3])
+
+    assert [(page, dpi) for page, dpi, _ in rendered] == [
+        (1, settings.ocr_low_dpi),
+        (2, settings.ocr_low_dpi),
+        (3, settings.ocr_low_dpi),
+        (2, settings.ocr_high_dpi),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_ocr_reuses_stored_pages(fake_ocr_tools):
+    """Test a re-processed document only renders pages missing from the store."""
+    from app.services.ocr_pool import get_ocr_pool
+    from app.services.pdf_service import PDFDocument, PDFExtractionService
+
+    rendered, _ = fake_ocr_tools
+    document = PDFDocument(b"%PDF-scan")
+    first = await PDFExtractionService._ocr_pages(document, "scan.pdf", [1, 2])
+    rendered.clear()
+
+    # A full queue must not reject a document that needs no rendering
+    pool = get_ocr_pool()
+    pool.pending_pages += pool.max_pending_pages
+    try:
+        second = await PDFExtractionService._ocr_pages(document, "scan.pdf", [1, 2])
+    finally:
+        pool.pending_pages -= pool.max_pending_pages
+    assert second == first
+    assert rendered == []
+    assert pool.pending_pages == 0  # Every reserved page was released
+
+    third = await PDFExtractionService._ocr_pages(document, "scan.pdf", [1, 2, 3])
+    assert [page for page, _, _ in rendered] == [3]
+    assert third[3] == "[PAGE 3]\ntext of page3"
+
+
+def test_ocr_store_evicts_oldest_pages(tmp_path):
+    """Test the OCR store stays under its size cap by dropping the oldest rows."""
+    from app.services.ocr_store import OCRPageStore
+
+    store = OCRPageStore(str(tmp_path / "ocr.sqlite3"), max_bytes=25)
+    try:
+        store.put("doc", 1, 150, "cfg", "a" * 10, 90.0)
+        store.put("doc", 2, 150, "cfg", "b" * 10, 90.0)
+        store.put("doc", 3, 150, "cfg", "c" * 10, 90.0)
+
+        assert store.get("doc", 1, 150, "cfg") is None
+        assert store.get("doc", 3, 150, "cfg") == ("c" * 10, 90.0)
+        assert store.get("doc", 3, 300, "cfg") is None  # DPI is part of the key
+        assert store.stats()["evictions"] == 1
+        assert store.stats()["size_bytes"] == 20
+    finally:
+        store.close()
+
+    reopened = OCRPageStore(str(tmp_path / "ocr.sqlite3"), max_bytes=25)
+    try:
+        assert reopened.get("doc", 2, 150, "cfg") == ("b" * 10, 90.0)
+        assert reopened.stats()["entries"] == 2
+    finally:
+        reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_ocr_pool_rejects_when_queue_full():
+    """Test the OCR pool sheds load by pending pages and bounds executor submissions."""
+    import asyncio
+    import threading
+    from app.services.ocr_pool import OCRQueueFullError, OCRWorkerPool
+
+    pool = OCRWorkerPool(max_workers=1, max_queue=1, max_pending_pages=3)
+    release = threading.Event()
+    try:
+        with pool.admit(2) as admission:
+            with pytest.raises(OCRQueueFullError) as exc_info:
+                pool.admit(2)
+            assert exc_info.value.retry_after > 0
+            pool.admit(1).release()
+
+            jobs = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(3)]
+            await asyncio.sleep(0.05)
+            assert pool.stats()["running"] == 1
+            assert pool.stats()["queue_depth"] == 1  # Third job waits for a submission slot
+
+            release.set()
+            await asyncio.gather(*jobs)
+            admission.page_done()
+            assert pool.pending_pages == 1
+
+        assert pool.pending_pages == 0
+        pool.admit(10).release()  # Larger than the cap, but nothing else is pending
+        assert pool.stats()["rejected"] == 1
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_pdf_document_parsed_once_across_extractors(monkeypatch, make_pdf):
+    """Test text, metadata and page counts share one PyPDF2 parse per file."""
+    from app.config import settings
+    from app.services import pdf_service
+    from app.services.pdf_service import PDFDocument, PDFExtractionService
+
+    monkeypatch.setattr(settings, "extraction_cache_enabled", False)
+    parses = []
+    real_reader = pdf_service.PyPDF2.PdfReader
+
+    def counting_reader(stream):
+        parses.append(stream)
+        return real_reader(stream)
+
+    monkeypatch.setattr(pdf_service.PyPDF2, "PdfReader", counting_reader)
+
+    pdf_bytes = make_pdf(["Room charges 2500.00\n" * 30, "Pharmacy charges 800.00\n" * 30])
+    async with PDFDocument(pdf_bytes) as document:
+        text = await PDFExtractionService.extract_text(pdf_bytes, "bill.pdf", document)
+        metadata = await PDFExtractionService.extract_metadata(pdf_bytes, document)
+        assert document.page_count == 2
+
+    assert "Pharmacy charges" in text
+    assert metadata["pages"] == 2
+    assert len(parses) == 1
+    assert document._reader is None and document._plumber is None
+
+
+@pytest.mark.asyncio
+async def test_gemini_provider_reuses_models_per_config(monkeypatch):
+    """Test GenerativeModel instances are cached per (temperature, max_tokens)."""
+    from types import SimpleNamespace
+    from app.config import settings
+    from app.services import llm_service
+
+    created = []
+
+    class FakeModel:
+        def __init__(self, model_name, generation_config, safety_settings):
+            created.append(generation_config)
+
+        async def generate_content_async(self, prompt):
+            candidate = SimpleNamespace(finish_reason=1)
+            return SimpleNamespace(candidates=[candidate], text=f"echo {prompt}")
+
+    monkeypatch.setattr(settings, "google_api_key", "test-key")
+    monkeypatch.setattr(llm_service.genai, "GenerativeModel", FakeModel)
+    provider = llm_service.GeminiProvider()
+
+    assert await provider.generate("one") == "echo one"
+    await provider.generate("two")
+    await provider.generate("three", max_tokens=256)
+
+    assert created == [
+        {"temperature": settings.llm_temperature, "max_output_tokens": 8192},
+        {"temperature": settings.llm_temperature, "max_output_tokens": 256},
+    ]
+
+
+
+def test_response_schema_for_models():
+    """Test Pydantic models convert to the Gemini response schema subset."""
+    from app.schemas import BillData, ClassifiedDocument
+    from app.services.structured_output import response_schema_for
+
+    classified = response_schema_for(ClassifiedDocument, exclude=("filename",))
+    assert "filename" not in classified["properties"]
+    assert classified["properties"]["document_type"]["enum"] == ["bill", "discharge_summary", "id_card", "unknown"]
+    assert classified["properties"]["reasoning"]["nullable"] is True
+    assert classified["required"] == ["document_type", "confidence"]
+
+    bill = response_schema_for(BillData)
+    assert bill["properties"]["total_amount"]["type"] == "number"
+    assert "YYYY-MM-DD" in bill["properties"]["date_of_service"]["description"]
+    assert bill["properties"]["line_items"]["items"]["properties"]["amount"]["type"] == "number"
+
+
+@pytest.mark.asyncio
+async def test_gemini_generate_structured_uses_json_mode(monkeypatch):
+    """Test structured calls request JSON output constrained to the response schema."""
+    from types import SimpleNamespace
+    from app.config import settings
+    from app.services import llm_service
+
+    created = []
+
+    class FakeModel:
+        def __init__(self, model_name, generation_config, safety_settings):
+            created.append(generation_config)
+
+        async def generate_content_async(self, prompt):
+            candidate = SimpleNamespace(finish_reason=1)
+            return SimpleNamespace(candidates=[candidate], text='{"document_type": "bill", "confidence": 0.9}')
+
+    monkeypatch.setattr(settings, "google_api_key", "test-key")
+    monkeypatch.setattr(llm_service.genai, "GenerativeModel", FakeModel)
+    provider = llm_service.GeminiProvider()
+    schema = {"type": "object", "properties": {"document_type": {"type": "string"}}}
+
+    result = await provider.generate_structured("classify", response_schema=schema)
+
+    assert result == {"document_type": "bill", "confidence": 0.9}
+    assert created[0]["response_mime_type"] == "application/json"
+    assert created[0]["response_schema"] == schema
+
+
+def test_incremental_json_parser_reports_completed_fields():
+    """Test fields are reported as soon as complete and kept when the stream is cut off."""
+    from app.services.json_stream import IncrementalJSONParser
+
+    parser = IncrementalJSONParser()
+    text = '{"document_type": "bill", "note": "a, \\"b\\" }", "items": [{"amount": 1}], "total_amount": 1200.5, "hospital_name": "Apo'
+    reported = []
+    for i in range(0, len(text), 7):
+        reported.extend(parser.feed(text[i:i + 7]))
+
+    assert reported == [
+        ("document_type", "bill"),
+        ("note", 'a, "b" }'),
+        ("items", [{"amount": 1}]),
+        ("total_amount", 1200.5),
+    ]
+    assert parser.fields == dict(reported)
+    assert parser.complete is False
+
+
+@pytest.mark.asyncio
+async def test_gemini_stream_keeps_fields_on_max_tokens(monkeypatch):
+    """Test a MAX_TOKENS stream returns the fields completed before the cut-off."""
+    from types import SimpleNamespace
+    from app.config import settings
+    from app.services import llm_service
+
+    def chunk(text, finish_reason=0):
+        content = SimpleNamespace(parts=[SimpleNamespace(text=text)])
+        return SimpleNamespace(candidates=[SimpleNamespace(finish_reason=finish_reason, content=content)])
+
+    class FakeModel:
+        def __init__(self, model_name, generation_config, safety_settings):
+            pass
+
+        async def generate_content_async(self, prompt, stream=False):
+            async def chunks():
+                yield chunk('{"hospital_name": "Apollo", "total_')
+                yield chunk('amount": 1500, "line_items": [{"descr', finish_reason=2)
+            return chunks()
+
+    monkeypatch.setattr(settings, "google_api_key", "test-key")
+    monkeypatch.setattr(llm_service.genai, "GenerativeModel", FakeModel)
+    provider = llm_service.GeminiProvider()
+    seen = []
+
+    result, complete = await provider.stream_structured("extract", on_field=lambda k, v: seen.append(k))
+
+    assert result == {"hospital_name": "Apollo", "total_amount": 1500}
+    assert complete is False
+    assert seen == ["hospital_name", "total_amount"]
+
+
+@pytest.mark.asyncio
+async def test_llm_streamed_structured_reports_fields(fake_llm_service):
+    """Test on_field sees each field once, including on cache hits."""
+    seen = []
+
+    first = await fake_llm_service.generate_structured("doc", on_field=lambda k, v: seen.append((k, v)))
+    await fake_llm_service.generate_structured("doc", on_field=lambda k, v: seen.append((k, v)))
+
+    assert first == {"document_type": "bill", "confidence": 0.9}
+    assert seen == [("document_type", "bill"), ("confidence", 0.9)] * 2
+    assert len(fake_llm_service.provider.calls) == 1
+
+@pytest.mark.asyncio
+async def test_rate_limiter_admits_interactive_before_background():
+    """Test queued interactive calls jump ahead of earlier background calls."""
+    import asyncio
+    from app.services.rate_limiter import LLMRateLimiter
+
+    limiter = LLMRateLimiter("test", rpm=1000, tpm=100000, max_in_flight=1)
+    order = []
+
+    async def call(name, priority):
+        async with limiter.acquire(10, priority):
+            order.append(name)
+
+    async with limiter.acquire(10):
+        background = asyncio.ensure_future(call("background", "background"))
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(call("interactive", "interactive"))
+        await asyncio.sleep(0.01)
+        assert limiter.stats()["waiting"] == {"interactive": 1, "background": 1}
+
+    await asyncio.gather(background, interactive)
+    assert order == ["interactive", "background"]
+    assert limiter.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_waits_for_token_budget():
+    """Test calls wait for the TPM bucket to refill and usage is reconciled."""
+    import time
+    from app.services.rate_limiter import LLMRateLimiter
+
+    limiter = LLMRateLimiter("test", rpm=1000, tpm=6000, max_in_flight=4)  # Refills 100 tokens/s
+
+    async with limiter.acquire(6000) as lease:
+        lease.report(5990)  # 10 tokens returned to the bucket
+
+    started = time.monotonic()
+    async with limiter.acquire(20):
+        pass
+    waited = time.monotonic() - started
+
+    assert 0.05 < waited < 1
+    stats = limiter.stats()
+    assert stats["throttled"] == 1
+    assert stats["requests_last_minute"] == 2
+    assert stats["tokens_last_minute"] == 6010
+
+
+class ScriptedProvider:
+    """Stand-in provider with a configurable delay or failure."""
+
+    delay = 0.0
+    error: Exception = None
+
+    def __init__(self):
+        self.model_name = type(self).__name__
+        self.calls = 0
+        self.cancelled = 0
+
+    async def generate(self, prompt, system_prompt=None, temperature=None, max_tokens=None):
+        import asyncio
+
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return f"{self.model_name}: {prompt}"
+
+
+@pytest.fixture
+def failover_llm_service(monkeypatch):
+    """Build LLMService with a scripted primary and secondary and fresh health state."""
+    from app.config import settings
+    from app.services import llm_service, provider_health, rate_limiter
+
+    monkeypatch.setattr(settings, "llm_cache_enabled", False)
+    monkeypatch.setattr(settings, "llm_fallback_provider", "openai")
+    monkeypatch.setattr(provider_health, "_provider_health", {})
+    monkeypatch.setattr(rate_limiter, "_rate_limiters", {})
+
+    def build(primary_cls, secondary_cls):
+        monkeypatch.setattr(llm_service, "GeminiProvider", primary_cls)
+        monkeypatch.setattr(llm_service, "OpenAIProvider", secondary_cls)
+        return llm_service.LLMService("google")
+
+    return build
+
+
+@pytest.mark.asyncio
+async def test_llm_hedges_slow_primary_to_secondary(monkeypatch, failover_llm_service):
+    """Test a primary slower than the hedge delay loses to the secondary and is cancelled."""
+    import asyncio
+    from app.config import settings
+
+    class SlowPrimary(ScriptedProvider):
+        delay = 1.0
+        unwound = False
+
+        async def generate(self, prompt, **kwargs):
+            try:
+                return await super().generate(prompt, **kwargs)
+            except asyncio.CancelledError:
+                await asyncio.sleep(0.01)  # Slow cleanup, e.g. closing a connection
+                self.unwound = True
+                raise
+
+    class FastSecondary(ScriptedProvider):
+        delay = 0.0
+
+    monkeypatch.setattr(settings, "llm_hedge_initial_delay", 0.05)
+    service = failover_llm_service(SlowPrimary, FastSecondary)
+
+    assert await service.generate("hello") == "FastSecondary: hello"
+    assert service.providers["google"].cancelled == 1
+    assert service.providers["google"].unwound  # Awaited before generate returned
+    assert service.health["google"].stats()["hedge_wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_llm_streamed_fields_follow_the_winning_attempt(monkeypatch, failover_llm_service):
+    """Test a hedge that wins with different fields corrects what the losing stream reported."""
+    import asyncio
+    from app.config import settings
+
+    class StreamingProvider(ScriptedProvider):
+        fields = {}
+
+        async def stream_structured(self, prompt, system_prompt=None, schema=None, max_tokens=None,
+                                    response_schema=None, on_field=None):
+            for key, value in self.fields.items():
+                on_field(key, value)
+            await asyncio.sleep(self.delay)
+            return dict(self.fields), True
+
+    class StallingPrimary(StreamingProvider):
+        delay = 1.0
+        fields = {"hospital_name": "Apollo", "patient_name": "R Aghav"}
+
+    class HedgedSecondary(StreamingProvider):
+        fields = {"hospital_name": "Apollo Hospitals", "total_amount": 1500}
+
+    monkeypatch.setattr(settings, "llm_hedge_initial_delay", 0.05)
+    service = failover_llm_service(StallingPrimary, HedgedSecondary)
+    seen = []
+
+    result = await service.generate_structured("bill", on_field=lambda k, v: seen.append((k, v)))
+
+    assert result == HedgedSecondary.fields
+    assert seen == [
+        ("hospital_name", "Apollo"),
+        ("patient_name", "R Aghav"),
+        ("patient_name", None),
+        ("hospital_name", "Apollo Hospitals"),
+        ("total_amount", 1500),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_llm_caches_failover_answers_under_the_secondary(failover_llm_service):
+    """Test an answer from the secondary is not served later as the primary's."""
+    class ServiceUnavailable(Exception):
+        status_code = 503
+
+    class FlakyPrimary(ScriptedProvider):
+        error = ServiceUnavailable("503 Service Unavailable")
+
+    service = failover_llm_service(FlakyPrimary, ScriptedProvider)
+    service.cache = TieredCache(namespace="llm", max_entries=10, ttl=60)
+
+    assert await service.generate("claim") == "ScriptedProvider: claim"
+    keys = service._cache_keys("text", "claim", None, None, None)
+    assert await service.cache.get(keys["openai"]) == "ScriptedProvider: claim"
+    assert await service.cache.get(keys["google"]) is None
+
+    service.providers["google"].error = None
+    assert await service.generate("claim") == "FlakyPrimary: claim"
+    assert service.providers["google"].calls == 2
+
+
+@pytest.mark.asyncio
+async def test_llm_fails_over_when_primary_circuit_opens(monkeypatch, failover_llm_service):
+    """Test repeated primary failures open its circuit and route calls to the secondary."""
+    from app.config import settings
+
+    class ServiceUnavailable(Exception):
+        status_code = 503
+
+    class BrokenPrimary(ScriptedProvider):
+        error = ServiceUnavailable("503 Service Unavailable")
+
+    monkeypatch.setattr(settings, "llm_circuit_failure_threshold", 2)
+    service = failover_llm_service(BrokenPrimary, ScriptedProvider)
+    primary = service.providers["google"]
+
+    for _ in range(3):
+        assert await service.generate("claim") == "ScriptedProvider: claim"
+
+    assert primary.calls == 2
+    assert service.health["google"].breaker.state == "open"
+    assert service.health["google"].failovers == 3
+
+
+@pytest.mark.asyncio
+async def test_llm_deterministic_errors_leave_circuit_closed(monkeypatch, failover_llm_service):
+    """Test safety blocks and other non-retryable errors do not open the primary's circuit."""
+    from app.config import settings
+
+    class BlockingPrimary(ScriptedProvider):
+        error = ValueError("Response blocked by safety filters")
+
+    monkeypatch.setattr(settings, "llm_circuit_failure_threshold", 2)
+    service = failover_llm_service(BlockingPrimary, ScriptedProvider)
+
+    for _ in range(3):
+        await service.generate("claim")
+
+    assert service.providers["google"].calls == 3
+    assert service.health["google"].breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_llm_call_skipped_when_deadline_nearly_spent(fake_llm_service):
+    """Test LLM calls are not attempted once the request budget is used up."""
+    from app.utils.deadline import Deadline, DeadlineExceededError, deadline_scope
+
+    with deadline_scope(Deadline(0.5)):
+        with pytest.raises(DeadlineExceededError):
+            await fake_llm_service.generate("classify this")
+
+    assert fake_llm_service.provider.calls == []
+
+
+@pytest.mark.asyncio
+async def test_llm_call_cut_off_at_timeout(monkeypatch, failover_llm_service):
+    """Test a hung provider call is abandoned after llm_timeout instead of retrying on."""
+    import time
+    from app.config import settings
+    from app.utils.deadline import DeadlineExceededError
+
+    class HungProvider(ScriptedProvider):
+        delay = 30.0
+
+    monkeypatch.setattr(settings, "llm_fallback_provider", "")
+    monkeypatch.setattr(settings, "llm_timeout", 0.1)
+    service = failover_llm_service(HungProvider, ScriptedProvider)
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        await service.generate("extract")
+    assert time.monotonic() - started < 1
+
+
+def test_llm_error_taxonomy():
+    """Test transient provider errors are retryable and deterministic ones are not."""
+    from google.api_core import exceptions as google_exceptions
+    from app.services.llm_retry import is_retryable, retry_after_seconds
+
+    assert is_retryable(google_exceptions.ResourceExhausted("quota"))
+    assert is_retryable(google_exceptions.ServiceUnavailable("down"))
+    assert is_retryable(ConnectionResetError())
+    assert not is_retryable(google_exceptions.InvalidArgument("bad request"))
+    assert not is_retryable(google_exceptions.PermissionDenied("API key not valid"))
+    assert not is_retryable(ValueError("Response blocked by safety filters"))
+
+    assert retry_after_seconds(google_exceptions.ResourceExhausted("Please retry in 1.5s.")) == 1.5
+
+
+@pytest.mark.asyncio
+async def test_llm_retry_honors_retry_after_and_fails_fast():
+    """Test 429s are retried after Retry-After while deterministic errors are not retried."""
+    from types import SimpleNamespace
+    from app.services.llm_retry import get_retry_metrics, llm_retry
+
+    class RateLimited(Exception):
+        status_code = 429
+        response = SimpleNamespace(headers={"retry-after-ms": "20"})
+
+    attempts = []
+
+    @llm_retry("retry-test")
+    async def flaky():
+        attempts.append("flaky")
+        if len(attempts) == 1:
+            raise RateLimited("slow down")
+        return "ok"
+
+    @llm_retry("retry-test")
+    async def blocked():
+        attempts.append("blocked")
+        raise ValueError("Response blocked by safety filters")
+
+    assert await flaky() == "ok"
+    with pytest.raises(ValueError):
+        await blocked()
+
+    assert attempts == ["flaky", "flaky", "blocked"]
+    stats = get_retry_metrics("retry-test").stats()
+    assert stats["retries"] == 1
+    assert stats["retry_after_honored"] == 1
+    assert stats["retry_wait_seconds"] == 0.02
+    assert stats["failed_fast"] == 1
+
+
+def test_normalize_ocr_text():
+    """Test OCR spacing fixes and artifact cleanup."""
+    from app.utils.text_normalizer import normalize_ocr_text
+
+    assert normalize_ocr_text("Bill No : 3 2 5 6 24") == "Bill No: 325624"
+    assert normalize_ocr_text("M r s . N ANDI RAWAT") == "Mrs . N ANDI RAWAT"
+    assert normalize_ocr_text("Gender : Mate) KOSG!_  Name :   X ( a )") == "Gender: Male KOSG Name: X (a)"
+    assert normalize_ocr_text("R Aghav e t c . L V N Paid") == "RAghav etc. LVN Paid"
+    assert normalize_ocr_text("Total :  :  5") == "Total:: 5"
+    assert normalize_ocr_text("") == ""
+
+
+def test_anchored_patterns_match_plain_regex():
+    """Test anchored search/findall agree with re.search/re.findall."""
+    import re
+    from app.utils.anchored_patterns import AnchorIndex, AnchoredPattern, anchor_keywords
+
+    amount = AnchoredPattern(r'net\s*amount\s*[:\-]?\s*([0-9,]+)', anchors=("net",))
+    dated = AnchoredPattern(r'(\d{1,2}-(?:Jan|Feb)-\d{4})', anchors=("jan", "feb"), offsets=(-3, -2))
+    loose = AnchoredPattern(r'(\d{4})')
+    keywords = anchor_keywords([amount, dated, loose])
+    assert keywords == {"net", "jan", "feb"}
+
+    text = "Net Amount: 1,200 then NET amount 3,400 admitted 7-Feb-2025 and 12-JAN-2024 room 1234"
+    index = AnchorIndex(text, keywords)
+    assert index.anchored
+    for pattern in (amount, dated, loose):
+        assert pattern.findall(index) == re.findall(pattern.pattern, text, re.IGNORECASE)
+        assert pattern.search(index).span() == re.search(pattern.pattern, text, re.IGNORECASE).span()
+
+    # Characters that casefold onto ASCII letters force a full-text scan
+    kelvin = AnchorIndex("NET AMOUNT 5 \u212a", keywords)  # Kelvin sign
+    assert not kelvin.anchored
+    assert amount.findall(kelvin) == ["5"]
+
+
+def test_section_index_pages_tables_and_sampling():
+    """Test page/table/keyword offsets and budgeted, priority-ordered sampling."""
+    from app.utils.section_index import OMISSION_MARKER, PAGE_BREAK, SectionIndex
+    from app.utils.text_normalizer import normalize_ocr_text
+
+    text = normalize_ocr_text(PAGE_BREAK.join([
+        "Patient Name : Mary  " + "a" * 100,
+        "[TABLE]\nItem | Amount\n[/TABLE]" + "b" * 100,
+        "c" * 100 + "Net Payable : 5 0 0 0",
+    ]))
+    index = SectionIndex(text)
+
+    assert len(index.pages) == 3
+    table_start = text.index("[TABLE]")
+    assert index.pages[1][0] < table_start < index.pages[1][1]
+    assert index.tables == [(table_start, text.index("[/TABLE]") + len("[/TABLE]"))]
+    assert index.first("header") == 0
+    assert text[index.first("totals"):].startswith("Net Payable: 5000")
+
+    sampled = index.sample([*index.around("totals", before=0, after=50), index.head(12), *index.tables], 70)
+    assert sampled.startswith("Patient Name")
+    assert sampled.index("[TABLE]") < sampled.index("Net Payable: 5000")  # Document order
+    assert sampled.count(OMISSION_MARKER.strip()) == 2
+    assert index.sample([index.head(5)], len(text)) == text
+
+    chunks = SectionIndex(PAGE_BREAK.join(["a" * 30, "b" * 30, "line\n" * 20])).chunks(70)
+    assert [end - start for start, end in chunks] == [64, 66, 35]  # Pages grouped, long page split at lines
+
+
+def test_token_counter_estimates_and_calibrates():
+    """Test digit-heavy text costs more tokens and estimates converge on reported counts."""
+    from app.services.token_counter import EstimatedTokenCounter
+    from app.utils.section_index import SectionIndex
+
+    counter = EstimatedTokenCounter(digits_per_token=1)
+    prose = "Patient was admitted for observation and discharged"
+    figures = "1,23,456.00 | 98,765.50 | 12/03/2025 |"
+    assert len(figures) < len(prose)
+    assert counter.count(figures) > counter.count(prose)
+
+    estimated = counter.count(prose * 50)
+    for _ in range(20):
+        counter.observe(counter.count(prose * 50), estimated * 2)
+    assert abs(counter.count(prose * 50) - estimated * 2) < estimated * 0.05
+
+    index = SectionIndex("Header line\n" + figures * 100 + "\nGrand Total: 5000")
+    measure = EstimatedTokenCounter().count  # Uncalibrated: "Header line" 2 tokens, "Grand Total: 5000" 7
+    sampled = index.sample([index.head(11), *index.around("totals", before=0, after=20)], 10, measure=measure)
+    assert sampled.startswith("Header line") and sampled.endswith("Grand Total: 5000")
+
+
+@pytest.mark.asyncio
+async def test_llm_call_logs_and_reconciles_reported_usage(monkeypatch):
+    """Test provider-reported token usage is what the rate limiter is charged."""
+    from app.config import settings
+    from app.services import llm_service, rate_limiter, token_counter
+
+    class UsageReportingProvider(FakeProvider):
+        async def generate(self, prompt, system_prompt=None, temperature=None, max_tokens=None):
+            token_counter.record_usage(1234, 56)
+            return await super().generate(prompt, system_prompt, temperature, max_tokens)
+
+    monkeypatch.setattr(settings, "llm_cache_enabled", False)
+    monkeypatch.setattr(rate_limiter, "_rate_limiters", {})
+    monkeypatch.setattr(token_counter, "_counters", {})
+    monkeypatch.setattr(llm_service, "GeminiProvider", UsageReportingProvider)
+    service = llm_service.LLMService("google")
+
+    await service.generate("short prompt", max_tokens=500)
+
+    assert service.rate_limiters["google"].stats()["tokens_last_minute"] == 1234 + 56